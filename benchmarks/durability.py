@@ -0,0 +1,100 @@
+"""
+Durability benchmark
+====================
+
+This script measures the latency of a journal commit in each durability mode (see the
+`jour.durability` module): a context that writes a new line and flushes it, over a
+journal with some previous entries, in a temporary directory. The temporary directory
+should be in the same file system than the real journal to get meaningful numbers,
+which can be selected with `--dir`.
+
+Usage: `python benchmarks/durability.py [--entries N] [--commits N] [--dir DIR]`.
+"""
+
+import argparse
+import datetime
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from jour.durability import DURABILITY_MODES
+from jour.jour import Jour
+
+
+def write_journal(journal_file: Path, n_entries: int) -> None:
+    """
+    Write a journal file with some entries.
+
+    :param journal_file: The journal file.
+    :param n_entries: The number of entries.
+    """
+    start = datetime.datetime(2024, 1, 1)
+    with open(journal_file, "w") as f:
+        for i in range(n_entries):
+            moment = start + datetime.timedelta(minutes=i)
+            f.write(
+                f"{i + 1}. {moment.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]} - "
+                f"benchmark - Message {i + 1}.\n"
+            )
+
+
+def measure_commits(durability: str, n_commits: int) -> list:
+    """
+    Write some lines to the journal, each one in its own context.
+
+    :param durability: The durability mode.
+    :param n_commits: The number of commits.
+    :return: The seconds taken by each commit.
+    """
+    times = []
+    for i in range(n_commits):
+        start = time.perf_counter()
+        with Jour(durability=durability) as jour:
+            jour.write_line(f"Benchmark message {i}", printing=False)
+        times.append(time.perf_counter() - start)
+
+    return times
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Jour durability benchmark")
+    parser.add_argument(
+        "--entries", type=int, default=100_000, help="Number of previous entries"
+    )
+    parser.add_argument("--commits", type=int, default=50, help="Number of commits")
+    parser.add_argument("--dir", type=str, default=None, help="Temporary directory")
+    args = parser.parse_args()
+
+    # Padding changes are full rewrites, so start far from the next power of ten
+    n_entries = max(args.entries, 2 * args.commits)
+
+    temp_dir = Path(tempfile.mkdtemp(prefix="jour_durability_", dir=args.dir))
+    try:
+        journal_file = temp_dir / "journal.md"
+        os.environ["JOURNAL"] = str(journal_file)
+        os.environ["JOURNAL_EMERGENCY"] = str(temp_dir / "journal_emergency.md")
+
+        print(
+            f"Commit latency with {n_entries} previous entries ({args.commits} "
+            f"commits per mode, in `{temp_dir}`):"
+        )
+        for durability in DURABILITY_MODES:
+            write_journal(journal_file, n_entries)
+            times = [t * 1000 for t in measure_commits(durability, args.commits)]
+            print(
+                f"  {durability:>6}: median {statistics.median(times):.2f} ms, p95 "
+                f"{statistics.quantiles(times, n=20)[-1]:.2f} ms, max "
+                f"{max(times):.2f} ms"
+            )
+    finally:
+        shutil.rmtree(temp_dir)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
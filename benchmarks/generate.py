@@ -0,0 +1,133 @@
+"""
+Synthetic journal generator
+===========================
+
+This script writes realistic synthetic journals for the benchmarks: entries minutes or
+hours apart over the years, written by a pool of users and automated processes, with
+tagged entries (like `#BUP17`) of many tag names and some commands. The journals are
+formatted like the ones written by Jour, with padded indexes, and the same seed always
+writes the same journal.
+
+Usage: `python benchmarks/generate.py FILE [--entries N] [--seed N]`.
+"""
+
+import argparse
+import datetime
+import random
+import sys
+from pathlib import Path
+
+# Number of distinct signatures and tag names of the synthetic journals
+N_SIGNATURES = 24
+N_TAG_NAMES = 60
+
+# Ratio of tagged entries and of entries formatted as commands
+TAG_RATIO = 0.15
+COMMAND_RATIO = 0.1
+
+# Entries written to the file at once
+WRITE_CHUNK = 10_000
+
+MESSAGES = (
+    "OS update to {major}.{minor}.{patch}",
+    "General system backup",
+    "Install package `pkg-{n}`",
+    "Remove package `pkg-{n}`",
+    "Rotate the keys of service {n}",
+    "Clean the cache of the build server",
+    "Restart the database after the maintenance window",
+    "Renew the TLS certificates of host-{n}",
+    "Update the firmware of the disk {n}",
+    "Change the cron schedule of job {n}",
+)
+
+COMMANDS = (
+    "brew upgrade",
+    "apt-get dist-upgrade -y",
+    "systemctl restart nginx",
+    "zfs snapshot tank/home@{n}",
+    "git -C ~/dotfiles pull --rebase",
+)
+
+
+def generate_lines(n_entries: int, seed: int = 0):
+    """
+    Generate the lines of a synthetic journal.
+
+    :param n_entries: The number of entries.
+    :param seed: The seed of the random generator.
+    :return: An iterator of the lines.
+    """
+    rng = random.Random(seed)
+    signatures = [f"user{i}" for i in range(N_SIGNATURES // 2)]
+    signatures += [f"service-{i}" for i in range(N_SIGNATURES - len(signatures))]
+    # Tag names without digits, which would be taken as part of the index
+    tag_names = ["BUP", "UPD", "INC"] + [
+        f"T{chr(65 + i // 26)}{chr(65 + i % 26)}" for i in range(N_TAG_NAMES - 3)
+    ]
+    tag_counts = dict.fromkeys(tag_names, 0)
+    padding = len(str(n_entries))
+
+    # Entries up to an hour apart since 2000, like a long-lived journal
+    moment = datetime.datetime(2000, 1, 1)
+    for index in range(1, n_entries + 1):
+        moment += datetime.timedelta(
+            seconds=rng.randint(1, 3600), milliseconds=rng.randint(0, 999)
+        )
+        n = rng.randint(1, 999)
+
+        if rng.random() < COMMAND_RATIO:
+            message = f"`{rng.choice(COMMANDS).format(n=n)}`"
+        else:
+            message = rng.choice(MESSAGES).format(
+                major=n % 30, minor=n % 10, patch=n % 7, n=n
+            )
+        line = (
+            f"{index:0{padding}}. {moment.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]} - "
+            f"{rng.choice(signatures)} - {message}."
+        )
+
+        if rng.random() < TAG_RATIO:
+            # Few tag names are used much more than the rest
+            tag_name = tag_names[min(int(rng.expovariate(0.2)), N_TAG_NAMES - 1)]
+            tag_counts[tag_name] += 1
+            line += f" #{tag_name}{tag_counts[tag_name]}."
+
+        yield line + "\n"
+
+
+def generate_journal(journal_file: Path, n_entries: int, seed: int = 0) -> None:
+    """
+    Write a synthetic journal file.
+
+    :param journal_file: The journal file.
+    :param n_entries: The number of entries.
+    :param seed: The seed of the random generator.
+    """
+    with open(journal_file, "w") as f:
+        chunk = []
+        for line in generate_lines(n_entries, seed=seed):
+            chunk.append(line)
+            if len(chunk) == WRITE_CHUNK:
+                f.writelines(chunk)
+                chunk = []
+        f.writelines(chunk)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Jour synthetic journal generator")
+    parser.add_argument("file", type=Path, help="Journal file to write")
+    parser.add_argument(
+        "--entries", type=int, default=100_000, help="Number of entries"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    generate_journal(args.file, args.entries, seed=args.seed)
+    print(f"Written {args.entries} entries to `{args.file}`.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""
+Startup benchmark
+=================
+
+This script measures the startup cost of the `jour` command line utility, using the
+`python -X importtime` report of `import jour.__main__`, and checks it against a budget
+to catch startup regressions. It also checks that the heavy dependencies, which are only
+needed by some code paths, are not imported at startup.
+
+Usage: `python benchmarks/startup.py [--runs N] [--budget MS]`.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Startup budget for the cumulative import time of `jour.__main__`, in milliseconds
+STARTUP_BUDGET_MS = 100
+
+# Dependencies that must be imported lazily
+LAZY_MODULES = ("mdformat", "markdown_it")
+
+
+def measure_import_time() -> tuple:
+    """
+    Import `jour.__main__` in a new interpreter with `-X importtime`.
+
+    :return: The cumulative import time of `jour.__main__` in milliseconds, and the set of
+        top level modules imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import jour.__main__"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    import_time_ms = None
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        module = module.strip()
+        modules.add(module.split(".")[0])
+        if module == "jour.__main__":
+            import_time_ms = int(cumulative) / 1000
+
+    return import_time_ms, modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Jour startup benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="Number of runs")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=STARTUP_BUDGET_MS,
+        help="Import time budget, in milliseconds",
+    )
+    args = parser.parse_args()
+
+    import_times = []
+    lazy_modules_imported = set()
+    for _ in range(args.runs):
+        import_time_ms, modules = measure_import_time()
+        import_times.append(import_time_ms)
+        lazy_modules_imported |= modules.intersection(LAZY_MODULES)
+
+    median = statistics.median(import_times)
+    print(
+        f"`jour.__main__` import time: median {median:.1f} ms, min "
+        f"{min(import_times):.1f} ms, max {max(import_times):.1f} ms "
+        f"({args.runs} runs, budget {args.budget:.1f} ms)"
+    )
+
+    failed = False
+    if lazy_modules_imported:
+        print(f"Lazy dependencies imported at startup: {sorted(lazy_modules_imported)}")
+        failed = True
+    if median > args.budget:
+        print("Startup budget exceeded.")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+Benchmark suite
+===============
+
+This script times the main Jour operations over synthetic journals of growing sizes
+(see `generate.py`), both through the `jour` command line utility (`jour.__main__.main`,
+run in process) and through the `Jour` class. Each run writes a line, appends to it,
+tags it, computes the next tag, prints the journal and removes the line, so the journal
+is the same after each run. The first run, over a journal without sidecar indexes, is
+reported apart as the cold one.
+
+The results can be saved in a JSON report with `--output`, and compared with the report
+of other version with `--compare`, which fails if some operation is slower than allowed
+by `--threshold`.
+
+Usage: `python benchmarks/suite.py [--sizes N,N,...] [--runs N] [--output FILE]
+[--compare FILE] [--threshold RATIO]`.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tomllib
+from pathlib import Path
+from unittest.mock import patch
+
+from generate import generate_journal
+
+from jour.__main__ import main as cli_main
+from jour.jour import Jour
+
+ROOT = Path(__file__).parent.parent
+
+# Version of the report format
+REPORT_VERSION = 1
+
+# Default journal sizes, in entries
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+# Operations of each run, in order
+OPERATIONS = ("write", "append", "tag", "return_tag", "print", "remove")
+
+# Command line arguments of each operation
+CLI_ARGS = {
+    "write": ["--write", "Benchmark message"],
+    "append": ["--append", "appended"],
+    "tag": ["--tag", "BUP"],
+    "return_tag": ["--return_tag", "BUP"],
+    "print": [],
+    "remove": ["--remove"],
+}
+
+
+def run_library(operation: str) -> None:
+    """
+    Run an operation with the `Jour` class, in its own context.
+
+    :param operation: The operation name, one of `OPERATIONS`.
+    """
+    with Jour() as jour:
+        if operation == "write":
+            jour.write_line("Benchmark message", printing=False)
+        elif operation == "append":
+            jour.append_to_last_line("appended", printing=False)
+        elif operation == "tag":
+            jour.tag_last_line("BUP", printing=False)
+        elif operation == "return_tag":
+            jour.get_next_tag("BUP", printing=False)
+        elif operation == "print":
+            jour.print_journal()
+        elif operation == "remove":
+            jour.remove_last_line()
+
+
+def run_cli(operation: str) -> None:
+    """
+    Run an operation with the `jour` command line utility, in this process.
+
+    :param operation: The operation name, one of `OPERATIONS`.
+    """
+    with patch("sys.argv", ["jour"] + CLI_ARGS[operation]):
+        cli_main()
+
+
+def measure(interface: str, journal_file: Path, runs: int) -> dict:
+    """
+    Time the operations over a journal.
+
+    :param interface: `cli` or `library`.
+    :param journal_file: The journal file, without sidecar indexes.
+    :param runs: The number of runs, including the cold one.
+    :return: The seconds taken by each operation in each run.
+    """
+    run = run_cli if interface == "cli" else run_library
+    times = {operation: [] for operation in OPERATIONS}
+
+    # Silence the output of the operations
+    logging.disable(logging.CRITICAL)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(runs):
+                for operation in OPERATIONS:
+                    start = time.perf_counter()
+                    run(operation)
+                    times[operation].append(time.perf_counter() - start)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    return times
+
+
+def summarize(times: list) -> dict:
+    """
+    Summarize the times of an operation.
+
+    :param times: The seconds taken in each run, the cold one first.
+    :return: The cold time, and the median, minimum and maximum of the warm ones.
+    """
+    warm = times[1:] or times
+    return {
+        "cold_s": times[0],
+        "median_s": statistics.median(warm),
+        "min_s": min(warm),
+        "max_s": max(warm),
+        "runs": len(warm),
+    }
+
+
+def get_metadata() -> dict:
+    """
+    Get the environment of the benchmark, to compare the reports.
+
+    :return: The Jour version and commit, and the Python version and platform.
+    """
+    with open(ROOT / "pyproject.toml", "rb") as f:
+        version = tomllib.load(f)["tool"]["poetry"]["version"]
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "jour_version": version,
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> bool:
+    """
+    Print the ratios of the median times of a report to the ones of a baseline report.
+
+    :param report: The new report.
+    :param baseline: The baseline report.
+    :param threshold: The maximum ratio allowed.
+    :return: `True` if no operation exceeds the maximum ratio.
+    """
+    key = lambda result: (result["interface"], result["entries"], result["operation"])
+    baseline_results = {key(result): result for result in baseline["results"]}
+
+    print(
+        f"\nComparison with {baseline['jour_version']} "
+        f"({baseline.get('git_commit') or 'unknown commit'}):"
+    )
+    passed = True
+    for result in report["results"]:
+        baseline_result = baseline_results.get(key(result))
+        if baseline_result is None:
+            continue
+        ratio = result["median_s"] / baseline_result["median_s"]
+        regression = ratio > threshold
+        passed = passed and not regression
+        print(
+            f"  {result['interface']:>7} {result['entries']:>10} "
+            f"{result['operation']:>10}: {ratio:6.2f}x"
+            + ("  REGRESSION" if regression else "")
+        )
+
+    return passed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Jour benchmark suite")
+    parser.add_argument(
+        "--sizes",
+        type=lambda text: [int(size) for size in text.split(",")],
+        default=SIZES,
+        help="Comma separated journal sizes, in entries",
+    )
+    parser.add_argument(
+        "--runs", type=int, default=5, help="Number of runs, including the cold one"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", type=Path, help="JSON report to write")
+    parser.add_argument("--compare", type=Path, help="JSON report to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="Maximum ratio of the median times to the compared ones",
+    )
+    args = parser.parse_args()
+
+    report = {"version": REPORT_VERSION, **get_metadata(), "runs": args.runs}
+    report["seed"] = args.seed
+    report["results"] = []
+
+    temp_dir = Path(tempfile.mkdtemp(prefix="jour_suite_"))
+    env = {
+        "JOURNAL": str(temp_dir / "journal.md"),
+        "JOURNAL_EMERGENCY": str(temp_dir / "journal_emergency.md"),
+        "JOURNAL_SOCKET": str(temp_dir / "jour.sock"),  # No daemon
+        "USER": "benchmark",
+    }
+    try:
+        with patch.dict(os.environ, env):
+            for size in args.sizes:
+                synthetic_file = temp_dir / "synthetic.md"
+                generate_journal(synthetic_file, size, seed=args.seed)
+
+                for interface in ("library", "cli"):
+                    # Each interface starts with a fresh journal, without indexes
+                    for path in temp_dir.glob(".journal.md*"):
+                        path.unlink()
+                    shutil.copyfile(synthetic_file, env["JOURNAL"])
+
+                    times = measure(interface, Path(env["JOURNAL"]), args.runs)
+                    for operation in OPERATIONS:
+                        result = {
+                            "interface": interface,
+                            "entries": size,
+                            "operation": operation,
+                            **summarize(times[operation]),
+                        }
+                        report["results"].append(result)
+                        print(
+                            f"{interface:>7} {size:>10} {operation:>10}: median "
+                            f"{result['median_s'] * 1000:9.2f} ms, cold "
+                            f"{result['cold_s'] * 1000:9.2f} ms"
+                        )
+    finally:
+        shutil.rmtree(temp_dir)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to `{args.output}`.")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(report, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
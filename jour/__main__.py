@@ -4,16 +4,29 @@ Main
 
 This module is the main entry point for the `jour` command line utility. It uses the
 `argparse` module to parse the command line arguments and the `Jour` class
-to access the functionality.
+to access the functionality. If the Jour daemon is running, the commands are sent to it
+instead.
 """
 
 import argparse
+import json
 import logging
+import os
+import signal
+import sys
+import time
 
 try:
-    from jour import Jour
-except ImportError:
     from .jour import Jour
+    from .segments import parse_rotation
+    from .tag_index import TAG_REGEX
+    from .time_index import parse_time_bound
+except ImportError:
+    from segments import parse_rotation
+    from tag_index import TAG_REGEX
+    from time_index import parse_time_bound
+
+    from jour import Jour
 
 # Setup logger
 handler = logging.StreamHandler()
@@ -24,6 +37,23 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 
 
+def positive_int(text: str) -> int:
+    """
+    Parse a positive integer argument, like the number of lines to print.
+
+    :param text: The argument.
+    :return: The positive integer.
+    """
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{text}'")
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: '{text}'")
+
+    return value
+
+
 def parse_args():
     # Define the parser
     parser = argparse.ArgumentParser(
@@ -54,6 +84,15 @@ def parse_args():
         action="store_true",
         default=False,
     )
+    group.add_argument(
+        "--batch",
+        "-b",
+        help="Write many new lines into the journal at once, reading them from the "
+        "standard input. Each input line is a message, or a JSON object with a "
+        "`message` key and optional `signature`, `tag` and `as_command` keys",
+        action="store_true",
+        default=False,
+    )
     group.add_argument(
         "--tag",
         "-t",
@@ -72,6 +111,30 @@ def parse_args():
         action="store_true",
         default=False,
     )
+    group.add_argument(
+        "--tags",
+        "-ts",
+        help="Print all the tags used in the journal, with their number of uses and "
+        "their last use",
+        action="store_true",
+        default=False,
+    )
+    group.add_argument(
+        "--tag_history",
+        "--tag-history",
+        "-th",
+        help="Print all the lines of the journal tagged with the input tag",
+        action="store_true",
+        default=False,
+    )
+    group.add_argument(
+        "--show",
+        help="Print the entry `N`, or the entries from `A` to `B` with `A..B`, seeking "
+        "straight to them",
+        metavar="N|A..B",
+        type=str,
+        default=None,
+    )
     group.add_argument(
         "--remove",
         "-r",
@@ -79,6 +142,61 @@ def parse_args():
         action="store_true",
         default=False,
     )
+    group.add_argument(
+        "--merge_emergency",
+        "--merge-emergency",
+        "-me",
+        help="Merge the emergency journal into the journal by date, renumbering the "
+        "entries and the colliding tags of the emergency journal, and archive it",
+        action="store_true",
+        default=False,
+    )
+    group.add_argument(
+        "--segment_by",
+        "--segment-by",
+        "-sb",
+        help="Split the journal in segments: keep the new entries in the journal file "
+        "and seal the older ones in segment files next to it, per year with `year`, or "
+        "per number of entries with `N`. The segments are read transparently",
+        metavar="year|N",
+        type=str,
+        default=None,
+    )
+    group.add_argument(
+        "--sync",
+        help="Sync the local replica of the journal, defined in `JOURNAL_REPLICA` "
+        "environment variable, with the journal file now. In this local-first mode, "
+        "the commands use the replica and sync it in the background",
+        action="store_true",
+        default=False,
+    )
+    group.add_argument(
+        "--export",
+        "-e",
+        help="Export the journal entries to the standard output as JSON Lines, CSV or an "
+        "HTML table. Large journals are exported in parallel, in the same order",
+        choices=("jsonl", "csv", "html"),
+        type=str,
+        default=None,
+    )
+    group.add_argument(
+        "--aggregate",
+        help="Merge the journals of many hosts by date in one timeline, annotating each "
+        "entry with its host. Each path is a journal file, or a directory with the "
+        "journals of many hosts, named after their path inside it",
+        metavar="PATH",
+        type=str,
+        nargs="+",
+        default=None,
+    )
+    group.add_argument(
+        "--serve",
+        help="Run the Jour daemon, which owns the journal and serves the `jour` calls "
+        "through the Unix socket defined in `JOURNAL_SOCKET` environment variable (by "
+        "default, `~/.jour.sock`)",
+        action="store_true",
+        default=False,
+    )
 
     parser.add_argument(
         "--as_command",
@@ -104,10 +222,82 @@ def parse_args():
         default=None,
     )
 
+    parser.add_argument(
+        "--compression",
+        help="When segmenting the journal, compress the sealed segments with this "
+        "codec. They are decompressed on the fly when read",
+        choices=("gzip", "lzma"),
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--durability",
+        help="How the journal writes are committed: `atomic` (replace the journal file "
+        "with a synced copy), `append` (append or patch its end in place and sync it) or "
+        "`fast` (do not sync it). Default is the value of the `JOURNAL_DURABILITY` "
+        "environment variable, or `append`",
+        choices=("atomic", "append", "fast"),
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--stats",
+        help="Print the time taken by each phase of the command, like waiting for the "
+        "lock, loading the journal or formatting it, as JSON to the standard error",
+        action="store_true",
+        default=False,
+    )
+
+    parser.add_argument(
+        "--output_format",
+        "--output-format",
+        "-of",
+        help="When aggregating journals, the output format: `markdown` (a journal) or "
+        "`json`. Default is `markdown`",
+        choices=("markdown", "json"),
+        type=str,
+        default="markdown",
+    )
+
+    parser.add_argument(
+        "--workers",
+        help="The number of processes used to aggregate or export journals. Default is "
+        "the number of CPUs",
+        type=positive_int,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--lines",
+        "-n",
+        help="The number of last lines of the journal to print. Default is 10",
+        type=positive_int,
+        default=10,
+    )
+
     parser.add_argument(
         "--signature",
         "-s",
-        help="The signature to be added as the line author. Default is the user name",
+        help="The signature to be added as the line author. Default is the user name. "
+        "When printing the journal, print only the lines with this signature",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--since",
+        help="When printing the journal, print only the lines from this date or date and "
+        "time in ISO format, like `2024-03-05` or `2024-03-05 10:30`",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "--until",
+        help="When printing the journal, print only the lines until this date or date "
+        "and time in ISO format, included",
         type=str,
         default=None,
     )
@@ -116,6 +306,191 @@ def parse_args():
     return parser.parse_args()
 
 
+def parse_batch_entries(lines, signature=None, as_command=False) -> list:
+    """
+    Parse the entries of the batch mode. Each line is a message, or a JSON object with a
+    `message` key and optional `signature`, `tag` and `as_command` keys. Empty lines are
+    ignored.
+
+    :param lines: The input lines.
+    :param signature: The default signature of the entries.
+    :param as_command: The default command format of the entries.
+    :return: The entries, as dictionaries.
+    """
+    entries = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith("{"):
+            entry = json.loads(line)
+            if not isinstance(entry.get("message"), str):
+                raise ValueError(f"Batch entry without message: `{line}`")
+        else:
+            entry = {"message": line}
+        entry.setdefault("signature", signature)
+        entry.setdefault("as_command", as_command)
+        entries.append(entry)
+
+    return entries
+
+
+def parse_entry_range(text: str) -> tuple:
+    """
+    Parse the entry range of the `--show` option: `N` or `A..B`.
+
+    :param text: The entry range.
+    :return: The numbers of the first and the last entries of the range.
+    """
+    first, separator, last = text.partition("..")
+    try:
+        first = int(first)
+        last = int(last) if separator else first
+    except ValueError:
+        raise ValueError(f"Invalid entry range: `{text}`")
+    if first < 1 or last < first:
+        raise ValueError(f"Invalid entry range: `{text}`")
+
+    return first, last
+
+
+def print_stats(phase_stats, jour, seconds: float) -> None:
+    """
+    Print the timing report of the `--stats` option, as JSON to the standard error.
+
+    :param phase_stats: The `PhaseStats` of the command.
+    :param jour: The `Jour` used by the command.
+    :param seconds: The seconds taken by the command.
+    """
+    report = {
+        "command": sys.argv[1:],
+        "seconds": seconds,
+        "phases": phase_stats.to_dict(),
+        "locks": jour.lock_stats,
+    }
+    json.dump(report, sys.stderr, indent=2)
+    sys.stderr.write("\n")
+
+
+def run_with_daemon(args, entries=None) -> bool:
+    """
+    Run the command through the Jour daemon, if it is running and serves the journal.
+
+    :param args: The parsed arguments.
+    :param entries: The batch entries, if the `--batch` option is used.
+    :return: `True` if the command was run by the daemon, `False` otherwise.
+    """
+    try:
+        from .server import DaemonUnavailableError, JourClient
+    except ImportError:
+        from server import DaemonUnavailableError, JourClient
+
+    # Commands not served by the daemon
+    if (
+        args.tags
+        or args.tag_history
+        or args.merge_emergency
+        or args.segment_by
+        or args.create_journal
+        or args.durability
+        or args.stats
+        or args.sync
+        or args.export
+    ):
+        return False
+
+    try:
+        client = JourClient()
+    except OSError:
+        return False  # Not running
+
+    with client:
+        try:
+            if args.write:
+                new_line = client.request(
+                    "write_line",
+                    message=args.MESSAGE_OR_TAG,
+                    signature=args.signature,
+                    as_command=args.as_command,
+                    printing=False,
+                )
+                logger.info(f"New line:\n  {new_line}")
+            elif args.batch:
+                new_lines = client.request(
+                    "write_lines", entries=entries, printing=False
+                )
+                if new_lines:
+                    message = f"New {len(new_lines)} lines:\n"
+                    for line in new_lines:
+                        message += f"  {line}"
+                    logger.info(message)
+            elif args.append:
+                new_line = client.request(
+                    "append_to_last_line",
+                    new_message=args.MESSAGE_OR_TAG,
+                    as_command=args.as_command,
+                    printing=False,
+                )
+                logger.info(f"New line:\n  {new_line}")
+            elif args.tag:
+                new_line = client.request(
+                    "tag_last_line", tag_name=args.MESSAGE_OR_TAG, printing=False
+                )
+                new_tags = [
+                    match.group(0)
+                    for match in TAG_REGEX.finditer(new_line)
+                    if match.group(1) == args.MESSAGE_OR_TAG
+                ]
+                if new_tags:
+                    print(new_tags[-1])  # The new tag, the last one with its name
+                logger.info(f"New line:\n  {new_line}")
+            elif args.return_tag:
+                print(
+                    client.request(
+                        "get_next_tag", tag_name=args.MESSAGE_OR_TAG, printing=False
+                    )
+                )
+            elif args.show:
+                first, last = parse_entry_range(args.show)
+                entries = client.request("get_entries", first=first, last=last)
+                if entries:
+                    entry_range = first if last == first else f"{first} to {last}"
+                    message = f"Journal entries {entry_range}:\n"
+                    for line in entries:
+                        message += f"  {line}"
+                    logger.info(message)
+                else:
+                    logger.warning(f"No entries found.")
+            elif args.remove:
+                client.request("remove_last_line")
+                logger.info("Last line removed.")
+            elif args.query:
+                found_lines = client.request("find_entries", **args.query)
+                if found_lines:
+                    message = f"Found {len(found_lines)} journal lines:\n"
+                    for line in found_lines:
+                        message += f"  {line}"
+                    logger.info(message)
+                else:
+                    logger.warning(f"No entries found.")
+            else:  # Default
+                last_lines = client.request("last_lines", n_lines=args.lines)
+                if last_lines:
+                    message = f"Journal last {len(last_lines)} lines:\n"
+                    for line in last_lines:
+                        message += f"  {line}"
+                    logger.info(message)
+                else:
+                    logger.warning(f"The journal is empty.")
+        except DaemonUnavailableError:
+            return False
+        except (OSError, RuntimeError) as e:
+            logger.error(f"Jour daemon error: {e}")
+
+    return True
+
+
 def main():
     # Parse arguments
     args = parse_args()
@@ -125,13 +500,140 @@ def main():
         logger.error("No message to write.")
         return
 
-    # Check that a tag is provided when the `--tag` or `--return_tag` options are used
-    if (args.tag or args.return_tag) and args.MESSAGE_OR_TAG is None:
+    # Check that a tag is provided when the `--tag`, `--return_tag` or `--tag_history`
+    # options are used
+    if (
+        args.tag or args.return_tag or args.tag_history
+    ) and args.MESSAGE_OR_TAG is None:
         logger.error("No tag to add.")
         return
 
+    # Check the entry range of the `--show` option
+    if args.show:
+        try:
+            first_entry, last_entry = parse_entry_range(args.show)
+        except ValueError as e:
+            logger.error(e)
+            return
+
+    # Check the rotation of the `--segment_by` option
+    if args.segment_by:
+        try:
+            rotation = parse_rotation(args.segment_by)
+        except ValueError as e:
+            logger.error(e)
+            return
+    if args.compression and not args.segment_by:
+        logger.error("The `--compression` option only applies when segmenting.")
+        return
+
+    # Check the query of the time range and signature filters, which only apply when
+    # printing the journal
+    printing = not any(
+        (args.write, args.append, args.batch, args.tag, args.return_tag, args.tags)
+        + (args.tag_history, args.remove, args.serve, args.show, args.merge_emergency)
+        + (args.segment_by, args.sync, args.aggregate, args.export)
+    )
+    if (args.since or args.until) and not printing:
+        logger.error("The `--since` and `--until` options only apply when printing.")
+        return
+    args.query = None
+    if printing and (args.since or args.until or args.signature):
+        try:
+            args.query = {
+                "since": args.since and parse_time_bound(args.since),
+                "until": args.until and parse_time_bound(args.until, upper=True),
+                "signature": args.signature,
+            }
+        except ValueError as e:
+            logger.error(f"Invalid date: {e}")
+            return
+
+    # Read the batch entries before taking the journal
+    if args.batch:
+        try:
+            entries = parse_batch_entries(
+                sys.stdin, signature=args.signature, as_command=args.as_command
+            )
+        except ValueError as e:
+            logger.error(f"Invalid batch input: {e}")
+            return
+
+    # Aggregate the journals of many hosts, without taking the journal
+    if args.aggregate:
+        try:
+            from .aggregate import write_aggregated_journal
+        except ImportError:
+            from aggregate import write_aggregated_journal
+
+        try:
+            write_aggregated_journal(
+                args.aggregate,
+                sys.stdout,
+                output_format=args.output_format,
+                workers=args.workers,
+            )
+        except OSError as e:
+            logger.error(f"Cannot aggregate the journals: {e}")
+        return
+
+    # Run the daemon
+    if args.serve:
+        try:
+            from .server import JourServer
+        except ImportError:
+            from server import JourServer
+
+        # Stop cleanly when terminated
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            jour = Jour(create_journal=args.create_journal, durability=args.durability)
+        except ValueError as e:
+            logger.error(e)  # Invalid `JOURNAL_DURABILITY`
+            return
+
+        # In local-first mode, sync the replica periodically
+        replica_sync = None
+        if jour.replica is not None:
+            try:
+                from .replica import ReplicaSync
+            except ImportError:
+                from replica import ReplicaSync
+
+            replica_sync = ReplicaSync(jour.replica)
+            replica_sync.start()
+        try:
+            JourServer(jour=jour).serve_forever()
+        finally:
+            if replica_sync is not None:
+                replica_sync.stop()
+        return
+
+    # Send the command to the daemon, if it is running
+    if run_with_daemon(args, entries=entries if args.batch else None):
+        return
+
+    # Time the phases of the command, if desired
+    phase_stats = None
+    if args.stats:
+        try:
+            from .phases import PhaseStats
+        except ImportError:
+            from phases import PhaseStats
+
+        phase_stats = PhaseStats()
+    start = time.perf_counter()
+
     # Create a `Jour` object
-    jour = Jour(create_journal=args.create_journal)
+    try:
+        jour = Jour(
+            create_journal=args.create_journal,
+            durability=args.durability,
+            phase_hook=phase_stats,
+        )
+    except ValueError as e:
+        logger.error(e)  # Invalid `JOURNAL_DURABILITY`
+        return
 
     # Enter context an run the command
     with jour:
@@ -142,6 +644,8 @@ def main():
                 signature=args.signature,
                 printing=True,
             )
+        elif args.batch:
+            jour.write_lines(entries, printing=True)
         elif args.append:
             jour.append_to_last_line(
                 args.MESSAGE_OR_TAG, as_command=args.as_command, printing=True
@@ -152,11 +656,64 @@ def main():
         elif args.return_tag:
             jour.get_next_tag(args.MESSAGE_OR_TAG, printing=True)
 
+        elif args.tags:
+            jour.print_tags()
+
+        elif args.tag_history:
+            jour.print_tag_history(args.MESSAGE_OR_TAG)
+
+        elif args.show:
+            jour.print_entries(first_entry, last_entry)
+
         elif args.remove:
             jour.remove_last_line()
 
+        elif args.merge_emergency:
+            try:
+                jour.merge_emergency_journal()
+            except RuntimeError:
+                pass  # Already logged
+
+        elif args.segment_by:
+            try:
+                jour.segment_journal(rotation, compression=args.compression)
+            except RuntimeError:
+                pass  # Already logged
+
+        elif args.sync:
+            try:
+                if jour.sync_replica():
+                    logger.info("Local replica in sync with the journal file.")
+            except RuntimeError:
+                pass  # Already logged
+
+        elif args.export:
+            try:
+                jour.export_journal(sys.stdout, args.export, workers=args.workers)
+            except BrokenPipeError:
+                # The reader of the output stopped reading it, like `head`, so drop the
+                # rest of the output, even the one buffered, instead of failing at exit
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(devnull, sys.stdout.fileno())
+
+        elif args.query:
+            jour.print_found_entries(**args.query)
+
         else:  # Default
-            jour.print_journal()
+            jour.print_journal(n_lines=args.lines)
+
+    # In local-first mode, replay the changes to the journal file, waiting for it only
+    # a bounded time
+    if jour.replica is not None and not args.sync:
+        try:
+            from .replica import sync_in_background
+        except ImportError:
+            from replica import sync_in_background
+
+        sync_in_background(jour.replica)
+
+    if phase_stats is not None:
+        print_stats(phase_stats, jour, time.perf_counter() - start)
 
 
 if __name__ == "__main__":
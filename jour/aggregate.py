@@ -0,0 +1,286 @@
+"""
+Aggregate
+=========
+
+This module implements the aggregation of the journals of many hosts in one timeline,
+like the journals of a fleet of machines collected in a directory. Each entry is
+annotated with its host, which is the path of its journal file relative to the given
+directory, without the `.md` suffix, like `web1` for `fleet/web1.md`, or the path of its
+directory for the journals with the default name, like `web1` for `fleet/web1/journal.md`.
+
+The journals are parsed in parallel by a process pool. Each worker streams its journal
+and spills the parsed entries to a temporary file, as runs of entries in chronological
+order: a journal written by Jour is a single run, and each line out of order, like the
+ones of an emergency journal merged by hand, starts a new one. The runs of all the
+journals are then merged by timestamp, reading them in chunks, so the memory used does
+not depend on the size nor the number of entries of the journals. Each run being merged
+keeps its spill file open, so when there are more than `MERGE_FAN_IN` runs, like in a
+journal with many lines out of order, they are first merged in groups into new spill
+files, in as many passes as needed, like in an external sort.
+"""
+
+import heapq
+import json
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from operator import itemgetter
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TextIO
+
+try:
+    from .entry import Entry
+    from .locks import JournalLock
+    from .segments import Manifest
+    from .streaming import stream_lines
+except ImportError:  # pragma: no cover
+    from entry import Entry
+    from locks import JournalLock
+    from segments import Manifest
+    from streaming import stream_lines
+
+# Formats of the aggregated timeline
+OUTPUT_FORMATS = ("markdown", "json")
+
+# Pickle protocol of the spill files, which only live while aggregating
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL
+
+# Maximum number of runs merged at once, which is the number of files open while merging
+MERGE_FAN_IN = 64
+
+
+def find_journals(paths: Iterable[Path]) -> list:
+    """
+    Find the journal files to aggregate. A file is a journal, named after its stem, and
+    a directory holds the Markdown journals found inside it, recursively, named after
+    their path relative to it, or the one of their directory if they are named
+    `journal.md`. Hidden files, like the Jour sidecar files, and the sealed
+    segments of the segmented journals, which are read with their journal, are skipped.
+
+    :param paths: The journal files and directories.
+    :return: The `(host, journal_file)` tuples, sorted by host.
+    """
+    journals = {}
+    for path in map(Path, paths):
+        if not path.is_dir():
+            journals[path.stem] = path
+            continue
+
+        files = sorted(
+            file
+            for file in path.rglob("*.md")
+            if not any(part.startswith(".") for part in file.relative_to(path).parts)
+        )
+        segment_files = set()
+        for file in files:
+            manifest = Manifest.load(file)
+            if manifest:
+                segment_files.update(segment.file for segment in manifest.segments)
+        for file in files:
+            if file not in segment_files:
+                host = file.relative_to(path).with_suffix("")
+                if host.name == "journal":
+                    host = (
+                        host.parent if host.parent.parts else Path(path.resolve().name)
+                    )
+                journals[host.as_posix()] = file
+
+    return sorted(journals.items())
+
+
+def spill_journal(journal_file: Path, spill_file: Path, host: str) -> tuple:
+    """
+    Parse a journal and write its entries to a spill file, in runs of entries in
+    chronological order. Its sealed segments, if any, are read before it. Each entry is
+    pickled as a `(sort_key, host, index, timestamp, signature, message, tags)` tuple,
+    where the sort key is the timestamp of the entry, or of the previous one if it has
+    not timestamp. Not numbered lines are skipped.
+
+    :param journal_file: The journal file.
+    :param spill_file: The spill file to write.
+    :param host: The host of the journal.
+    :return: The byte offsets where each run starts and ends in the spill file, as
+        `(start, end)` tuples, and the number of entries.
+    """
+    runs = []
+    n_entries = 0
+    sort_key = ""
+    run_start = 0
+    with JournalLock(journal_file).shared, open(spill_file, "wb") as f:
+        manifest = Manifest.load(journal_file)
+        segments = manifest.segments if manifest else []
+        for line in chain(
+            *(segment.iter_lines() for segment in segments), stream_lines(journal_file)
+        ):
+            entry = Entry.from_line(line)
+            if entry is None:
+                continue
+            if entry.timestamp:
+                if entry.timestamp < sort_key and f.tell() > run_start:
+                    runs.append((run_start, f.tell()))  # Out of order, new run
+                    run_start = f.tell()
+                sort_key = entry.timestamp
+            record = (sort_key, host, entry.index, entry.timestamp, entry.signature)
+            pickle.dump(record + (entry.message, entry.tags), f, PICKLE_PROTOCOL)
+            n_entries += 1
+        if f.tell() > run_start:
+            runs.append((run_start, f.tell()))
+
+    return runs, n_entries
+
+
+def iter_run(spill_file: Path, start: int, end: int) -> Iterator[tuple]:
+    """
+    Stream the entries of a run of a spill file.
+
+    :param spill_file: The spill file.
+    :param start: The byte offset where the run starts.
+    :param end: The byte offset where the run ends.
+    :return: An iterator of `(sort_key, host, entry)` tuples.
+    """
+    with open(spill_file, "rb") as f:
+        f.seek(start)
+        while f.tell() < end:
+            sort_key, host, *fields = pickle.load(f)
+            yield sort_key, host, Entry(*fields)
+
+
+def merge_runs(runs: list, temp_dir: Path) -> list:
+    """
+    Merge runs of spill files by timestamp in groups of `MERGE_FAN_IN` runs, each group
+    into a new spill file, in as many passes as needed to leave at most `MERGE_FAN_IN`
+    runs. The runs are merged in order, so the entries with the same timestamp keep the
+    order of their runs.
+
+    :param runs: The `(spill_file, start, end)` tuples of the runs.
+    :param temp_dir: The directory where to write the new spill files.
+    :return: The `(spill_file, start, end)` tuples of the merged runs.
+    """
+    n_pass = 0
+    while len(runs) > MERGE_FAN_IN:
+        merged_runs = []
+        for i in range(0, len(runs), MERGE_FAN_IN):
+            group = runs[i : i + MERGE_FAN_IN]
+            if len(group) == 1:
+                merged_runs.append(group[0])
+                continue
+            spill_file = temp_dir / f"merge-{n_pass}-{i}.spill"
+            with open(spill_file, "wb") as f:
+                for sort_key, host, entry in heapq.merge(
+                    *(iter_run(*run) for run in group), key=itemgetter(0)
+                ):
+                    record = (sort_key, host, entry.index, entry.timestamp)
+                    record += (entry.signature, entry.message, entry.tags)
+                    pickle.dump(record, f, PICKLE_PROTOCOL)
+                merged_runs.append((spill_file, 0, f.tell()))
+        runs = merged_runs
+        n_pass += 1
+
+    return runs
+
+
+def iter_aggregated_entries(
+    paths: Iterable[Path], workers: Optional[int] = None, counts: Optional[dict] = None
+) -> Iterator[tuple]:
+    """
+    Iterate over the entries of many journals, merged by timestamp. The entries with the
+    same timestamp are sorted by host, and then like in their journal.
+
+    :param paths: The journal files and directories, like in `find_journals`.
+    :param workers: The number of processes that parse the journals. Default is the
+        number of CPUs. With `1`, or a single journal, they are parsed in this process.
+    :param counts: If provided, a dictionary to fill with the number of entries of each
+        host, before the first entry is yielded.
+    :return: An iterator of `(host, entry)` tuples.
+    """
+    journals = find_journals(paths)
+    workers = workers or os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory(prefix="jour-aggregate-") as temp_dir:
+        spill_files = [Path(temp_dir) / f"{i}.spill" for i in range(len(journals))]
+        args = (
+            [journal_file for _, journal_file in journals],
+            spill_files,
+            [host for host, _ in journals],
+        )
+        if workers == 1 or len(journals) <= 1:
+            results = list(map(spill_journal, *args))
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(journals))) as pool:
+                results = list(pool.map(spill_journal, *args))
+
+        if counts is not None:
+            for (host, _), (_, n_entries) in zip(journals, results):
+                counts[host] = n_entries
+
+        runs = [
+            (spill_file, start, end)
+            for spill_file, (file_runs, _) in zip(spill_files, results)
+            for start, end in file_runs
+        ]
+        runs = merge_runs(runs, Path(temp_dir))
+        for _, host, entry in heapq.merge(
+            *(iter_run(*run) for run in runs), key=itemgetter(0)
+        ):
+            yield host, entry
+
+
+def format_aggregated_entry(index: int, host: str, entry: Entry, width: int = 1) -> str:
+    """
+    Format an aggregated entry as a journal line, with its host after its signature,
+    like `1. 2024-03-16 17:04:50,123 - test_username@web1 - OS update.`.
+
+    :param index: The index of the entry in the aggregated timeline.
+    :param host: The host of the entry.
+    :param entry: The entry.
+    :param width: The width of the index, padded with zeros.
+    :return: The journal line.
+    """
+    if entry.timestamp is None:
+        return f"{index:0{width}}. {host} - {entry.message}.\n"
+    return (
+        f"{index:0{width}}. {entry.timestamp} - {entry.signature}@{host} - "
+        f"{entry.message}.\n"
+    )
+
+
+def write_aggregated_journal(
+    paths: Iterable[Path],
+    output: TextIO,
+    output_format: str = "markdown",
+    workers: Optional[int] = None,
+) -> int:
+    """
+    Write the timeline of many journals, merged by timestamp, as it is computed.
+
+    :param paths: The journal files and directories, like in `find_journals`.
+    :param output: The text stream to write.
+    :param output_format: `markdown`, to write a journal, renumbering its entries, or
+        `json`, to write an array of objects with the `host`, `index`, `timestamp`,
+        `signature`, `message` and `tags` of each entry.
+    :param workers: The number of processes that parse the journals. Default is the
+        number of CPUs.
+    :return: The number of written entries.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: `{output_format}`")
+
+    counts = {}
+    n_entries = 0
+    for host, entry in iter_aggregated_entries(paths, workers=workers, counts=counts):
+        n_entries += 1
+        if output_format == "markdown":
+            if n_entries == 1:
+                width = len(str(sum(counts.values())))  # Index padding of the journal
+            output.write(format_aggregated_entry(n_entries, host, entry, width))
+        else:
+            record = {"host": host, **entry.to_dict()}
+            output.write("[\n" if n_entries == 1 else ",\n")
+            output.write(f"  {json.dumps(record)}")
+
+    if output_format == "json":
+        output.write("\n]\n" if n_entries else "[]\n")
+
+    return n_entries
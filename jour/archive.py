@@ -0,0 +1,452 @@
+"""
+Archive
+=======
+
+This module implements the compressed archives of the sealed journal segments. An
+archive is a sequence of independently compressed blocks of whole journal lines, so it
+is still a valid gzip or xz file that the usual tools can read. A block index next to it
+stores where each block starts, in the archive and in the decompressed journal, with its
+first entry and its time range, so the reads only decompress the blocks they need.
+"""
+
+import bisect
+import gzip
+import json
+import logging
+import lzma
+import os
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+try:
+    from .tag_index import ENTRY_INDEX_REGEX, TagIndex
+    from .time_index import match_line, parse_line_header
+except ImportError:  # pragma: no cover
+    from tag_index import ENTRY_INDEX_REGEX, TagIndex
+    from time_index import match_line, parse_line_header
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Supported compressions, with the suffix of their archives
+COMPRESSIONS = {"gzip": ".gz", "lzma": ".xz"}
+
+# Size of the decompressed journal lines of each archive block
+ARCHIVE_BLOCK_SIZE = 65536
+
+
+def get_compression(archive_file: Path) -> Optional[str]:
+    """
+    Get the compression of a journal file from its suffix.
+
+    :param archive_file: The journal file.
+    :return: The compression, or `None` if the file is not an archive.
+    """
+    for compression, suffix in COMPRESSIONS.items():
+        if Path(archive_file).suffix == suffix:
+            return compression
+
+    return None
+
+
+def open_archive(archive_file: Path):
+    """
+    Open an archive to read it decompressed, as a whole.
+
+    :param archive_file: The archive file.
+    :return: The decompressed file, opened in binary mode.
+    """
+    if get_compression(archive_file) == "gzip":
+        return gzip.open(archive_file, "rb")
+    return lzma.open(archive_file, "rb")
+
+
+class BlockIndex:
+    """
+    Index of the blocks of an archive. For each block it stores a list with its byte
+    offset in the archive, its byte offset in the decompressed journal, the number of its
+    first entry (or `None`) and its first and last timestamps (or `None`), in
+    chronological order.
+
+    The index is written along the archive, and persisted in a sidecar file next to it.
+    Like the other indexes, it is checked against the size and modification time of the
+    archive when refreshed, and rebuilt decompressing the archive if they do not match.
+    """
+
+    VERSION = 1
+
+    def __init__(self, archive_file: Path, persistent: bool = True):
+        """
+        Initialize the block index of an archive. Call `refresh` to load it, or `write`
+        to create the archive.
+
+        :param archive_file: The archive file, with the suffix of its compression.
+        :param persistent: If `True`, load and save the index from its sidecar file. If
+            `False`, build it only in memory.
+        """
+        self.archive_file = Path(archive_file)
+        self.compression = get_compression(self.archive_file)
+        if self.compression is None:
+            raise ValueError(f"Unknown compression of `{self.archive_file}`.")
+        self.index_file = self.archive_file.with_name(
+            f".{self.archive_file.name}.blocks.json"
+        )
+        self.persistent = persistent
+
+        self.blocks: list = []
+        self._archive_size = 0
+        self._archive_mtime_ns = 0
+
+    def write(self, lines: Iterable[str]) -> "BlockIndex":
+        """
+        Write some journal lines to the archive, compressing them in blocks, and index
+        it. The archive is written to the disk before returning.
+
+        :param lines: The journal lines, with their line breaks.
+        :return: The index itself.
+        """
+        self.blocks = []
+        with open(self.archive_file, "wb") as f:
+            block_lines = []
+            block_size = 0
+            decompressed_offset = 0
+            for line in lines:
+                line = line.encode()
+                block_lines.append(line)
+                block_size += len(line)
+                if block_size >= ARCHIVE_BLOCK_SIZE:
+                    self.__write_block(f, block_lines, decompressed_offset)
+                    decompressed_offset += block_size
+                    block_lines, block_size = [], 0
+            if block_lines:
+                self.__write_block(f, block_lines, decompressed_offset)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.__update_stat()
+        if self.persistent:
+            self.__save()
+
+        return self
+
+    def refresh(self) -> "BlockIndex":
+        """
+        Load the index, rebuilding it if it does not match the archive, and save it if
+        persistent.
+
+        :return: The index itself.
+        """
+        if self.persistent:
+            self.__load()
+
+        stat = os.stat(self.archive_file)
+        if (
+            stat.st_size == self._archive_size
+            and stat.st_mtime_ns == self._archive_mtime_ns
+        ):
+            return self  # Up to date
+
+        logger.debug(f"Rebuilding block index of `{self.archive_file}`...")
+        self.__scan()
+        self.__update_stat()
+        if self.persistent:
+            self.__save()
+
+        return self
+
+    def read_block(self, position: int) -> bytes:
+        """
+        Read and decompress a block of the archive.
+
+        :param position: The position of the block in the index.
+        :return: The decompressed journal lines of the block.
+        """
+        start = self.blocks[position][0]
+        stop = (
+            self.blocks[position + 1][0]
+            if position + 1 < len(self.blocks)
+            else self._archive_size
+        )
+        with open(self.archive_file, "rb") as f:
+            f.seek(start)
+            data = f.read(stop - start)
+
+        decompressor = self.__new_decompressor()
+        return decompressor.decompress(data)
+
+    def iter_lines(self, first_block: int = 0) -> Iterator[str]:
+        """
+        Decompress the lines of the archive, block by block, so the memory used does not
+        depend on its size.
+
+        :param first_block: The position of the block to start with.
+        :return: An iterator of the lines, with their line breaks.
+        """
+        for position in range(first_block, len(self.blocks)):
+            data = self.read_block(position)
+            for line in data.splitlines(keepends=True):
+                yield line.decode(errors="replace")
+
+    def iter_lines_reversed(self) -> Iterator[str]:
+        """
+        Decompress the lines of the archive, from its last block, so getting the last
+        lines does not decompress the rest.
+
+        :return: An iterator of the lines, with their line breaks, from the last one.
+        """
+        for position in reversed(range(len(self.blocks))):
+            data = self.read_block(position)
+            for line in reversed(data.splitlines(keepends=True)):
+                yield line.decode(errors="replace")
+
+    def read_line(self, offset: int) -> str:
+        """
+        Read the line that starts at a byte offset of the decompressed journal.
+
+        :param offset: The byte offset of the line.
+        :return: The line, with its line break.
+        """
+        position = bisect.bisect_right([block[1] for block in self.blocks], offset) - 1
+        data = self.read_block(position)
+        start = offset - self.blocks[position][1]
+        end = data.find(b"\n", start) + 1 or len(data)
+        return data[start:end].decode(errors="replace")
+
+    def read_entries(self, first: int, last: int) -> list:
+        """
+        Read the lines of a range of entries, decompressing from the block of the first
+        one.
+
+        :param first: The number of the first entry.
+        :param last: The number of the last entry, included.
+        :return: The lines of the entries in the range.
+        """
+        # The blocks without entries, only with lines of the previous entry, are left out
+        positions = [
+            position
+            for position, block in enumerate(self.blocks)
+            if block[2] is not None
+        ]
+        first_entries = [self.blocks[position][2] for position in positions]
+        keyed_position = bisect.bisect_right(first_entries, first) - 1
+        first_block = positions[keyed_position] if keyed_position >= 0 else 0
+
+        lines = []
+        for line in self.iter_lines(first_block):
+            match = ENTRY_INDEX_REGEX.match(line)
+            if not match:
+                continue
+            entry = int(match.group(1))
+            if entry > last:
+                break
+            if entry >= first:
+                lines.append(line)
+
+        return lines
+
+    def find(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        signature: Optional[str] = None,
+    ) -> list:
+        """
+        Find the lines that match a query, like `TimeIndex.find`, only decompressing the
+        blocks that overlap the time range.
+
+        :return: The matching lines, in chronological order.
+        """
+        found = []
+        for position, (_, _, _, first_timestamp, last_timestamp) in enumerate(
+            self.blocks
+        ):
+            if first_timestamp is None:
+                continue  # Block without timestamps
+            if (since and last_timestamp < since) or (
+                until and first_timestamp > until
+            ):
+                continue
+            for line in self.read_block(position).splitlines(keepends=True):
+                timestamp = match_line(line, since, until, signature)
+                if timestamp:
+                    found.append((timestamp, line.decode(errors="replace")))
+
+        return [line for _, line in sorted(found, key=lambda item: item[0])]
+
+    def __new_decompressor(self):
+        """
+        Get a decompressor for a block of the archive.
+
+        :return: The decompressor.
+        """
+        if self.compression == "gzip":
+            return zlib.decompressobj(wbits=31)  # Gzip header and trailer
+        return lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+
+    def __write_block(self, f, block_lines: list, decompressed_offset: int) -> None:
+        """
+        Compress a block of lines and append it to the archive.
+
+        :param f: The archive file, opened in binary mode.
+        :param block_lines: The encoded lines of the block.
+        :param decompressed_offset: The byte offset of the block in the decompressed
+            journal.
+        """
+        data = b"".join(block_lines)
+        self.blocks.append(self.__describe_block(f.tell(), decompressed_offset, data))
+        if self.compression == "gzip":
+            f.write(gzip.compress(data, mtime=0))
+        else:
+            f.write(lzma.compress(data, format=lzma.FORMAT_XZ))
+
+    @staticmethod
+    def __describe_block(offset: int, decompressed_offset: int, data: bytes) -> list:
+        """
+        Get the index item of a block.
+
+        :param offset: The byte offset of the block in the archive.
+        :param decompressed_offset: The byte offset of the block in the decompressed
+            journal.
+        :param data: The decompressed journal lines of the block.
+        :return: The index item.
+        """
+        first_entry, timestamps = None, []
+        for line in data.splitlines():
+            if first_entry is None:
+                match = ENTRY_INDEX_REGEX.match(line.decode(errors="replace"))
+                first_entry = int(match.group(1)) if match else None
+            header = parse_line_header(line)
+            if header:
+                timestamps.append(header[0])
+
+        return [
+            offset,
+            decompressed_offset,
+            first_entry,
+            min(timestamps, default=None),
+            max(timestamps, default=None),
+        ]
+
+    def __scan(self) -> None:
+        """
+        Rebuild the index decompressing the archive, finding where each compressed block
+        ends.
+        """
+        self.blocks = []
+        with open(self.archive_file, "rb") as f:
+            offset = 0  # Start of the current block in the archive
+            decompressed_offset = 0
+            decompressor = self.__new_decompressor()
+            block_size = 0
+            data = []
+            pending = b""
+            while True:
+                chunk = pending or f.read(ARCHIVE_BLOCK_SIZE)
+                if not chunk:
+                    break
+                data.append(decompressor.decompress(chunk))
+                if not decompressor.eof:
+                    block_size += len(chunk)
+                    pending = b""
+                    continue
+
+                # End of the block: the rest of the chunk is the next one
+                pending = decompressor.unused_data
+                block_size += len(chunk) - len(pending)
+                block_data = b"".join(data)
+                self.blocks.append(
+                    self.__describe_block(offset, decompressed_offset, block_data)
+                )
+                offset += block_size
+                decompressed_offset += len(block_data)
+                decompressor = self.__new_decompressor()
+                block_size = 0
+                data = []
+
+    def __update_stat(self) -> None:
+        """
+        Register the size and modification time of the indexed archive.
+        """
+        stat = os.stat(self.archive_file)
+        self._archive_size = stat.st_size
+        self._archive_mtime_ns = stat.st_mtime_ns
+
+    def __load(self) -> None:
+        """
+        Load the index from its sidecar file, if it exists and is valid.
+        """
+        try:
+            with open(self.index_file, "r") as f:
+                data = json.load(f)
+            if data["version"] != self.VERSION:
+                return  # Old index, rebuild it
+            blocks = [list(block) for block in data["blocks"]]
+            archive_size = int(data["archive_size"])
+            archive_mtime_ns = int(data["archive_mtime_ns"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return  # Missing or corrupt index, rebuild it
+
+        self.blocks = blocks
+        self._archive_size = archive_size
+        self._archive_mtime_ns = archive_mtime_ns
+
+    def __save(self) -> None:
+        """
+        Save the index to its sidecar file, replacing it atomically.
+        """
+        data = {
+            "version": self.VERSION,
+            "archive_size": self._archive_size,
+            "archive_mtime_ns": self._archive_mtime_ns,
+            "blocks": self.blocks,
+        }
+        temp_file = self.index_file.with_name(f"{self.index_file.name}.tmp")
+        try:
+            with open(temp_file, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(temp_file, self.index_file)
+        except OSError as e:
+            logger.debug(f"Block index not saved in `{self.index_file}`: {e}")
+
+
+class ArchiveTagIndex(TagIndex):
+    """
+    Tag index of an archive, like the one of a journal file, whose occurrence offsets are
+    byte offsets of the decompressed journal. Its lines are read through the block index.
+    """
+
+    def __init__(
+        self, archive_file: Path, block_index: BlockIndex, persistent: bool = True
+    ):
+        """
+        Initialize the tag index of an archive. Call `refresh` to load it.
+
+        :param archive_file: The archive file.
+        :param block_index: The block index of the archive, already refreshed.
+        :param persistent: If `True`, load and save the index from its sidecar file.
+        """
+        super().__init__(archive_file, persistent=persistent)
+        self.block_index = block_index
+
+    def _open(self):
+        """
+        Open the archive to scan it, decompressed.
+
+        :return: The decompressed archive, opened in binary mode.
+        """
+        return open_archive(self.journal_file)
+
+    def read_line(self, offset: int) -> str:
+        """
+        Read the line of the decompressed journal that starts at a byte offset.
+
+        :param offset: The byte offset of the line.
+        :return: The line, with its line break.
+        """
+        return self.block_index.read_line(offset)
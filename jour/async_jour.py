@@ -0,0 +1,153 @@
+"""
+Async Jour
+==========
+
+This module implements `AsyncJour`, the asyncio version of `Jour`, for programs built on
+`asyncio`. The `Jour` operations block, waiting for the lock over the journal file and
+reading and writing it, so each one runs in a worker thread with `asyncio.to_thread`,
+and the event loop keeps running meanwhile. A `Jour` is not thread-safe, so an
+`asyncio.Lock` serializes the operations: the concurrent ones wait for it and run one at
+a time, in the order they were requested.
+"""
+
+import asyncio
+from typing import Iterable, Optional
+
+try:
+    from .jour import Jour
+except ImportError:  # pragma: no cover
+    from jour import Jour
+
+
+class AsyncJour:
+    """
+    Asyncio version of `Jour`, intended to be used as an async context manager. The
+    operations run in a worker thread, so waiting for the lock over the journal file or
+    reading and writing it does not block the event loop. Concurrent operations are
+    queued and run one at a time, in order.
+    """
+
+    def __init__(self, jour: Optional[Jour] = None, **kwargs):
+        """
+        Initialize the AsyncJour.
+
+        :param jour: The `Jour` to use. If not provided, a new one is created with the
+            keyword arguments, like the `Jour` parameters, when entering the context.
+        """
+        self.jour = jour
+        self._jour_kwargs = kwargs
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        """
+        Enter the context manager, entering the `Jour` context.
+        """
+        if self.jour is None:
+            # Creating the `Jour` checks the journal file reachability
+            self.jour = await asyncio.to_thread(Jour, **self._jour_kwargs)
+        await self.__run(self.jour.__enter__)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """
+        Exit the context manager, writing the changes to the journal file.
+        """
+        await self.__run(self.jour.__exit__, exc_type, exc_value, traceback)
+
+    async def __run(self, function, *args, **kwargs):
+        """
+        Run a `Jour` method in a worker thread, after the previous queued operations.
+
+        :param function: The method to run.
+        :return: The method result.
+        """
+        async with self._lock:
+            return await asyncio.to_thread(function, *args, **kwargs)
+
+    async def flush(self) -> None:
+        """
+        Write the changes made in the context to the journal file, like `Jour.flush`.
+        """
+        await self.__run(self.jour.flush)
+
+    async def print_journal(self, n_lines: int = 10) -> None:
+        """
+        Read the journal and print its last lines, like `Jour.print_journal`.
+        """
+        await self.__run(self.jour.print_journal, n_lines)
+
+    async def last_lines(self, n_lines: int = 10) -> list:
+        """
+        Get the last lines of the journal, like `Jour.last_lines`.
+        """
+        return await self.__run(self.jour.last_lines, n_lines)
+
+    async def write_line(
+        self,
+        message: str,
+        signature: Optional[str] = None,
+        as_command: bool = False,
+        printing: bool = True,
+    ) -> str:
+        """
+        Write a new line to the journal, like `Jour.write_line`.
+        """
+        return await self.__run(
+            self.jour.write_line,
+            message,
+            signature=signature,
+            as_command=as_command,
+            printing=printing,
+        )
+
+    async def write_lines(self, entries: Iterable, printing: bool = True) -> list:
+        """
+        Write many new lines to the journal at once, like `Jour.write_lines`.
+        """
+        return await self.__run(self.jour.write_lines, list(entries), printing=printing)
+
+    async def append_to_last_line(
+        self, new_message: str, as_command: bool = False, printing: bool = True
+    ) -> str:
+        """
+        Add some new content to the last line of the journal, like
+        `Jour.append_to_last_line`.
+        """
+        return await self.__run(
+            self.jour.append_to_last_line,
+            new_message,
+            as_command=as_command,
+            printing=printing,
+        )
+
+    async def remove_last_line(self) -> None:
+        """
+        Remove the last line of the journal, like `Jour.remove_last_line`.
+        """
+        await self.__run(self.jour.remove_last_line)
+
+    async def tag_last_line(
+        self, tag_name: str, indexing: bool = True, printing: bool = True
+    ) -> str:
+        """
+        Add a tag to the last line of the journal, like `Jour.tag_last_line`.
+        """
+        return await self.__run(
+            self.jour.tag_last_line, tag_name, indexing=indexing, printing=printing
+        )
+
+    async def get_next_tag(
+        self, tag_name: str, indexing: bool = True, printing: bool = True
+    ) -> str:
+        """
+        Get a new full tag with its next index, like `Jour.get_next_tag`.
+        """
+        return await self.__run(
+            self.jour.get_next_tag, tag_name, indexing=indexing, printing=printing
+        )
+
+    async def tag_index(self) -> dict:
+        """
+        Get the maximum index of each tag used in the journal, like `Jour.tag_index`.
+        """
+        return await self.__run(self.jour.tag_index)
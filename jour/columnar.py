@@ -0,0 +1,289 @@
+"""
+Columnar
+========
+
+This module implements a columnar representation of the journal entries, with a typed
+array per field, to keep long histories in memory and aggregate them, like counting the
+entries per day or the tags per month. It only uses the standard library `array` module.
+"""
+
+import datetime
+from array import array
+from collections import Counter
+from itertools import islice
+from typing import Iterable, Iterator, Optional
+
+try:
+    from .entry import Entry
+except ImportError:  # pragma: no cover
+    from entry import Entry
+
+# Value of the timestamps and the codes of the entries without them
+MISSING = -1
+
+# Milliseconds per day, to group the timestamps by day
+DAY_MS = 86_400_000
+
+# Ordinal of the epoch, the origin of the timestamps
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def timestamp_to_ms(timestamp: str) -> int:
+    """
+    Convert a journal timestamp, like `2024-03-16 17:04:50,123`, to milliseconds since the
+    epoch, without time zone.
+
+    :param timestamp: The journal timestamp.
+    :return: The milliseconds since the epoch.
+    """
+    days = (
+        datetime.date(
+            int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10])
+        ).toordinal()
+        - EPOCH_ORDINAL
+    )
+    seconds = int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60
+    seconds += int(timestamp[17:19])
+    return (days * 86_400 + seconds) * 1000 + int(timestamp[20:23])
+
+
+def ms_to_timestamp(ms: int) -> str:
+    """
+    Convert milliseconds since the epoch to a journal timestamp.
+
+    :param ms: The milliseconds since the epoch.
+    :return: The journal timestamp.
+    """
+    moment = datetime.datetime(1970, 1, 1) + datetime.timedelta(milliseconds=ms)
+    return moment.strftime("%Y-%m-%d %H:%M:%S,%f")[:-3]
+
+
+class ColumnarJournal:
+    """
+    Columnar representation of the journal entries, for analytics over long histories.
+    Instead of a string per line, each field is kept in a typed array: the indexes, the
+    timestamps (as milliseconds since the epoch) and the signatures and tag names, interned
+    as small integer codes. The messages are kept in a shared buffer, with their offsets.
+
+    The aggregations work over the integer columns, counting code tuples, and only
+    translate the codes to names in their results.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty columnar journal. Use `from_entries` to fill it.
+        """
+        self.indexes = array("Q")
+        self.timestamps = array("q")
+        self.signature_codes = array("i")
+        self.message_offsets = array("Q", [0])
+        self.messages = bytearray()
+        self.tag_offsets = array("Q", [0])  # Tags of each entry in the tag columns
+        self.tag_codes = array("I")
+        self.tag_indexes = array("Q")
+
+        self.signatures: list = []  # Signature of each code
+        self.tag_names: list = []  # Tag name of each code
+        self._signature_codes: dict = {}
+        self._tag_codes: dict = {}
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Entry]) -> "ColumnarJournal":
+        """
+        Build a columnar journal from some entries, like the ones of `Jour.iter_entries`.
+
+        :param entries: The entries.
+        :return: The columnar journal.
+        """
+        columnar = cls()
+        for entry in entries:
+            columnar.append(entry)
+
+        return columnar
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def append(self, entry: Entry) -> None:
+        """
+        Add an entry to the columns.
+
+        :param entry: The entry.
+        """
+        self.indexes.append(entry.index)
+        self.timestamps.append(
+            timestamp_to_ms(entry.timestamp) if entry.timestamp else MISSING
+        )
+        self.signature_codes.append(
+            self.__intern(entry.signature, self.signatures, self._signature_codes)
+            if entry.signature is not None
+            else MISSING
+        )
+        self.messages += entry.message.encode()
+        self.message_offsets.append(len(self.messages))
+        for tag_name, tag_index in entry.tags:
+            self.tag_codes.append(
+                self.__intern(tag_name, self.tag_names, self._tag_codes)
+            )
+            self.tag_indexes.append(tag_index)
+        self.tag_offsets.append(len(self.tag_codes))
+
+    def entry(self, position: int) -> Entry:
+        """
+        Get an entry from the columns.
+
+        :param position: The position of the entry, from `0` to `len(self) - 1`.
+        :return: The entry.
+        """
+        timestamp = self.timestamps[position]
+        signature_code = self.signature_codes[position]
+        tags_start, tags_end = self.tag_offsets[position : position + 2]
+        return Entry(
+            self.indexes[position],
+            ms_to_timestamp(timestamp) if timestamp != MISSING else None,
+            self.signatures[signature_code] if signature_code != MISSING else None,
+            self.message(position),
+            tuple(
+                (self.tag_names[code], index)
+                for code, index in zip(
+                    self.tag_codes[tags_start:tags_end],
+                    self.tag_indexes[tags_start:tags_end],
+                )
+            ),
+        )
+
+    def message(self, position: int) -> str:
+        """
+        Get the message of an entry from the shared buffer.
+
+        :param position: The position of the entry.
+        :return: The message.
+        """
+        start, end = self.message_offsets[position : position + 2]
+        return self.messages[start:end].decode(errors="replace")
+
+    def memory_size(self) -> int:
+        """
+        Get the memory used by the columns, in bytes, without the interned names.
+
+        :return: The memory size.
+        """
+        columns = (
+            self.indexes,
+            self.timestamps,
+            self.signature_codes,
+            self.message_offsets,
+            self.tag_offsets,
+            self.tag_codes,
+            self.tag_indexes,
+        )
+        return len(self.messages) + sum(
+            column.itemsize * len(column) for column in columns
+        )
+
+    def entries_per_day(self, signature: Optional[str] = None) -> dict:
+        """
+        Count the entries per day and signature.
+
+        :param signature: If provided, only count the entries with this signature.
+        :return: The map of `(day, signature)` to the number of entries, where `day` is
+            an ISO date, like `2024-03-16`, sorted by day.
+        """
+        keys = zip(self.__iter_days(), self.signature_codes)
+        if signature is not None:
+            code = self._signature_codes.get(signature)
+            keys = (key for key in keys if key[1] == code)
+        counts = Counter(keys)
+
+        return {
+            (self.__day_to_iso(day), self.__signature(code)): n
+            for (day, code), n in sorted(counts.items(), key=self.__sort_key)
+        }
+
+    def tag_frequency(self, period: str = "month") -> dict:
+        """
+        Count the uses of each tag over time.
+
+        :param period: The period to group the uses: `day`, `month` or `year`.
+        :return: The map of `(period, tag_name)` to the number of uses, where `period` is
+            like `2024-03-16`, `2024-03` or `2024`, sorted by period.
+        """
+        period_length = {"day": 10, "month": 7, "year": 4}[period]
+
+        # Day of each tag use, repeating the day of each entry by its number of tags
+        tag_days = (
+            day
+            for day, start, end in zip(
+                self.__iter_days(), self.tag_offsets, islice(self.tag_offsets, 1, None)
+            )
+            for _ in range(end - start)
+        )
+
+        counts = Counter()
+        for (day, code), n in Counter(zip(tag_days, self.tag_codes)).items():
+            iso_day = self.__day_to_iso(day)
+            counts[(iso_day[:period_length] if iso_day else None, code)] += n
+
+        return {
+            (key_period, self.tag_names[code]): n
+            for (key_period, code), n in sorted(counts.items(), key=self.__sort_key)
+        }
+
+    def __iter_days(self) -> Iterator[Optional[int]]:
+        """
+        Iterate over the day of each entry, from its timestamp column.
+
+        :return: An iterator of the days since the epoch, or `None` for the entries
+            without timestamp.
+        """
+        for t in self.timestamps:
+            yield t // DAY_MS if t != MISSING else None
+
+    @staticmethod
+    def __intern(name: str, names: list, codes: dict) -> int:
+        """
+        Get the code of an interned name, interning it if new.
+
+        :param name: The name.
+        :param names: The list of interned names, by code.
+        :param codes: The map of interned names to codes.
+        :return: The code.
+        """
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+
+        return code
+
+    def __signature(self, code: int) -> Optional[str]:
+        """
+        Get the signature of a code.
+
+        :param code: The signature code.
+        :return: The signature, or `None` if missing.
+        """
+        return self.signatures[code] if code != MISSING else None
+
+    @staticmethod
+    def __day_to_iso(day: Optional[int]) -> Optional[str]:
+        """
+        Convert a day since the epoch to an ISO date.
+
+        :param day: The day since the epoch.
+        :return: The ISO date, or `None` if missing.
+        """
+        if day is None:
+            return None
+        return datetime.date.fromordinal(EPOCH_ORDINAL + day).isoformat()
+
+    @staticmethod
+    def __sort_key(item: tuple) -> tuple:
+        """
+        Sort key of the aggregation items, placing the missing periods first.
+
+        :param item: The aggregation item, as `((period, code), count)`.
+        :return: The sort key.
+        """
+        (period, code), _ = item
+        return (period is not None, period or 0, code)
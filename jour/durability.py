@@ -0,0 +1,152 @@
+"""
+Durability
+==========
+
+This module implements the commit strategies of the journal file writes, selected with
+the `durability` argument of `Jour` or the `JOURNAL_DURABILITY` environment variable:
+
+- `atomic`: each commit writes a new journal file next to the journal, syncs it to the
+  disk and replaces the journal with it. After a crash, the journal file is the previous
+  or the new one, never a mix of them. It is the safest and slowest mode, because each
+  commit copies the journal file.
+- `append`: the new lines are appended to the journal file, and the modified lines are
+  rewritten in place, syncing them to the disk before returning. A crash in the middle of
+  a commit can only tear its own lines, at the end of the journal. Full rewrites, like
+  the ones that change the index padding, are atomic. This is the default mode.
+- `fast`: like `append`, but without syncing to the disk, so the commits are as fast as
+  the file system cache. A crash of the process does not lose the commits, but a crash of
+  the host or a power loss can lose the last ones. Useful in ephemeral hosts.
+
+In all the modes, the journal file is never truncated before writing its new content.
+"""
+
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Commit strategies, from the safest to the fastest
+DURABILITY_MODES = ("atomic", "append", "fast")
+
+# Default commit strategy, if not defined in `JOURNAL_DURABILITY`
+DEFAULT_DURABILITY = "append"
+
+# Size of the chunks copied when replacing the journal file
+COPY_BLOCK_SIZE = 1 << 20
+
+
+def get_durability(durability: Optional[str] = None) -> str:
+    """
+    Get the commit strategy of the journal writes.
+
+    :param durability: The commit strategy. If `None`, the one defined in the
+        `JOURNAL_DURABILITY` environment variable, or `DEFAULT_DURABILITY`.
+    :return: The commit strategy.
+    """
+    if durability is None:
+        durability = os.getenv("JOURNAL_DURABILITY") or DEFAULT_DURABILITY
+    durability = durability.strip().lower()
+    if durability not in DURABILITY_MODES:
+        raise ValueError(
+            f"Unknown durability mode: `{durability}`. Use one of "
+            f"{', '.join(f'`{mode}`' for mode in DURABILITY_MODES)}."
+        )
+
+    return durability
+
+
+def fsync_directory(directory: Path) -> None:
+    """
+    Sync a directory to the disk, so the files replaced in it persist after a crash.
+
+    :param directory: The directory.
+    """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:  # pragma: no cover
+        return  # Not supported, like in some network file systems
+    try:
+        os.fsync(fd)
+    except OSError:  # pragma: no cover
+        pass
+    finally:
+        os.close(fd)
+
+
+def read_prefix(file: Path, length: int) -> Iterator[bytes]:
+    """
+    Read the first bytes of a file in chunks.
+
+    :param file: The file.
+    :param length: The number of bytes to read.
+    :return: An iterator of the chunks.
+    """
+    with open(file, "rb") as f:
+        while length > 0:
+            chunk = f.read(min(COPY_BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def replace_file(file: Path, chunks: Iterable[bytes], fsync: bool = True) -> None:
+    """
+    Replace the content of a file atomically: write the new content to a temporary file
+    next to it, with the same permissions, and move it over the file.
+
+    :param file: The file to replace.
+    :param chunks: The new content, in chunks.
+    :param fsync: If `True`, sync the new content and the directory to the disk.
+    """
+    file = Path(os.path.realpath(file))  # Replace the target of the links
+    temp_file = file.with_name(f".{file.name}.tmp")
+    try:
+        with open(temp_file, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        if file.exists():
+            shutil.copymode(file, temp_file)
+        os.replace(temp_file, file)
+    except BaseException:
+        temp_file.unlink(missing_ok=True)
+        raise
+
+    if fsync:
+        fsync_directory(file.parent)
+
+
+def patch_file(file: Path, offset: int, data: bytes, fsync: bool = True) -> None:
+    """
+    Replace the end of a file from a byte offset in place, or append to it if the offset
+    is its end.
+
+    :param file: The file.
+    :param offset: The byte offset where the new end starts.
+    :param data: The new end of the file.
+    :param fsync: If `True`, sync the new content to the disk.
+    """
+    if offset == os.path.getsize(file):
+        # Open in append mode (`O_APPEND`) to write at the end of the file
+        f = open(file, "ab")
+    else:
+        f = open(file, "r+b")
+        f.seek(offset)
+    with f:
+        f.write(data)
+        f.truncate()
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
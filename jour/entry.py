@@ -0,0 +1,98 @@
+"""
+Entry
+=====
+
+This module implements the parsing of the journal lines into `Entry` objects, with their
+index, timestamp, signature, message and tags. They are the items yielded to the library
+users, like by the `export` and `aggregate` modules, and the rows of the `columnar` one.
+"""
+
+import re
+from typing import Optional
+
+try:
+    from .tag_index import TAG_REGEX
+except ImportError:  # pragma: no cover
+    from tag_index import TAG_REGEX
+
+# Regex to match a journal line: `N. YYYY-MM-DD HH:MM:SS,mmm - signature - message.`,
+# capturing its index, timestamp, signature and message. Lines without timestamp and
+# signature are matched too, with only the index and the message
+ENTRY_REGEX = re.compile(
+    r"^(\d+)\. "
+    r"(?:(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (.*?) - )?"
+    r"(.*?)\.?\n?$",
+    re.DOTALL,
+)
+
+
+class Entry:
+    """
+    Parsed journal entry. It uses `__slots__` to be compact, so many of them can be kept
+    in memory.
+
+    :ivar index: The entry index, the `N` of the line `N. ...`.
+    :ivar timestamp: The entry timestamp, as written in the journal, like
+        `2024-03-16 17:04:50,123`, or `None` if the line has not timestamp.
+    :ivar signature: The entry author, or `None` if the line has not signature.
+    :ivar message: The entry message, with the appended messages and tags, without the
+        last period.
+    :ivar tags: The entry tags, as `(tag_name, index)` tuples.
+    """
+
+    __slots__ = ("index", "timestamp", "signature", "message", "tags")
+
+    def __init__(
+        self,
+        index: int,
+        timestamp: Optional[str],
+        signature: Optional[str],
+        message: str,
+        tags: tuple = (),
+    ):
+        self.index = index
+        self.timestamp = timestamp
+        self.signature = signature
+        self.message = message
+        self.tags = tags
+
+    @classmethod
+    def from_line(cls, line: str) -> Optional["Entry"]:
+        """
+        Parse a journal line.
+
+        :param line: The journal line.
+        :return: The entry, or `None` if the line is not a numbered journal line.
+        """
+        match = ENTRY_REGEX.match(line)
+        if not match:
+            return None
+
+        index, timestamp, signature, message = match.groups()
+        tags = tuple(
+            (tag_name, int(tag_index))
+            for tag_name, tag_index in TAG_REGEX.findall(line)
+        )
+        return cls(int(index), timestamp, signature, message, tags)
+
+    def to_dict(self) -> dict:
+        """
+        Get the entry fields, to serialize it, like as JSON.
+
+        :return: The `index`, `timestamp`, `signature`, `message` and `tags` of the entry.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Entry):
+            return NotImplemented
+        return all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"Entry(index={self.index!r}, timestamp={self.timestamp!r}, "
+            f"signature={self.signature!r}, message={self.message!r}, "
+            f"tags={self.tags!r})"
+        )
@@ -0,0 +1,313 @@
+"""
+Entry index
+===========
+
+This module implements the index of the byte offsets of the journal entries by their
+number, kept in a binary sidecar file next to the journal file, so `jour --show` seeks
+straight to an entry whatever the size of the journal.
+"""
+
+import logging
+import os
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+from typing import Optional
+
+try:
+    from .tag_index import ENTRY_INDEX_REGEX
+except ImportError:  # pragma: no cover
+    from tag_index import ENTRY_INDEX_REGEX
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Header of the sidecar file: magic, version, number of entries, first entry number,
+# journal size and modification time, start of the last indexed line, and length and
+# CRC32 of the line before it. The byte offsets of the entries follow the header
+HEADER = struct.Struct("<8sIQQQQQQI")
+MAGIC = b"JOURIDX\0"
+
+# Size of each byte offset in the sidecar file
+OFFSET_SIZE = 8
+
+
+class EntryIndex:
+    """
+    Index of the byte offsets of the entries of a journal file, to seek straight to an
+    entry by its number. Entries are numbered consecutively, so the offsets are stored in
+    an array where the position of each entry is its number minus the number of the first
+    one. Lines numbered out of sequence, like the ones of an unformatted merge, are not
+    indexed.
+
+    The index is persisted in a binary sidecar file next to the journal, with a header
+    and the array of offsets, so an entry offset is read seeking to its position in the
+    sidecar file, without loading the rest. Like the tag index, it is checked against the
+    size and modification time of the journal file when refreshed, and only the lines
+    from the last indexed line onwards are scanned again, unless the previous content of
+    the file has changed too, in which case the index is rebuilt.
+    """
+
+    VERSION = 1
+
+    def __init__(self, journal_file: Path, persistent: bool = True):
+        """
+        Initialize the entry index of a journal file. Call `refresh` to load it.
+
+        :param journal_file: The journal file to index.
+        :param persistent: If `True`, load and save the index from its sidecar file. If
+            `False`, build it only in memory.
+        """
+        self.journal_file = Path(journal_file)
+        self.index_file = self.journal_file.with_name(
+            f".{self.journal_file.name}.entries.idx"
+        )
+        self.persistent = persistent
+        self._loaded = False
+
+        self.count = 0
+        self.first_entry = 0
+        self._offsets = array("Q")  # Only used if not persistent
+        self._journal_size = 0
+        self._journal_mtime_ns = 0
+        self._scanned_offset = 0  # Start of the last indexed line, scanned again
+        self._anchor_length = 0  # Line before `_scanned_offset`, to check it has not
+        self._anchor_crc = 0  # changed, by its length and CRC32
+
+    @property
+    def last_entry(self) -> int:
+        """
+        The number of the last indexed entry, or `0` if there are no entries.
+        """
+        return self.first_entry + self.count - 1 if self.count else 0
+
+    def refresh(self) -> "EntryIndex":
+        """
+        Bring the index up to date with the journal file, scanning only its new part when
+        possible, and save it if persistent.
+
+        :return: The index itself.
+        """
+        if self.persistent and not self._loaded:
+            self.__load()
+            self._loaded = True
+
+        stat = os.stat(self.journal_file)
+        if (
+            stat.st_size == self._journal_size
+            and stat.st_mtime_ns == self._journal_mtime_ns
+        ):
+            return self  # Up to date
+
+        with open(self.journal_file, "rb") as f:
+            if not self.__check_anchor(f, stat.st_size):
+                logger.debug(f"Rebuilding entry index of `{self.journal_file}`...")
+                self.count = 0
+                self._scanned_offset = 0
+                self._anchor_length = 0
+                self._anchor_crc = 0
+
+            # The last indexed line is scanned again, so drop its entry
+            if self.count and self.offset(self.last_entry) == self._scanned_offset:
+                self.count -= 1
+            new_offsets = self.__scan(f)
+
+        self._journal_size = stat.st_size
+        self._journal_mtime_ns = stat.st_mtime_ns
+
+        if self.persistent:
+            self.__save(new_offsets)
+        else:
+            del self._offsets[self.count :]
+            self._offsets.extend(new_offsets)
+        self.count += len(new_offsets)
+
+        return self
+
+    def offset(self, entry: int) -> Optional[int]:
+        """
+        Get the byte offset of an entry in the journal file.
+
+        :param entry: The entry number.
+        :return: The byte offset of the entry, or `None` if it is not indexed.
+        """
+        if not self.count or not self.first_entry <= entry <= self.last_entry:
+            return None
+
+        position = entry - self.first_entry
+        if not self.persistent:
+            return self._offsets[position]
+
+        with open(self.index_file, "rb") as f:
+            f.seek(HEADER.size + position * OFFSET_SIZE)
+            data = f.read(OFFSET_SIZE)
+        if len(data) != OFFSET_SIZE:
+            return None  # Truncated sidecar file
+        return int.from_bytes(data, "little")
+
+    def read_entries(
+        self, first: int, last: int, end: Optional[int] = None
+    ) -> Optional[list]:
+        """
+        Read the lines of a range of entries, seeking straight to the first one.
+
+        :param first: The number of the first entry.
+        :param last: The number of the last entry, included.
+        :param end: If provided, do not read beyond this byte offset of the journal file.
+        :return: The lines of the entries in the range, with their line breaks, or `None`
+            if the index does not match the journal file.
+        """
+        first = max(first, self.first_entry)
+        last = min(last, self.last_entry)
+        if not self.count or first > last:
+            return []
+
+        start = self.offset(first)
+        stop = self.offset(last + 1) if last < self.last_entry else None
+        if start is None:
+            return None
+        if end is not None:
+            if start >= end:
+                return []
+            stop = end if stop is None else min(stop, end)
+
+        with open(self.journal_file, "rb") as f:
+            f.seek(start)
+            data = f.read() if stop is None else f.read(stop - start)
+
+        lines = data.decode(errors="replace").splitlines(keepends=True)
+        if not lines or self.__entry_number(lines[0]) != first:
+            return None
+
+        if stop is None:
+            # Read until the end of the file, so drop the not indexed lines after the
+            # last entry
+            while len(lines) > 1 and self.__entry_number(lines[-1]) != last:
+                lines.pop()
+
+        return lines
+
+    @staticmethod
+    def __entry_number(line: str) -> Optional[int]:
+        """
+        Get the entry number of a journal line.
+
+        :param line: The journal line.
+        :return: The entry number, or `None` if the line is not numbered.
+        """
+        match = ENTRY_INDEX_REGEX.match(line)
+        return int(match.group(1)) if match else None
+
+    def __check_anchor(self, f, size: int) -> bool:
+        """
+        Check that the journal file has not changed before the last indexed line, so the
+        index can be updated scanning only from that line.
+
+        :param f: The journal file, opened in binary mode.
+        :param size: The current size of the journal file.
+        :return: `True` if the previous content is unchanged.
+        """
+        if size < self._scanned_offset or self._scanned_offset < self._anchor_length:
+            return False
+        f.seek(self._scanned_offset - self._anchor_length)
+        return zlib.crc32(f.read(self._anchor_length)) == self._anchor_crc
+
+    def __scan(self, f) -> array:
+        """
+        Scan the journal file from the last indexed line, getting the offsets of the
+        entries that continue the numbering.
+
+        :param f: The journal file, opened in binary mode.
+        :return: The offsets of the new entries.
+        """
+        new_offsets = array("Q")
+        f.seek(self._scanned_offset)
+        offset = self._scanned_offset
+        last_line = b""
+        for line in f:
+            if last_line:
+                self._anchor_length = len(last_line)
+                self._anchor_crc = zlib.crc32(last_line)
+                self._scanned_offset = offset
+            entry = self.__entry_number(line.decode(errors="replace"))
+            if entry is not None:
+                if not self.count and not new_offsets:
+                    self.first_entry = entry
+                if entry == self.first_entry + self.count + len(new_offsets):
+                    new_offsets.append(offset)
+                else:
+                    logger.debug(f"Entry {entry} out of sequence, not indexed.")
+            last_line = line
+            offset += len(line)
+
+        return new_offsets
+
+    def __load(self) -> None:
+        """
+        Load the index header from its sidecar file, if it exists and is valid.
+        """
+        try:
+            with open(self.index_file, "rb") as f:
+                header = HEADER.unpack(f.read(HEADER.size))
+                size = os.fstat(f.fileno()).st_size
+        except (OSError, struct.error):
+            return  # Missing or corrupt index, rebuild it
+
+        magic, version, count, first_entry, *state = header
+        if magic != MAGIC or version != self.VERSION:
+            return  # Unknown or old index, rebuild it
+        if size < HEADER.size + count * OFFSET_SIZE:
+            return  # Truncated index, rebuild it
+
+        self.count = count
+        self.first_entry = first_entry
+        (
+            self._journal_size,
+            self._journal_mtime_ns,
+            self._scanned_offset,
+            self._anchor_length,
+            self._anchor_crc,
+        ) = state
+
+    def __save(self, new_offsets: array) -> None:
+        """
+        Save the index to its sidecar file, appending the new offsets after the kept
+        ones. The header is written last, so an interrupted save is detected and the
+        index rebuilt or updated again.
+
+        :param new_offsets: The offsets of the new entries.
+        """
+        if sys.byteorder != "little":
+            new_offsets.byteswap()  # pragma: no cover
+
+        header = HEADER.pack(
+            MAGIC,
+            self.VERSION,
+            self.count + len(new_offsets),
+            self.first_entry,
+            self._journal_size,
+            self._journal_mtime_ns,
+            self._scanned_offset,
+            self._anchor_length,
+            self._anchor_crc,
+        )
+        try:
+            with open(
+                self.index_file, "r+b" if self.index_file.exists() else "w+b"
+            ) as f:
+                f.truncate(HEADER.size + self.count * OFFSET_SIZE)
+                f.seek(0, os.SEEK_END)
+                if f.tell() < HEADER.size:
+                    f.write(bytes(HEADER.size))
+                f.write(new_offsets.tobytes())
+                f.seek(0)
+                f.write(header)
+        except OSError as e:
+            logger.debug(f"Entry index not saved in `{self.index_file}`: {e}")
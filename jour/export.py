@@ -0,0 +1,256 @@
+"""
+Export
+======
+
+This module implements the export of the journal entries to other formats, to feed them
+to other systems: JSON Lines, with a JSON object per entry, CSV, with a row per entry, or
+an HTML document with a table of the entries. Each entry has its `index`, `timestamp`,
+`signature`, `message` and `tags`, and the lines that are not numbered journal lines are
+skipped.
+
+The journal files are streamed and the entries written as they are parsed, so the memory
+used does not depend on the size of the journal. Large journal files are split in chunks
+of lines, exported in parallel by a process pool to temporary files, which are written to
+the output in the order of the journal as they are done, so the output is the same than
+exporting the journal in a single process.
+"""
+
+import csv
+import html
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, TextIO
+
+try:
+    from .archive import get_compression, open_archive
+    from .entry import Entry
+except ImportError:  # pragma: no cover
+    from archive import get_compression, open_archive
+    from entry import Entry
+
+# Formats of the export
+EXPORT_FORMATS = ("jsonl", "csv", "html")
+
+# Size of the chunks of the journal files exported by each process
+EXPORT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Columns of the CSV and HTML exports
+EXPORT_COLUMNS = ("index", "timestamp", "signature", "message", "tags")
+
+HTML_HEADER = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Journal</title>
+</head>
+<body>
+<table>
+<thead>
+<tr><th>Index</th><th>Timestamp</th><th>Signature</th><th>Message</th><th>Tags</th></tr>
+</thead>
+<tbody>
+"""
+
+HTML_FOOTER = """</tbody>
+</table>
+</body>
+</html>
+"""
+
+
+def split_journal_file(
+    journal_file: Path, end: Optional[int] = None, chunk_size: int = EXPORT_CHUNK_SIZE
+) -> list:
+    """
+    Split a journal file in chunks of lines of about the same size. The compressed
+    segments are not split, because they cannot be read from any byte offset.
+
+    :param journal_file: The journal file.
+    :param end: If provided, split only the bytes before this offset. It must be the
+        start of a line.
+    :param chunk_size: The approximate size of the chunks, in bytes.
+    :return: The `(start, end)` byte offsets of the chunks. The end of the chunks of the
+        compressed segments is `None`.
+    """
+    if get_compression(journal_file):
+        return [(0, None)]
+
+    end = os.path.getsize(journal_file) if end is None else end
+    chunks = []
+    start = 0
+    with open(journal_file, "rb") as f:
+        while start < end:
+            # Move the end of the chunk to the start of the next line
+            f.seek(min(start + chunk_size, end))
+            if f.tell() < end:
+                f.readline()
+            chunk_end = min(f.tell(), end)
+            chunks.append((start, chunk_end))
+            start = chunk_end
+
+    return chunks
+
+
+def iter_chunk_entries(
+    journal_file: Path, start: int = 0, end: Optional[int] = None
+) -> Iterator[Entry]:
+    """
+    Stream the entries of a chunk of a journal file.
+
+    :param journal_file: The journal file, which can be a compressed segment.
+    :param start: The byte offset where the chunk starts. It must be the start of a line.
+    :param end: The byte offset where the chunk ends, or `None` to read until the end.
+    :return: An iterator of the parsed entries. Not numbered lines are skipped.
+    """
+    if get_compression(journal_file):
+        f = open_archive(journal_file)
+    else:
+        f = open(journal_file, "rb")
+    with f:
+        f.seek(start)
+        position = start
+        for line in f:
+            if end is not None and position >= end:
+                break
+            position += len(line)
+            entry = Entry.from_line(line.decode(errors="replace"))
+            if entry:
+                yield entry
+
+
+def write_header(output: TextIO, export_format: str) -> None:
+    """
+    Write the start of an export.
+
+    :param output: The text stream to write.
+    :param export_format: The export format.
+    """
+    if export_format == "csv":
+        csv.writer(output).writerow(EXPORT_COLUMNS)
+    elif export_format == "html":
+        output.write(HTML_HEADER)
+
+
+def write_entries(output: TextIO, entries: Iterable[Entry], export_format: str) -> int:
+    """
+    Write entries in an export format.
+
+    :param output: The text stream to write.
+    :param entries: The entries.
+    :param export_format: The export format.
+    :return: The number of written entries.
+    """
+    n_entries = 0
+    writer = csv.writer(output) if export_format == "csv" else None
+    for entry in entries:
+        n_entries += 1
+        if export_format == "jsonl":
+            output.write(json.dumps(entry.to_dict()) + "\n")
+            continue
+
+        tags = " ".join(f"#{tag_name}{index}" for tag_name, index in entry.tags)
+        row = (entry.index, entry.timestamp, entry.signature, entry.message, tags)
+        if writer:
+            writer.writerow(row)
+        else:
+            cells = "".join(
+                f"<td>{html.escape(str(value)) if value is not None else ''}</td>"
+                for value in row
+            )
+            output.write(f"<tr>{cells}</tr>\n")
+
+    return n_entries
+
+
+def write_footer(output: TextIO, export_format: str) -> None:
+    """
+    Write the end of an export.
+
+    :param output: The text stream to write.
+    :param export_format: The export format.
+    """
+    if export_format == "html":
+        output.write(HTML_FOOTER)
+
+
+def export_chunk(
+    journal_file: Path,
+    start: int,
+    end: Optional[int],
+    export_format: str,
+    output_file: Path,
+) -> int:
+    """
+    Export a chunk of a journal file to a file, in a worker process.
+
+    :param journal_file: The journal file.
+    :param start: The byte offset where the chunk starts.
+    :param end: The byte offset where the chunk ends, or `None` to read until the end.
+    :param export_format: The export format.
+    :param output_file: The file to write.
+    :return: The number of exported entries.
+    """
+    with open(output_file, "w", newline="") as f:
+        entries = iter_chunk_entries(journal_file, start, end)
+        return write_entries(f, entries, export_format)
+
+
+def export_journal_files(
+    journal_files: Iterable[tuple],
+    output: TextIO,
+    export_format: str = "jsonl",
+    workers: Optional[int] = None,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> int:
+    """
+    Export the entries of journal files, in order. The caller must hold the locks over
+    the journal files.
+
+    :param journal_files: The `(journal_file, end)` tuples of the files to export, where
+        `end`, if not `None`, is the byte offset where to stop reading the file.
+    :param output: The text stream to write.
+    :param export_format: `jsonl`, `csv` or `html`.
+    :param workers: The number of processes that export the chunks. Default is the
+        number of CPUs. With `1`, or a single chunk, they are exported in this process.
+    :param chunk_size: The approximate size of the chunks, in bytes.
+    :return: The number of exported entries.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: `{export_format}`")
+
+    chunks = [
+        (journal_file, start, chunk_end)
+        for journal_file, end in journal_files
+        for start, chunk_end in split_journal_file(journal_file, end, chunk_size)
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+
+    write_header(output, export_format)
+    n_entries = 0
+    if workers <= 1:
+        for journal_file, start, end in chunks:
+            entries = iter_chunk_entries(journal_file, start, end)
+            n_entries += write_entries(output, entries, export_format)
+    else:
+        with (
+            tempfile.TemporaryDirectory(prefix="jour-export-") as temp_dir,
+            ProcessPoolExecutor(max_workers=workers) as pool,
+        ):
+            output_files = [Path(temp_dir) / f"{i}.part" for i in range(len(chunks))]
+            futures = [
+                pool.submit(export_chunk, *chunk, export_format, output_file)
+                for chunk, output_file in zip(chunks, output_files)
+            ]
+            # Write the chunks in order, each one as soon as it and the previous are done
+            for future, output_file in zip(futures, output_files):
+                n_entries += future.result()
+                with open(output_file, "r", newline="") as f:
+                    shutil.copyfileobj(f, output)
+                output_file.unlink()
+    write_footer(output, export_format)
+
+    return n_entries
@@ -0,0 +1,261 @@
+"""
+Group commit
+============
+
+This module implements `GroupCommitJour`, a long-lived and thread-safe journal handle
+for programs that write to the journal from many threads. Writing a line only queues it
+and returns a future, and a background thread writes the queued lines to the journal in
+groups: when the group reaches a size, or when its first line has waited some time. Each
+group is one `Jour` context, so its lines get consecutive indexes and tag indexes under
+the exclusive lock over the journal file, and the journal file is written once.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Iterable, Optional
+
+try:
+    from .jour import Jour
+except ImportError:  # pragma: no cover
+    from jour import Jour
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Number of queued lines that triggers a group commit
+GROUP_COMMIT_SIZE = 256
+
+# Seconds that a queued line waits at most for its group commit
+GROUP_COMMIT_DELAY = 0.05
+
+
+class GroupCommitJour:
+    """
+    Thread-safe `Jour` handle that writes the lines in groups from a background thread.
+    It can be used as a context manager, or opened and closed explicitly to keep it for
+    the life of the program. Lines still queued when the program exits are written.
+    """
+
+    def __init__(
+        self,
+        jour: Optional[Jour] = None,
+        group_size: int = GROUP_COMMIT_SIZE,
+        group_delay: float = GROUP_COMMIT_DELAY,
+        **kwargs,
+    ):
+        """
+        Initialize the GroupCommitJour. It does not write until opened.
+
+        :param jour: The `Jour` to use. If not provided, a new one is created with the
+            keyword arguments, like the `Jour` parameters, when opening the handle. It
+            must not be used elsewhere while the handle is open.
+        :param group_size: The number of queued lines that triggers a group commit.
+        :param group_delay: The seconds that a queued line waits at most for its group
+            commit.
+        """
+        self.jour = jour
+        self.group_size = group_size
+        self.group_delay = group_delay
+        self.stats = {"commits": 0, "lines": 0, "max_group": 0}
+        self._jour_kwargs = kwargs
+
+        self._condition = threading.Condition()
+        self._queue = []  # Pairs of entry and future, in order
+        self._queued = 0  # Number of lines ever queued
+        self._committed = 0  # Number of lines ever committed, with success or not
+        self._first_queued_at = None  # Monotonic time of the oldest queued line
+        self._flushing = False
+        self._closing = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self) -> None:
+        """
+        Start the background thread that writes the queued lines.
+        """
+        with self._condition:
+            if self._thread is not None:
+                raise RuntimeError("`GroupCommitJour` already open.")
+            if self.jour is None:
+                # Creating the `Jour` checks the journal file reachability
+                self.jour = Jour(**self._jour_kwargs)
+            self._closing = False
+            self._thread = threading.Thread(
+                target=self.__run, name="jour-group-commit", daemon=True
+            )
+            self._thread.start()
+        atexit.register(self.close)
+
+    def close(self) -> None:
+        """
+        Write the queued lines and stop the background thread. The lines queued after
+        closing are rejected.
+        """
+        with self._condition:
+            thread = self._thread
+            if thread is None:
+                return
+            self._closing = True
+            self._condition.notify_all()
+        thread.join()
+        with self._condition:
+            self._thread = None
+        atexit.unregister(self.close)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        Write the lines queued until now without waiting for their group to be complete,
+        and wait until they are written.
+
+        :param timeout: The seconds to wait. Default is to wait until they are written.
+        """
+        with self._condition:
+            self.__check_open()
+            target = self._queued
+            self._flushing = True
+            self._condition.notify_all()
+            if not self._condition.wait_for(
+                lambda: self._committed >= target, timeout=timeout
+            ):
+                raise TimeoutError("Timeout waiting for the journal flush.")
+
+    @property
+    def pending(self) -> int:
+        """
+        The number of queued lines not written yet.
+        """
+        with self._condition:
+            return self._queued - self._committed
+
+    def write_line(
+        self,
+        message: str,
+        signature: Optional[str] = None,
+        as_command: bool = False,
+        tag: Optional[str] = None,
+    ) -> Future:
+        """
+        Queue a new line to write to the journal. Its index, and the index of its tag, are
+        computed when its group is written.
+
+        :param message: The message to write.
+        :param signature: The signature to add as the line author. Default is the user name.
+        :param as_command: If `True`, format the message as a command.
+        :param tag: If provided, the name of a tag to add to the line, with its next index.
+        :return: A future of the new line, as written in the journal.
+        """
+        entry = {"message": message, "signature": signature, "as_command": as_command}
+        if tag:
+            entry["tag"] = tag
+        return self.write_lines([entry])[0]
+
+    def write_lines(self, entries: Iterable) -> list:
+        """
+        Queue many new lines to write to the journal, which are written in the same
+        group, with consecutive indexes.
+
+        :param entries: The entries to write, like the `Jour.write_lines` ones.
+        :return: The futures of the new lines.
+        """
+        entries = [{"message": e} if isinstance(e, str) else e for e in entries]
+        futures = [Future() for _ in entries]
+
+        with self._condition:
+            self.__check_open()
+            if not self._queue:
+                # Start the delay of the new group
+                self._first_queued_at = time.monotonic()
+                self._condition.notify_all()
+            self._queue.extend(zip(entries, futures))
+            self._queued += len(entries)
+            if len(self._queue) >= self.group_size:
+                self._condition.notify_all()
+
+        return futures
+
+    def __check_open(self) -> None:
+        """
+        Check if the handle is open. If not, raise an error. The condition must be held.
+        """
+        if self._thread is None or self._closing:
+            raise RuntimeError("`GroupCommitJour` not open.")
+
+    def __is_group_ready(self) -> bool:
+        """
+        Check if the queued lines must be written now. The condition must be held.
+
+        :return: `True` if the group is complete, its first line has waited enough, or
+            the queue is being flushed or closed.
+        """
+        if not self._queue:
+            return self._closing
+        return (
+            self._closing
+            or self._flushing
+            or len(self._queue) >= self.group_size
+            or time.monotonic() - self._first_queued_at >= self.group_delay
+        )
+
+    def __run(self) -> None:
+        """
+        Background thread: wait for each group of queued lines and write it, until closed
+        with an empty queue.
+        """
+        while True:
+            with self._condition:
+                while not self.__is_group_ready():
+                    timeout = None
+                    if self._queue:
+                        waited = time.monotonic() - self._first_queued_at
+                        timeout = max(self.group_delay - waited, 0)
+                    self._condition.wait(timeout)
+                if not self._queue:
+                    return  # Closing
+                group = self._queue
+                self._queue = []
+                self._flushing = False  # Anything queued until now is in this group
+
+            self.__commit(group)
+
+            with self._condition:
+                self._committed += len(group)
+                if self._committed == self._queued:
+                    self._flushing = False  # Any flush is done
+                self._condition.notify_all()
+
+    def __commit(self, group: list) -> None:
+        """
+        Write a group of lines to the journal in one context, resolving their futures.
+
+        :param group: The pairs of entry and future to write.
+        """
+        try:
+            with self.jour:
+                new_lines = self.jour.write_lines(
+                    [entry for entry, _ in group], printing=False
+                )
+        except Exception as e:
+            logger.error(f"Error writing {len(group)} journal lines: {e}")
+            for _, future in group:
+                future.set_exception(e)
+            return
+
+        self.stats["commits"] += 1
+        self.stats["lines"] += len(group)
+        self.stats["max_group"] = max(self.stats["max_group"], len(group))
+        for (_, future), new_line in zip(group, new_lines):
+            future.set_result(new_line)
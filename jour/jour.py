@@ -1,11 +1,38 @@
 import datetime
+import heapq
 import logging
 import os
+import re
+from itertools import chain
 from pathlib import Path
-from typing import Optional
-
-import mdformat
-from ilock import ILock
+from typing import Iterable, Iterator, Optional, TextIO, Union
+
+try:
+    from .columnar import ColumnarJournal
+    from .durability import get_durability, patch_file, read_prefix, replace_file
+    from .entry import Entry
+    from .entry_index import EntryIndex
+    from .journal_formatter import format_journal
+    from .locks import JournalLock, new_lock_stats
+    from .phases import PhaseHook, phase, timed
+    from .replica import Replica, probe_file
+    from .segments import Manifest
+    from .streaming import stream_lines, stream_lines_reversed
+    from .tag_index import ENTRY_INDEX_REGEX, TAG_REGEX, TagIndex, scan_tags
+    from .time_index import TimeIndex, match_line, parse_line_header
+except ImportError:  # pragma: no cover
+    from columnar import ColumnarJournal
+    from durability import get_durability, patch_file, read_prefix, replace_file
+    from entry import Entry
+    from entry_index import EntryIndex
+    from journal_formatter import format_journal
+    from locks import JournalLock, new_lock_stats
+    from phases import PhaseHook, phase, timed
+    from replica import Replica, probe_file
+    from segments import Manifest
+    from streaming import stream_lines, stream_lines_reversed
+    from tag_index import ENTRY_INDEX_REGEX, TAG_REGEX, TagIndex, scan_tags
+    from time_index import TimeIndex, match_line, parse_line_header
 
 # Setup logger
 handler = logging.StreamHandler()
@@ -15,6 +42,12 @@ formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s"
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# Size of the blocks read when seeking the journal file from its end
+TAIL_BLOCK_SIZE = 8192
+
+# Regex to match a journal line, which starts with its index: `N. ...`
+LINE_INDEX_REGEX = re.compile(r"^\d+\. ")
+
 
 class Jour:
     """
@@ -23,23 +56,97 @@ class Jour:
     of methods to write, append, tag, and print the journal.
     """
 
-    _journal_lock: Optional[ILock] = None
-    _journal: Optional[list] = None
-
-    def __init__(self, create_journal: bool = False):
+    _journal_lock: Optional[JournalLock] = None
+    _journal_lines: Optional[list] = None
+    _disk_lines: Optional[list] = None
+    _disk_size: int = 0
+    _disk_mtime_ns: int = 0
+    _dirty_from: Optional[int] = None
+    _tail_lines: Optional[list] = None
+    _tail_disk_lines: Optional[list] = None
+    _tail_offset: Optional[int] = None
+    _writing: bool = False
+    _tag_index: Optional[TagIndex] = None
+    _tag_maxima: Optional[dict] = None
+    _entry_index: Optional[EntryIndex] = None
+    _time_index: Optional[TimeIndex] = None
+    _manifest: Optional[Manifest] = None
+
+    def __init__(
+        self,
+        create_journal: bool = False,
+        persist_tag_index: bool = True,
+        persist_entry_index: bool = True,
+        persist_time_index: bool = True,
+        lock_timeout: Optional[float] = None,
+        durability: Optional[str] = None,
+        phase_hook: Optional[PhaseHook] = None,
+        replica_file: Optional[Path] = None,
+    ):
         """
         Initialize the Jour. This class should be used as a context manager
         to ensure a singleton behavior over the journal file, obtaining a lock over it.
 
         :param create_journal: If `True`, create a new journal file.
+        :param persist_tag_index: If `True`, keep the tag index of the journal in a
+            sidecar file next to it, to not scan all the journal to compute tag indexes.
+        :param persist_entry_index: If `True`, keep the entry offset index of the journal
+            in a sidecar file next to it, to seek straight to the entries by number.
+        :param persist_time_index: If `True`, keep the time index of the journal in a
+            sidecar file next to it, to find the entries of a time range bisecting it.
+        :param lock_timeout: The seconds to wait for the lock over the journal file.
+            Default is the value of the `JOURNAL_LOCK_TIMEOUT` environment variable, or
+            10 seconds.
+        :param durability: The commit strategy of the journal file writes: `atomic`,
+            `append` or `fast` (see the `durability` module). Default is the value of the
+            `JOURNAL_DURABILITY` environment variable, or `append`.
+        :param phase_hook: If provided, a callable that receives the name and the seconds
+            of each phase of the operations, like the lock waits, the journal load or the
+            formatting (see the `phases` module). Without it, nothing is timed.
+        :param replica_file: If provided, work in local-first mode over this local replica
+            of the journal file, synced with it in the background (see the `replica`
+            module). Default is the value of the `JOURNAL_REPLICA` environment variable,
+            if defined.
         """
+        self.durability = get_durability(durability)
+        self.phase_hook = phase_hook
+        self.lock_timeout = lock_timeout
+        self.lock_stats = new_lock_stats()  # Lock waits, accumulated over the contexts
+        self.persist_tag_index = persist_tag_index
+        self.persist_entry_index = persist_entry_index
+        self.persist_time_index = persist_time_index
         self.journal_file = Path().home() / "journal.md"  # Default
         self.journal_emergency_file = Path().home() / "journal_emergency.md"  # Default
         self.__set_journals_file_locations()
 
-        # Check journal reachability
-        if os.path.isfile(self.journal_file):
+        # Local replica, only if it is the active journal file
+        self.replica: Optional[Replica] = None
+        replica_file = replica_file or os.getenv("JOURNAL_REPLICA")
+        if replica_file:
+            replica = Replica(
+                self.journal_file,
+                Path(replica_file).expanduser(),
+                lock_timeout=lock_timeout,
+                durability=self.durability,
+            )
+
+        # Check journal reachability, without waiting for a hung file system. In
+        # local-first mode, the journal file is not touched once copied to the replica
+        if replica_file and replica.is_seeded():
+            self.replica = replica
+            self._active_journal_file = replica.replica_file
+        elif probe_file(self.journal_file):
             self._active_journal_file = Path(self.journal_file)
+            if replica_file:
+                if Manifest.get_manifest_file(self.journal_file).exists():
+                    logger.warning(
+                        "Segmented journals cannot have a local replica. Using the "
+                        "journal file directly..."
+                    )
+                else:
+                    replica.seed()
+                    self.replica = replica
+                    self._active_journal_file = replica.replica_file
         elif create_journal:
             self.__create_journal_file(self.journal_file)
             self._active_journal_file = Path(self.journal_file)
@@ -68,7 +175,7 @@ class Jour:
         # with the default journal file when possible
         if self._active_journal_file == self.journal_emergency_file:
             logger.warning(
-                f"Using emergency journal file in `{self.journal_emergency_file}`. Manually merge this journal with the default journal file when possible."
+                f"Using emergency journal file in `{self.journal_emergency_file}`. Merge it into the default journal file with `jour --merge-emergency` when it is reachable again."
             )
 
     def __enter__(self):
@@ -79,13 +186,29 @@ class Jour:
             f"Using journal file: `{self._active_journal_file}`..."
         )  # Debug level
 
-        self._journal_lock = ILock(
-            f"jour_lock_{self._active_journal_file.name}", reentrant=True, timeout=10
-        )
-        with self._journal_lock:
-            # Load the journal file to memory
-            with open(self._active_journal_file, "r") as f:
-                self._journal = f.readlines()
+        with self.__phase("enter"):
+            # Operations that only read the journal take the lock shared, and the ones
+            # that write it, exclusive
+            self._journal_lock = JournalLock(
+                self._active_journal_file,
+                timeout=self.lock_timeout,
+                stats=self.lock_stats,
+                phase_hook=self.phase_hook,
+            )
+
+            # The journal file is loaded lazily, only by the operations that need it
+            self.__reset_journal()
+            self._tag_index = None
+            self._tag_maxima = None
+            self._entry_index = None
+            self._time_index = None
+
+            # Segmented journal, if it has a manifest. The emergency journal is never
+            # segmented
+            self._manifest = None
+            if self._active_journal_file == self.journal_file:
+                with self._journal_lock.shared, self.__phase("manifest"):
+                    self._manifest = Manifest.load(self._active_journal_file)
 
         return self
 
@@ -93,19 +216,373 @@ class Jour:
         """
         Exit the context manager to release the lock over the journal file.
         """
+        with self.__phase("exit"):
+            self.flush()
+
+        self._journal_lock = None
+
+    def __phase(self, name: str):
+        """
+        Time a phase of the operations, if there is a phase hook.
+
+        :param name: The phase name.
+        :return: A context manager around the phase.
+        """
+        return phase(self.phase_hook, name)
+
+    @timed
+    def flush(self) -> None:
+        """
+        Write the changes made in the context to the journal file, without exiting the
+        context. Only the modified end of the journal is written, rewriting the full file
+        only when this is not possible. If there are no changes, nothing is written.
+        """
+        self.__check_context()
+
+        try:
+            with self._journal_lock:
+                if self.__is_modified():
+                    offset = self.__patch_tail()
+                    if offset is None:
+                        self.__dump_journal()
+                        offset = 0
+                    self._tag_index = None  # Outdated by the write
+                    if self.replica is not None:
+                        self.replica.mark_dirty(offset)
+                    if self._manifest:
+                        with self.__phase("manifest"):
+                            self._manifest.rotate()
+                    self.__sync_lookup_indexes()
+
+                self.__reset_journal()
+        finally:
+            # The changes are written, so other processes can change the journal again
+            if self._writing:
+                self._writing = False
+                self._journal_lock.release()
+
+    @timed
+    def segment_journal(
+        self, rotation: Union[str, int] = "year", compression: Optional[str] = None
+    ) -> None:
+        """
+        Split the journal in segments: the journal file keeps the active segment, where
+        the new entries are written, and the older entries are sealed in segment files
+        next to it, per year or per number of entries, tracked by a manifest. The sealed
+        segments are read transparently by the rest of the operations. If the journal is
+        already segmented, only its rotation and compression are changed. The changes
+        made in the context are written before.
+
+        :param rotation: When to seal the entries: `"year"`, to seal the entries of each
+            year when the next one starts, or a number of entries per segment.
+        :param compression: If provided, compress the sealed segments, including the
+            already sealed ones: `gzip` or `lzma`. If `None`, keep the compression of the
+            segmented journal, if any.
+        """
         self.__check_context()
 
-        # Before dumping the journal to the file, format Markdown with Mdformat
-        journal_fmt = mdformat.text(
-            "".join(self._journal), options={"number": True, "wrap": "keep"}
+        if self.replica is not None:
+            logger.error("Journals with a local replica cannot be segmented.")
+            raise RuntimeError("Journal with a local replica.")
+        if self._active_journal_file != self.journal_file:
+            logger.error(
+                f"Journal file in `{self.journal_file}` unreachable. The emergency journal "
+                f"cannot be segmented."
+            )
+            raise RuntimeError("Journal file unreachable.")
+
+        self.flush()
+        with self._journal_lock:
+            if self._manifest is None:
+                self._manifest = Manifest(self.journal_file, rotation, compression)
+            self._manifest.rotation = rotation
+            if compression:
+                self._manifest.compression = compression
+            self._manifest.save()
+            if self._manifest.rotate():
+                self._tag_index = None
+                self.__sync_lookup_indexes()
+            self._manifest.compress_segments()
+        logger.info(
+            f"Journal segmented by {rotation if rotation == 'year' else f'{rotation} entries'}"
+            + (f", compressed with {compression}." if compression else ".")
         )
 
+    def __begin_write(self) -> None:
+        """
+        Take the exclusive lock over the journal file before the first change of the
+        context, and hold it until the changes are written, when flushing, so no other
+        process can change the journal between reading it to compute the changes, like
+        the next indexes, and writing them. The state read before taking it is forgotten,
+        because other process could have changed the journal meanwhile.
+        """
+        if self._writing:
+            return
+
+        self._journal_lock.acquire()
+        self._writing = True
+        if not self.__is_modified():
+            self.__reset_journal()
+            self._tag_index = None
+            self._tag_maxima = None
+
+    def __reset_journal(self) -> None:
+        """
+        Forget the journal lines kept in memory, which must be already written to the
+        journal file. The tag maximum indexes are kept, because they do not change.
+        """
+        self._journal_lines = None
+        self._disk_lines = None
+        self._disk_size = 0
+        self._disk_mtime_ns = 0
+        self._dirty_from = None
+        self._tail_lines = []
+        self._tail_disk_lines = []
+        self._tail_offset = None
+
+    def __is_modified(self) -> bool:
+        """
+        Check if the journal has been modified in the context.
+
+        :return: `True` if there are changes to write to the journal file.
+        """
+        if self._journal_lines is None:
+            return self._tail_lines != self._tail_disk_lines
+        return self._dirty_from is not None
+
+    @property
+    def _journal(self) -> list:
+        """
+        The journal lines. The journal file is loaded to memory the first time this
+        property is accessed in the context, joining the lines of the tail window.
+
+        While the journal is not loaded, the operations over its last lines work over a
+        tail window: the lines that replace the end of the journal file from the offset
+        `_tail_offset` (or from its end, if `None`), which originally contained the lines
+        `_tail_disk_lines`. If the journal file does not contain them there anymore,
+        because other process changed it, the tail window is discarded if not modified,
+        and if modified, a `RuntimeError` is raised.
+        """
+        if self._journal_lines is None:
+            with self._journal_lock.shared, self.__phase("load"):
+                # Load the journal file to memory
+                with open(self._active_journal_file, "r") as f:
+                    self._disk_lines = f.readlines()
+                    stat = os.fstat(f.fileno())
+                    self._disk_size = stat.st_size
+                    self._disk_mtime_ns = stat.st_mtime_ns
+
+            # Find the start of the tail window, checking the file still ends with it
+            n_lines = len(self._disk_lines) - len(self._tail_disk_lines)
+            tail_size = len("".join(self._tail_disk_lines).encode())
+            if self._tail_offset is not None and (
+                self._disk_size != self._tail_offset + tail_size
+                or self._disk_lines[n_lines:] != self._tail_disk_lines
+            ):
+                if self._tail_lines != self._tail_disk_lines:
+                    logger.error(
+                        "The journal file was changed by other process while it was "
+                        "being modified. The changes of this context are discarded."
+                    )
+                    raise RuntimeError("Journal file changed by other process.")
+                n_lines = len(self._disk_lines)  # Not modified, so discard it
+                self._tail_lines = []
+
+            # Replace the end of the journal with the tail window
+            self._journal_lines = self._disk_lines[:n_lines] + self._tail_lines
+            if self._tail_lines != self._tail_disk_lines:
+                self.__mark_dirty(n_lines)
+            self._tail_lines = []
+            self._tail_disk_lines = []
+            self._tail_offset = None
+
+        return self._journal_lines
+
+    def __pull_tail_line(self) -> bool:
+        """
+        Move the last line of the journal file before the tail window into it, to modify
+        it without loading the journal. The tail window must be empty.
+
+        :return: `True` if a line was pulled, `False` if there are no more lines.
+        """
+        with self._journal_lock.shared:
+            self.__pin_tail()
+            lines = self.__read_tail_lines(1, end=self._tail_offset)
+        if not lines:
+            return False
+
+        self._tail_offset -= len(lines[0].encode())
+        self._tail_lines.insert(0, lines[0])
+        self._tail_disk_lines.insert(0, lines[0])
+
+        return True
+
+    def __pin_tail(self) -> None:
+        """
+        Start the tail window at the end of the journal file, if not started, so the
+        changes of the context are computed and written over the same end of the journal,
+        even if other process appends to it meanwhile.
+        """
+        if self._tail_offset is None:
+            self._tail_offset = os.path.getsize(self._active_journal_file)
+
+    def __mark_dirty(self, line_index: int) -> None:
+        """
+        Register that the journal has been modified from the line `line_index` onwards.
+
+        :param line_index: The index of the first modified line in the journal list.
+        """
+        if self._dirty_from is None or line_index < self._dirty_from:
+            self._dirty_from = line_index
+
+    def __patch_tail(self) -> Optional[int]:
+        """
+        Write the modified end of the journal to the journal file, without reading nor
+        rewriting the rest of it: seek to the first modified line, write the new tail
+        and truncate the file. New lines are only appended. The new tail is formatted
+        like Mdformat (see the `journal_formatter` module) along with the previous line,
+        so the result is the same than formatting all the journal. This is not possible
+        if the lines before the modified part are not well formatted journal lines, if
+        the index padding changes or if the file has changed since it was read, checking
+        its size and contents. In the `atomic` durability mode, the journal file is
+        replaced by a copy with the new tail instead.
+
+        :return: The byte offset where the tail was written, or `None` if not written.
+        """
         with self._journal_lock:
-            # Write the journal back to the file
-            with open(self._active_journal_file, "w") as f:
-                f.write(journal_fmt)
+            if self._journal_lines is None:
+                # Not loaded journal, so write the tail window
+                if self._tail_offset is None:
+                    return None  # pragma: no cover
+                offset = self._tail_offset
+                anchor_lines = self.__read_tail_lines(2, end=offset)
+                old_tail = "".join(self._tail_disk_lines).encode()
+                new_lines = self._tail_lines
+            else:
+                anchor_lines = self._journal_lines[
+                    max(self._dirty_from - 2, 0) : self._dirty_from
+                ]
+                offset = self.__get_disk_offset(self._dirty_from)
+                old_tail = "".join(self._disk_lines[self._dirty_from :]).encode()
+                new_lines = self._journal_lines[self._dirty_from :]
+
+            if not anchor_lines or not all(
+                LINE_INDEX_REGEX.match(line) for line in anchor_lines
+            ):
+                return None
+
+            # The index padding of the previous line must not change
+            anchor_line = anchor_lines[-1]
+            anchor_index = anchor_line.split(".")[0]
+            if len(str(int(anchor_index) + len(new_lines))) != len(anchor_index):
+                return None
+
+            # Format the new tail as a continuation of the previous line
+            with self.__phase("format"):
+                chunk_fmt = format_journal(anchor_line + "".join(new_lines))
+            anchor_line_fmt, _, new_tail = chunk_fmt.partition("\n")
+            if f"{anchor_line_fmt}\n" != anchor_line or new_tail.count("\n") != len(
+                new_lines
+            ):
+                return None
+
+            # Check the file still has the size and the lines around the modified part
+            # that it had when read
+            if os.path.getsize(self._active_journal_file) != offset + len(old_tail):
+                return None
+            anchor = "".join(anchor_lines).encode()
+            if offset < len(anchor):
+                return None  # pragma: no cover
+            with open(self._active_journal_file, "rb") as f:
+                f.seek(offset - len(anchor))
+                if f.read() != anchor + old_tail:
+                    return None
+
+            with self.__phase("write"):
+                if self.durability == "atomic":
+                    replace_file(
+                        self._active_journal_file,
+                        chain(
+                            read_prefix(self._active_journal_file, offset),
+                            [new_tail.encode()],
+                        ),
+                    )
+                else:
+                    patch_file(
+                        self._active_journal_file,
+                        offset,
+                        new_tail.encode(),
+                        fsync=self.durability != "fast",
+                    )
+
+        return offset
+
+    def __get_disk_offset(self, line_index: int) -> int:
+        """
+        Get the byte offset of a line of the loaded journal in the journal file, as it was
+        when loaded.
 
-        self._journal_lock = None
+        :param line_index: The index of the line in the journal list.
+        :return: The byte offset of the line.
+        """
+        return self._disk_size - len("".join(self._disk_lines[line_index:]).encode())
+
+    def __dump_journal(self) -> None:
+        """
+        Format all the journal like Mdformat and replace the journal file with it. If the
+        journal file has changed since it was loaded, a `RuntimeError` is raised instead,
+        so the changes of other processes are not overwritten.
+        """
+        # Before dumping the journal to the file, format Markdown like Mdformat
+        journal = "".join(self._journal)
+        with self.__phase("format"):
+            journal_fmt = format_journal(journal)
+
+        with self._journal_lock, self.__phase("write"):
+            stat = os.stat(self._active_journal_file)
+            if (stat.st_size, stat.st_mtime_ns) != (
+                self._disk_size,
+                self._disk_mtime_ns,
+            ):
+                logger.error(
+                    "The journal file was changed by other process while it was being "
+                    "modified. The changes of this context are discarded."
+                )
+                raise RuntimeError("Journal file changed by other process.")
+
+            # Replace the journal file, instead of truncating it before writing
+            replace_file(
+                self._active_journal_file,
+                [journal_fmt.encode()],
+                fsync=self.durability != "fast",
+            )
+
+    def __read_tail_lines(self, n_lines: int, end: Optional[int] = None) -> list:
+        """
+        Read the last lines of the journal file seeking from its end in blocks, so the
+        cost does not depend on the size of the journal.
+
+        :param n_lines: The number of lines to read.
+        :param end: If provided, read the lines before this byte offset instead of the
+            end of the file. It must be the start of a line.
+        :return: The last lines of the journal file, with their line breaks.
+        """
+        with self.__phase("read_tail"), open(self._active_journal_file, "rb") as f:
+            position = f.seek(0, os.SEEK_END) if end is None else end
+            data = b""
+            # Look for one line break more than lines, to be sure the first one is complete
+            while position > 0 and data.count(b"\n") <= n_lines:
+                block_size = min(TAIL_BLOCK_SIZE, position)
+                position -= block_size
+                f.seek(position)
+                data = f.read(block_size) + data
+
+        lines = [f"{line}\n" for line in data.decode(errors="replace").split("\n")]
+        lines[-1] = lines[-1][:-1]  # Last split part is not ended by a line break
+        if not lines[-1]:
+            lines.pop()
+
+        return lines[-n_lines:] if n_lines > 0 else []
 
     def __check_context(self) -> None:
         """
@@ -143,29 +620,463 @@ class Jour:
 
         logger.info(f"Journal file created in `{journal_file}`.")
 
-    def print_journal(self) -> None:
+    def iter_entries(self) -> Iterator[Entry]:
         """
-        Read the journal and print its last lines.
+        Iterate over the journal entries, from the first to the last one, including the
+        changes made in the context. If the journal is not loaded, the journal file is
+        streamed in chunks, so the memory used does not depend on its size. The lock over
+        the journal file is held while iterating.
+
+        :return: An iterator of the parsed entries. Not numbered lines are skipped.
+        """
+        self.__check_context()
+
+        with self._journal_lock.shared:
+            if self._journal_lines is None:
+                lines = stream_lines(self._active_journal_file, end=self._tail_offset)
+                tail_lines = list(self._tail_lines)
+            else:
+                lines, tail_lines = list(self._journal_lines), []
+
+            for segment in self._manifest.segments if self._manifest else []:
+                for line in segment.iter_lines():
+                    entry = Entry.from_line(line)
+                    if entry:
+                        yield entry
+            for line in lines:
+                entry = Entry.from_line(line)
+                if entry:
+                    yield entry
+            for line in tail_lines:
+                entry = Entry.from_line(line)
+                if entry:
+                    yield entry
+
+    def iter_entries_reversed(self) -> Iterator[Entry]:
+        """
+        Iterate over the journal entries, from the last to the first one, like
+        `iter_entries`. If the journal is not loaded, the journal file is streamed in
+        chunks from its end, so getting the last entries does not read the rest.
+
+        :return: An iterator of the parsed entries. Not numbered lines are skipped.
+        """
+        self.__check_context()
+
+        with self._journal_lock.shared:
+            if self._journal_lines is None:
+                lines = stream_lines_reversed(
+                    self._active_journal_file, end=self._tail_offset
+                )
+                tail_lines = list(self._tail_lines)
+            else:
+                lines, tail_lines = reversed(list(self._journal_lines)), []
+
+            for line in reversed(tail_lines):
+                entry = Entry.from_line(line)
+                if entry:
+                    yield entry
+            for line in lines:
+                entry = Entry.from_line(line)
+                if entry:
+                    yield entry
+            for segment in reversed(self._manifest.segments if self._manifest else []):
+                for line in segment.iter_lines_reversed():
+                    entry = Entry.from_line(line)
+                    if entry:
+                        yield entry
+
+    @timed
+    def merge_emergency_journal(self) -> int:
+        """
+        Merge the emergency journal into the journal, by timestamp, renumbering the
+        entries and remapping the colliding tag indexes of the emergency journal. The
+        journal is replaced atomically and the emergency journal archived next to it. The
+        changes made in the context are written before. If the journal is segmented, the
+        emergency journal is merged into its active segment, and in local-first mode, into
+        the local replica.
+
+        :return: The number of merged entries of the emergency journal.
+        """
+        self.__check_context()
+
+        if self._active_journal_file == self.journal_emergency_file:
+            logger.error(
+                f"Journal file in `{self.journal_file}` unreachable. The emergency journal "
+                f"can only be merged into a reachable journal."
+            )
+            raise RuntimeError("Journal file unreachable.")
+        if not os.path.isfile(self.journal_emergency_file):
+            logger.warning("No emergency journal to merge.")
+            return 0
+
+        try:
+            from .merge import merge_emergency_journal
+        except ImportError:  # pragma: no cover
+            from merge import merge_emergency_journal
+
+        self.flush()
+        with (
+            self._journal_lock,
+            JournalLock(
+                self.journal_emergency_file,
+                timeout=self.lock_timeout,
+                stats=self.lock_stats,
+            ),
+        ):
+            n_entries = merge_emergency_journal(
+                self._active_journal_file,
+                self.journal_emergency_file,
+                first_index=self._manifest.last_entry + 1 if self._manifest else 1,
+                durability=self.durability,
+            )
+            if self.replica is not None:
+                self.replica.mark_dirty(0)
+
+            # The journal has been replaced, so forget its state
+            self._tag_index = None
+            self._tag_maxima = None
+            self.__sync_lookup_indexes()
+
+        return n_entries
+
+    @timed
+    def sync_replica(self) -> bool:
+        """
+        Sync the local replica with the journal file now, even if the journal file was
+        found unreachable recently (see the `replica` module). The changes made in the
+        context are written before.
+
+        :return: `True` if the replica and the journal file are in sync.
         """
         self.__check_context()
 
-        # Print last 10 lines or all the journal if it has less than 10 lines
-        n_lines = 10 if len(self._journal) > 10 else len(self._journal)
-        if n_lines > 0:
-            message = f"Journal last {n_lines} lines:\n"
-            for line in self._journal[-n_lines:]:
+        if self.replica is None:
+            logger.error(
+                "No local replica of the journal. Define it in the `JOURNAL_REPLICA` "
+                "environment variable."
+            )
+            raise RuntimeError("No local replica.")
+
+        self.flush()
+        in_sync = self.replica.sync(force=True)
+        with self._journal_lock:
+            # The replica could have been copied again from the journal file
+            self._tag_index = None
+            self._tag_maxima = None
+            self.__sync_lookup_indexes()
+
+        return in_sync
+
+    @timed
+    def to_columnar(self) -> ColumnarJournal:
+        """
+        Get a columnar representation of the journal entries, for analytics over long
+        histories, like the entries per day or the tag frequency over time. It is built
+        streaming the entries, so the journal is not loaded.
+
+        :return: The columnar journal.
+        """
+        return ColumnarJournal.from_entries(self.iter_entries())
+
+    @timed
+    def export_journal(
+        self,
+        output: TextIO,
+        export_format: str = "jsonl",
+        workers: Optional[int] = None,
+    ) -> int:
+        """
+        Export the journal entries, streaming them to a text stream: as JSON Lines, CSV
+        or an HTML table (see the `export` module). Large journals are exported in
+        parallel chunks, in the same order. The changes made in the context are written
+        before, and the lock over the journal file is held while exporting.
+
+        :param output: The text stream to write.
+        :param export_format: `jsonl`, `csv` or `html`.
+        :param workers: The number of processes that export the journal. Default is the
+            number of CPUs.
+        :return: The number of exported entries.
+        """
+        self.__check_context()
+
+        try:
+            from .export import export_journal_files
+        except ImportError:  # pragma: no cover
+            from export import export_journal_files
+
+        self.flush()
+        with self._journal_lock.shared:
+            journal_files = [
+                (segment.file, None)
+                for segment in (self._manifest.segments if self._manifest else [])
+            ]
+            journal_files.append(
+                (
+                    self._active_journal_file,
+                    os.path.getsize(self._active_journal_file),
+                )
+            )
+            return export_journal_files(
+                journal_files, output, export_format=export_format, workers=workers
+            )
+
+    @timed
+    def last_lines(self, n_lines: int = 10) -> list:
+        """
+        Get the last lines of the journal. If the journal is not loaded, only the end of
+        the journal file is read, and only the end of the last sealed segments if the
+        active segment has less lines.
+
+        :param n_lines: The number of lines to get.
+        :return: The last lines, or all the journal if it has less lines.
+        """
+        self.__check_context()
+
+        if self._journal_lines is None:
+            with self._journal_lock.shared:
+                last_lines = (
+                    self.__read_tail_lines(n_lines, end=self._tail_offset)
+                    + self._tail_lines
+                )
+        else:
+            last_lines = self._journal_lines
+
+        # Complete the lines from the sealed segments, if the active one has less
+        for segment in reversed(self._manifest.segments if self._manifest else []):
+            if len(last_lines) >= n_lines:
+                break
+            last_lines = segment.last_lines(n_lines - len(last_lines)) + last_lines
+
+        return last_lines[-n_lines:] if n_lines > 0 else []
+
+    @timed
+    def print_journal(self, n_lines: int = 10) -> None:
+        """
+        Read the journal and print its last lines.
+
+        :param n_lines: The number of lines to print.
+        """
+        last_lines = self.last_lines(n_lines)
+        if last_lines:
+            message = f"Journal last {len(last_lines)} lines:\n"
+            for line in last_lines:
                 message += f"  {line}"
             logger.info(message)
         else:
             logger.warning(f"The journal is empty.")
 
+    @timed
+    def print_tags(self) -> None:
+        """
+        Print all the tags used in the journal file, with their number of uses and their
+        last use.
+        """
+        self.__check_context()
+
+        # Number of uses and last use of each tag, across the segments
+        tags = {}
+        for tag_index in self.__get_tag_indexes():
+            for tag_name, tag in tag_index.tags.items():
+                uses = tags[tag_name][0] if tag_name in tags else 0
+                tags[tag_name] = (
+                    uses + len(tag["occurrences"]),
+                    tag_index,
+                    tag["occurrences"][-1],
+                )
+        if not tags:
+            logger.warning("The journal has no tags.")
+            return
+
+        message = "Journal tags:\n"
+        for tag_name, (uses, tag_index, last_occurrence) in sorted(tags.items()):
+            entry, offset, index = last_occurrence
+            last_use = Entry.from_line(tag_index.read_line(offset))
+            timestamp = last_use.timestamp if last_use else None
+            message += (
+                f"  #{tag_name}: {uses} use{'s' if uses != 1 else ''}, last "
+                f"#{tag_name}{index} in entry {entry} ({timestamp})\n"
+            )
+        logger.info(message)
+
+    @timed
+    def print_tag_history(self, tag_name: str) -> None:
+        """
+        Print all the lines of the journal file tagged with the tag `tag_name`.
+
+        :param tag_name: The tag name.
+        """
+        self.__check_context()
+
+        message = ""
+        for tag_index in self.__get_tag_indexes():
+            tag = tag_index.tags.get(tag_name)
+            if not tag:
+                continue
+            offsets = dict.fromkeys(offset for _, offset, _ in tag["occurrences"])
+            for offset in offsets:
+                message += f"  {tag_index.read_line(offset)}"
+        if not message:
+            logger.warning(f"Tag `#{tag_name}` not found in the journal.")
+            return
+
+        logger.info(f"Tag `#{tag_name}` history:\n{message}")
+
+    @timed
+    def get_entries(self, first: int, last: Optional[int] = None) -> list:
+        """
+        Get the lines of a range of entries by their numbers. If the journal is not
+        loaded, the entry index is used to seek straight to the first entry, so the cost
+        does not depend on the size of the journal. If the journal is segmented, only the
+        sealed segments with entries in the range are read.
+
+        :param first: The number of the first entry.
+        :param last: The number of the last entry, included. Default is `first`.
+        :return: The lines of the entries in the range.
+        """
+        self.__check_context()
+
+        if last is None:
+            last = first
+
+        # Entries of the sealed segments, if any in the range
+        sealed_lines = []
+        if self._manifest and first <= self._manifest.last_entry:
+            with self._journal_lock.shared:
+                for segment in self._manifest.segments_for_entries(first, last):
+                    sealed_lines += segment.read_entries(
+                        first, last, persistent=self.persist_entry_index
+                    )
+
+        if self._journal_lines is None:
+            with self._journal_lock.shared:
+                lines = self.__get_entry_index().read_entries(
+                    first, last, end=self._tail_offset
+                )
+            if lines is not None:
+                return (
+                    sealed_lines
+                    + lines
+                    + [
+                        line
+                        for line in self._tail_lines
+                        if first <= self.__get_entry_number(line, default=0) <= last
+                    ]
+                )
+            logger.debug("Entry index does not match the journal, reading it all...")
+
+        return sealed_lines + [
+            line
+            for line in self._journal
+            if first <= self.__get_entry_number(line, default=0) <= last
+        ]
+
+    @timed
+    def print_entries(self, first: int, last: Optional[int] = None) -> None:
+        """
+        Print the lines of a range of entries by their numbers.
+
+        :param first: The number of the first entry.
+        :param last: The number of the last entry, included. Default is `first`.
+        """
+        entries = self.get_entries(first, last)
+        if entries:
+            entry_range = first if last in (None, first) else f"{first} to {last}"
+            message = f"Journal entries {entry_range}:\n"
+            for line in entries:
+                message += f"  {line}"
+            logger.info(message)
+        else:
+            logger.warning(f"No entries found.")
+
+    @timed
+    def find_entries(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        signature: Optional[str] = None,
+    ) -> list:
+        """
+        Find the lines of the journal in a time range and with a signature. If the
+        journal is not loaded, the time index is used to bisect the journal file, reading
+        only the lines in the range. If the journal is segmented, the sealed segments out
+        of the range are skipped.
+
+        :param since: If provided, only the lines from this timestamp onwards, formatted
+            like the journal timestamps (see `time_index.parse_time_bound`).
+        :param until: If provided, only the lines until this timestamp, included.
+        :param signature: If provided, only the lines with this signature.
+        :return: The matching lines, in chronological order.
+        """
+        self.__check_context()
+
+        if self._journal_lines is None:
+            with self._journal_lock.shared:
+                lines = self.__get_time_index().find(
+                    since, until, signature, end=self._tail_offset
+                )
+            new_lines = self._tail_lines
+        else:
+            lines, new_lines = [], self._journal_lines
+
+        # Lines of the sealed segments, merged by timestamp with the active ones
+        if self._manifest and self._manifest.segments_info:
+            with self._journal_lock.shared:
+                found_runs = [
+                    segment.find(
+                        since, until, signature, persistent=self.persist_time_index
+                    )
+                    for segment in self._manifest.segments
+                ]
+            lines = list(
+                heapq.merge(
+                    *found_runs,
+                    lines,
+                    key=lambda line: parse_line_header(line.encode())[0],
+                )
+            )
+
+        # Sort the matching lines changed in the context along the found ones
+        found = []
+        for line in new_lines:
+            timestamp = match_line(line.encode(), since, until, signature)
+            if timestamp:
+                found.append((timestamp, line))
+        if found:
+            found = [
+                (parse_line_header(line.encode())[0], line) for line in lines
+            ] + found
+            lines = [line for _, line in sorted(found, key=lambda item: item[0])]
+
+        return lines
+
+    @timed
+    def print_found_entries(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        signature: Optional[str] = None,
+    ) -> None:
+        """
+        Print the lines of the journal in a time range and with a signature, like
+        `find_entries`.
+        """
+        found_lines = self.find_entries(since, until, signature)
+        if found_lines:
+            message = f"Found {len(found_lines)} journal lines:\n"
+            for line in found_lines:
+                message += f"  {line}"
+            logger.info(message)
+        else:
+            logger.warning(f"No entries found.")
+
+    @timed
     def write_line(
         self,
         message: str,
         signature: Optional[str] = None,
         as_command: bool = False,
         printing: bool = True,
-    ) -> None:
+    ) -> str:
         """
         Write a new line to the journal.
 
@@ -173,33 +1084,85 @@ class Jour:
         :param signature: The signature to add as the line author. Default is the user name.
         :param as_command: If `True`, format the message as a command.
         :param printing: If `True`, print the new line.
+        :return: The new line.
         """
         self.__check_context()
+        self.__begin_write()
 
         # Compose the new line
         new_line = self.__format_new_line(
             message=message, signature=signature, as_command=as_command
         )
 
-        # Append the new line to the journal
-        self._journal.append(new_line)
+        # Append the new line to the journal. If the journal is not loaded, add it to the
+        # tail window, to append it to the journal file when flushing
+        if self._journal_lines is None:
+            self._tail_lines.append(new_line)
+        else:
+            self.__mark_dirty(len(self._journal_lines))
+            self._journal_lines.append(new_line)
+        self.__update_tag_maxima(new_line)
 
         if printing:
             logger.info(f"New line:\n  {new_line}")
 
+        return new_line
+
+    @timed
+    def write_lines(self, entries: Iterable, printing: bool = True) -> list:
+        """
+        Write many new lines to the journal at once, so they get consecutive indexes and
+        tag indexes. The exclusive lock over the journal file is held from the
+        computation of their indexes until they are written to the journal file, together,
+        when flushing or exiting the context.
+
+        :param entries: The entries to write. Each entry is a message, or a dictionary
+            with a `message` key and the optional keys `signature`, `tag` and
+            `as_command`, like the `write_line` and `tag_last_line` parameters.
+        :param printing: If `True`, print the new lines.
+        :return: The new lines.
+        """
+        self.__check_context()
+        self.__begin_write()
+
+        new_lines = []
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {"message": entry}
+            new_line = self.write_line(
+                entry["message"],
+                signature=entry.get("signature"),
+                as_command=entry.get("as_command", False),
+                printing=False,
+            )
+            if entry.get("tag"):
+                new_line = self.tag_last_line(entry["tag"], printing=False)
+            new_lines.append(new_line)
+
+        if printing and new_lines:
+            message = f"New {len(new_lines)} lines:\n"
+            for line in new_lines:
+                message += f"  {line}"
+            logger.info(message)
+
+        return new_lines
+
+    @timed
     def append_to_last_line(
         self, new_message: str, as_command: bool = False, printing: bool = True
-    ) -> None:
+    ) -> str:
         """
         Add some new content to the last line of the journal.
 
         :param new_message: The new message part to add.
         :param as_command: If `True`, format the new message as a command.
         :param printing: If `True`, print the new last line.
+        :return: The new last line.
         """
         self.__check_context()
+        self.__begin_write()
 
-        last_line = self._journal[-1]
+        last_line = self.__get_last_line()
 
         # Apply command format, if desired
         if as_command:
@@ -209,23 +1172,35 @@ class Jour:
         new_last_line = last_line.replace("\n", f" {new_message}.\n")
 
         # Replace the last line with the new last line
-        self._journal[-1] = new_last_line
+        self.__set_last_line(new_last_line)
 
         if printing:
             logger.info(f"New line:\n  {new_last_line}")
 
+        return new_last_line
+
+    @timed
     def remove_last_line(self) -> None:
         """
         Remove the last line of the journal.
         """
         self.__check_context()
+        self.__begin_write()
 
-        self._journal.pop()
+        if self._journal_lines is None and (
+            self._tail_lines or self.__pull_tail_line()
+        ):
+            self._tail_lines.pop()
+        else:
+            self._journal.pop()
+            self.__mark_dirty(len(self._journal))
+        self._tag_maxima = None  # Tags of the removed line could be the maximum
         logger.info("Last line removed.")
 
+    @timed
     def tag_last_line(
         self, tag_name: str, indexing: bool = True, printing: bool = True
-    ) -> None:
+    ) -> str:
         """
         Add a tag based in `tag_name` to the last line of the journal. Calculate
         the correct tag index, if not disabled with `indexing`.
@@ -233,23 +1208,28 @@ class Jour:
         :param tag_name: The tag name to add.
         :param indexing: If `True`, calculate the next index of the tag.
         :param printing: If `True`, print the new last line.
+        :return: The new last line.
         """
         self.__check_context()
+        self.__begin_write()
 
-        last_line = self._journal[-1]
+        last_line = self.__get_last_line()
 
         # Compose the new tag
-        new_tag = self.get_next_tag(tag_name, indexing)
+        new_tag = self.get_next_tag(tag_name, indexing, printing=printing)
 
         # Compose the new last line to the journal adding the new tag
         new_last_line = last_line.replace("\n", f" {new_tag}.\n")
 
         # Replace the last line with the new last line
-        self._journal[-1] = new_last_line
+        self.__set_last_line(new_last_line)
 
         if printing:
             logger.info(f"New line:\n  {new_last_line}")
 
+        return new_last_line
+
+    @timed
     def get_next_tag(
         self, tag_name: str, indexing: bool = True, printing: bool = True
     ) -> str:
@@ -326,14 +1306,61 @@ class Jour:
         :return: The next index.
         """
         try:
-            last_line = self._journal[-1]
+            last_line = self.__get_last_line()
 
             # Calculate the next index, which is the `N` of the last line `N. ...`
             index = last_line.split(".")[0]
 
             return int(index) + 1
-        except (IndexError, ValueError):
-            return 1  # If the journal is empty, start with 1
+        except (AttributeError, ValueError):
+            # If the journal is empty, start with 1, or after the sealed segments
+            return self._manifest.last_entry + 1 if self._manifest else 1
+
+    def __get_last_line(self) -> Optional[str]:
+        """
+        Get the last line of the journal. If the journal is not loaded, only the end of
+        the journal file is read.
+
+        :return: The last line, or `None` if the journal is empty.
+        """
+        if self._journal_lines is not None:
+            return self._journal_lines[-1] if self._journal_lines else None
+        if self._tail_lines:
+            return self._tail_lines[-1]
+
+        with self._journal_lock.shared:
+            self.__pin_tail()
+            tail = self.__read_tail_lines(1, end=self._tail_offset)
+
+        return tail[-1] if tail else None
+
+    @timed
+    def tag_index(self) -> dict:
+        """
+        Get the maximum index of each tag used in the journal, including the changes
+        made in the context. The map is computed once per context and then kept updated.
+
+        :return: The map of tag names to their maximum index.
+        """
+        self.__check_context()
+
+        return dict(self.__get_tag_maxima())
+
+    def __set_last_line(self, line: str) -> None:
+        """
+        Replace the last line of the journal. If the journal is not loaded, it is
+        replaced in the tail window, without loading the journal.
+
+        :param line: The new last line.
+        """
+        if self._journal_lines is None and (
+            self._tail_lines or self.__pull_tail_line()
+        ):
+            self._tail_lines[-1] = line
+        else:
+            self._journal[-1] = line
+            self.__mark_dirty(len(self._journal) - 1)
+        self.__update_tag_maxima(line)
 
     def __calculate_next_tag_index(self, tag_name: str) -> int:
         """
@@ -342,17 +1369,155 @@ class Jour:
         :param tag_name: The tag name to add.
         :return: The next tag index.
         """
-        # Merge all lines as text to process it. Reverse the journal to find the last tag
-        all_journal_as_str = "".join(self._journal[::-1])
+        # Tag names not recognized by the tag index are searched in all the journal
+        match = TAG_REGEX.fullmatch(f"#{tag_name}1")
+        if not match or match.group(1) != tag_name:
+            tag_regex = re.compile(rf"(?<![\w#])#{re.escape(tag_name)}(\d+)(?!\d)")
+            journal = "".join(self._journal)
+            with self.__phase("tag_scan"):
+                max_index = max(
+                    (int(match.group(1)) for match in tag_regex.finditer(journal)),
+                    default=0,
+                )
+                for segment in self._manifest.segments if self._manifest else []:
+                    for line in segment.iter_lines():
+                        for match in tag_regex.finditer(line):
+                            max_index = max(max_index, int(match.group(1)))
+            return max_index + 1
+
+        return self.__get_tag_maxima().get(tag_name, 0) + 1
+
+    def __get_tag_maxima(self) -> dict:
+        """
+        Get the memoized map of tag names to their maximum index in the journal,
+        computing it if needed.
+
+        :return: The map of tag names to their maximum index.
+        """
+        if self._tag_maxima is not None:
+            return self._tag_maxima
+
+        # Maximum indexes of the sealed segments, kept in the manifest
+        tag_maxima = self._manifest.tag_maxima() if self._manifest else {}
+
+        if self._journal_lines is not None and not self.persist_tag_index:
+            # Scan all the loaded journal in one pass
+            with self.__phase("tag_scan"):
+                journal = "".join(self._journal_lines)
+                self._tag_maxima = scan_tags(journal, tag_maxima)
+            return self._tag_maxima
+
+        # Lines modified in the context are not in the journal file yet, so the tag
+        # index is only used for the lines before them
+        if self._journal_lines is None:
+            before_offset, modified_lines = self._tail_offset, self._tail_lines
+        elif self._dirty_from is None:
+            before_offset, modified_lines = None, []
+        else:
+            before_offset = self.__get_disk_offset(self._dirty_from)
+            modified_lines = self._journal_lines[self._dirty_from :]
+
+        for tag_name, index in self.__get_tag_index().maxima(before_offset).items():
+            if index > tag_maxima.get(tag_name, 0):
+                tag_maxima[tag_name] = index
+        with self.__phase("tag_scan"):
+            self._tag_maxima = scan_tags("".join(modified_lines), tag_maxima)
+        return self._tag_maxima
+
+    def __update_tag_maxima(self, line: str) -> None:
+        """
+        Update the memoized map of tag maximum indexes with the tags of a new or modified
+        journal line, if the map is already computed.
+
+        :param line: The new or modified line.
+        """
+        if self._tag_maxima is not None:
+            scan_tags(line, self._tag_maxima)
+
+    @staticmethod
+    def __get_entry_number(line: str, default: Optional[int] = None) -> Optional[int]:
+        """
+        Get the entry number of a journal line, which is the `N` of the line `N. ...`.
+
+        :param line: The journal line.
+        :param default: The value to return if the line is not numbered.
+        :return: The entry number.
+        """
+        match = ENTRY_INDEX_REGEX.match(line)
+        return int(match.group(1)) if match else default
+
+    def __get_entry_index(self) -> EntryIndex:
+        """
+        Get the entry index of the journal file, updated once per context.
 
-        # First check if the tag has been already used
-        tag_used = all_journal_as_str.find(f"{tag_name}1") != -1
-        if tag_used:
-            # Calculate last index of the tag in the journal
-            index = 1
-            while all_journal_as_str.find(f"{tag_name}{index}") != -1:
-                index += 1
-        else:  # Never used
-            index = 1
+        :return: The entry index.
+        """
+        if self._entry_index is None:
+            with self._journal_lock.shared, self.__phase("entry_index"):
+                self._entry_index = EntryIndex(
+                    self._active_journal_file, persistent=self.persist_entry_index
+                ).refresh()
+
+        return self._entry_index
+
+    def __get_time_index(self) -> TimeIndex:
+        """
+        Get the time index of the journal file, updated once per context.
+
+        :return: The time index.
+        """
+        if self._time_index is None:
+            with self._journal_lock.shared, self.__phase("time_index"):
+                self._time_index = TimeIndex(
+                    self._active_journal_file, persistent=self.persist_time_index
+                ).refresh()
+
+        return self._time_index
+
+    def __sync_lookup_indexes(self) -> None:
+        """
+        Update the entry and time indexes after writing the journal file, if they are
+        persisted, so the next lookups do not need to scan the new entries. Their sidecar
+        files are only kept once created by a lookup.
+        """
+        self._entry_index = None  # Outdated by the write
+        if (
+            self.persist_entry_index
+            and EntryIndex(self._active_journal_file).index_file.exists()
+        ):
+            self.__get_entry_index()
+
+        self._time_index = None  # Outdated by the write
+        if (
+            self.persist_time_index
+            and TimeIndex(self._active_journal_file).index_file.exists()
+        ):
+            self.__get_time_index()
+
+    def __get_tag_indexes(self) -> list:
+        """
+        Get the tag indexes of the sealed segments, if any, and of the journal file.
+
+        :return: The tag indexes, from the oldest to the newest segment.
+        """
+        with self._journal_lock.shared:
+            with self.__phase("tag_index"):
+                tag_indexes = [
+                    segment.tag_index(persistent=self.persist_tag_index)
+                    for segment in (self._manifest.segments if self._manifest else [])
+                ]
+            return tag_indexes + [self.__get_tag_index()]
+
+    def __get_tag_index(self) -> TagIndex:
+        """
+        Get the tag index of the journal file, updated once per context.
+
+        :return: The tag index.
+        """
+        if self._tag_index is None:
+            with self._journal_lock.shared, self.__phase("tag_index"):
+                self._tag_index = TagIndex(
+                    self._active_journal_file, persistent=self.persist_tag_index
+                ).refresh()
 
-        return index
+        return self._tag_index
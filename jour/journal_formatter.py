@@ -0,0 +1,84 @@
+"""
+Journal Formatter
+=================
+
+This module implements the formatting of the journal, which gives the same result than
+formatting it with Mdformat, with the options `MDFORMAT_OPTIONS`, without building the
+Markdown syntax tree of the journal. The journals written by Jour follow a narrow
+grammar, a numbered list of single lines, so each line is checked against it and
+numbered in a single pass: the lines are numbered consecutively from the number of the
+first one, padded with zeros to the width of the last number, like Mdformat does.
+
+The lines only pass the check if Mdformat would keep their text as is: plain text and
+code spans, without other Markdown blocks, continuation lines, blank lines, repeated
+spaces or inline markup that Mdformat rewrites, like emphasis, links, escapes or
+entities. If any line does not pass it, all the journal is formatted with Mdformat.
+"""
+
+import re
+from typing import Optional
+
+# Mdformat options used to format the journal file
+MDFORMAT_OPTIONS = {"number": True, "wrap": "keep"}
+
+# Pattern of a code span delimited by single backticks, kept as is by Mdformat
+CODE_SPAN_PATTERN = r"`[^`\s](?:[^`]*[^`\s])?`(?!`)"
+
+# Pattern of a run of plain text, without the characters of the inline markup nor
+# entities, apart from the underscores inside words, like in `test_user`. The whitespace
+# and control characters are checked apart
+PLAIN_TEXT_PATTERN = r"(?:[^*<\[\\\]_&`]++|&(?![#\w])|(?<=[^\W_])_(?=[^\W_]))"
+
+# Regex to match a journal line that Mdformat keeps as is, apart from its number. Its
+# text must not start like other Markdown block, like other list, nor end with a space
+FORMATTED_LINE_REGEX = re.compile(
+    rf"(\d{{1,9}})\. "
+    rf"((?![0-9]{{1,9}}[.)](?: |$))(?:[^\W_]|[\"'(]|{CODE_SPAN_PATTERN})"
+    rf"(?:{PLAIN_TEXT_PATTERN}|{CODE_SPAN_PATTERN})*+"
+    rf"(?<! ))"
+)
+
+
+def format_journal_lines(journal: str) -> Optional[str]:
+    """
+    Format the journal in a single pass, if all its lines follow the journal grammar.
+
+    :param journal: The journal text.
+    :return: The formatted journal, or `None` if some line is not recognized, so it
+        must be formatted with Mdformat.
+    """
+    lines = journal.split("\n")
+    if lines[-1] == "":
+        lines.pop()  # Ended by a line break
+    if not lines:
+        return ""
+
+    texts = []
+    for line in lines:
+        match = FORMATTED_LINE_REGEX.fullmatch(line)
+        if not match or "  " in line or not line.isprintable():
+            return None
+        texts.append(match.group(2))
+
+    first = int(FORMATTED_LINE_REGEX.fullmatch(lines[0]).group(1))
+    width = len(str(first + len(texts) - 1))
+    return "".join(
+        f"{index:0{width}}. {text}\n" for index, text in enumerate(texts, start=first)
+    )
+
+
+def format_journal(journal: str) -> str:
+    """
+    Format the journal like Mdformat, with the options `MDFORMAT_OPTIONS`. The journal
+    is only formatted with Mdformat if `format_journal_lines` cannot format it.
+
+    :param journal: The journal text.
+    :return: The formatted journal.
+    """
+    journal_fmt = format_journal_lines(journal)
+    if journal_fmt is None:
+        import mdformat
+
+        journal_fmt = mdformat.text(journal, options=MDFORMAT_OPTIONS)
+
+    return journal_fmt
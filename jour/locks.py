@@ -0,0 +1,266 @@
+"""
+Locks
+=====
+
+This module implements the locks over the journal files: reader/writer locks taken with
+`fcntl.flock` over a lock file keyed by the real path of the journal, so two journals
+with the same name in different directories do not share a lock, and two paths to the
+same journal do. Readers take shared locks, so they do not wait for each other, and
+writers take exclusive ones.
+
+The locks are reentrant: an operation can be called from other one that already holds
+the lock, and a shared lock is upgraded while an exclusive one is held inside it. Like
+`flock` conversions, the upgrade is not atomic. The time waited for each lock is
+measured, to see the contention on busy hosts.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    from .phases import PhaseHook
+except ImportError:  # pragma: no cover
+    from phases import PhaseHook
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Default seconds to wait for a lock, if not defined in `JOURNAL_LOCK_TIMEOUT`
+LOCK_TIMEOUT = 10
+
+# Seconds between the attempts to take a busy lock, doubled up to the maximum
+LOCK_POLL_INTERVAL = 0.005
+LOCK_MAX_POLL_INTERVAL = 0.1
+
+# Seconds waited for a lock from which the wait is reported as a warning
+LOCK_WAIT_WARNING = 1
+
+
+class LockTimeoutError(TimeoutError):
+    """
+    Error raised when a lock over a journal file is not taken before the timeout.
+    """
+
+
+def get_lock_timeout() -> float:
+    """
+    Recover the lock timeout from the environment variable `JOURNAL_LOCK_TIMEOUT`.
+
+    :return: The seconds to wait for a lock, by default `LOCK_TIMEOUT`.
+    """
+    timeout = os.getenv("JOURNAL_LOCK_TIMEOUT")
+    if not timeout:
+        return LOCK_TIMEOUT
+    try:
+        return float(timeout)
+    except ValueError:
+        logger.warning(
+            f"Invalid `JOURNAL_LOCK_TIMEOUT`: `{timeout}`. Using {LOCK_TIMEOUT} seconds."
+        )
+        return LOCK_TIMEOUT
+
+
+def get_lock_file(journal_file: Path) -> Path:
+    """
+    Get the lock file of a journal file, in the temporary directory, named after the
+    hash of the real path of the journal file.
+
+    :param journal_file: The journal file.
+    :return: The lock file.
+    """
+    real_path = os.path.realpath(journal_file)
+    digest = hashlib.sha256(real_path.encode()).hexdigest()[:32]
+    return Path(tempfile.gettempdir()) / f"jour-{digest}.lock"
+
+
+def new_lock_stats() -> dict:
+    """
+    Get empty lock wait statistics, to be filled by the locks.
+
+    :return: For each lock mode, `shared` and `exclusive`, the number of acquisitions,
+        the number of them that had to wait, and the total and maximum seconds waited.
+    """
+    return {
+        mode: {"acquisitions": 0, "waits": 0, "wait_time": 0.0, "max_wait_time": 0.0}
+        for mode in ("shared", "exclusive")
+    }
+
+
+class JournalLock:
+    """
+    Reentrant reader/writer lock over a journal file. Used as a context manager, it takes
+    an exclusive lock. Its `shared` attribute is a context manager that takes a shared
+    lock over the same file.
+    """
+
+    def __init__(
+        self,
+        journal_file: Path,
+        timeout: Optional[float] = None,
+        stats: Optional[dict] = None,
+        phase_hook: Optional[PhaseHook] = None,
+    ):
+        """
+        Initialize the lock over a journal file. It is not taken until entered.
+
+        :param journal_file: The journal file.
+        :param timeout: The seconds to wait for the lock. Default is the one of
+            `get_lock_timeout`.
+        :param stats: If provided, the lock wait statistics to update, like the ones of
+            `new_lock_stats`. By default, new ones.
+        :param phase_hook: If provided, a phase hook (see the `phases` module) that
+            receives the seconds waited for each lock, as `lock_shared` or
+            `lock_exclusive`.
+        """
+        self.journal_file = Path(journal_file)
+        self.lock_file = get_lock_file(self.journal_file)
+        self.timeout = get_lock_timeout() if timeout is None else timeout
+        self.stats = new_lock_stats() if stats is None else stats
+        self.phase_hook = phase_hook
+        self.shared = SharedJournalLock(self)
+
+        self._fd: Optional[int] = None
+        self._held: Optional[int] = None  # Current `flock` operation, if any
+        self._shared_count = 0
+        self._exclusive_count = 0
+
+    def __enter__(self):
+        self.acquire(exclusive=True)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release(exclusive=True)
+
+    def acquire(self, exclusive: bool = True) -> None:
+        """
+        Take the lock, waiting for it until the timeout if busy.
+
+        :param exclusive: If `True`, take an exclusive lock. If `False`, a shared one.
+        """
+        if exclusive:
+            self._exclusive_count += 1
+        else:
+            self._shared_count += 1
+        try:
+            self.__update()
+        except BaseException:
+            self.release(exclusive)
+            raise
+
+    def release(self, exclusive: bool = True) -> None:
+        """
+        Release the lock once, downgrading or unlocking it if not held anymore.
+
+        :param exclusive: If `True`, release an exclusive lock. If `False`, a shared one.
+        """
+        if exclusive:
+            self._exclusive_count -= 1
+        else:
+            self._shared_count -= 1
+        self.__update()
+
+    def __update(self) -> None:
+        """
+        Take the `flock` lock needed by the held locks: exclusive if any, else shared if
+        any, else none.
+        """
+        if self._exclusive_count:
+            operation = fcntl.LOCK_EX
+        elif self._shared_count:
+            operation = fcntl.LOCK_SH
+        else:
+            operation = None
+
+        if operation == self._held and (operation or self._fd is None):
+            return
+        if operation is None:
+            if self._held is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+            self._held = None
+            return
+
+        if self._fd is None:
+            self._fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            self.__flock(operation)
+        except BaseException:
+            # A failed conversion of a lock could drop the previous one
+            self._held = None
+            raise
+        self._held = operation
+
+    def __flock(self, operation: int) -> None:
+        """
+        Take a `flock` lock without blocking, trying again until the timeout, and record
+        the time waited.
+
+        :param operation: The `flock` operation: `LOCK_SH` or `LOCK_EX`.
+        """
+        mode = "exclusive" if operation == fcntl.LOCK_EX else "shared"
+        start = time.monotonic()
+        interval = LOCK_POLL_INTERVAL
+        blocked = False
+        while True:
+            try:
+                fcntl.flock(self._fd, operation | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                blocked = True
+                waited = time.monotonic() - start
+                if waited >= self.timeout:
+                    raise LockTimeoutError(
+                        f"Timeout waiting {waited:.2f} s for the {mode} lock over "
+                        f"`{self.journal_file}`."
+                    )
+                time.sleep(min(interval, self.timeout - waited))
+                interval = min(interval * 2, LOCK_MAX_POLL_INTERVAL)
+
+        if self.phase_hook is not None:
+            self.phase_hook(f"lock_{mode}", time.monotonic() - start)
+
+        stats = self.stats[mode]
+        stats["acquisitions"] += 1
+        if blocked:
+            waited = time.monotonic() - start
+            stats["waits"] += 1
+            stats["wait_time"] += waited
+            stats["max_wait_time"] = max(stats["max_wait_time"], waited)
+            message = (
+                f"Waited {waited:.3f} s for the {mode} lock over `{self.journal_file}`."
+            )
+            if waited >= LOCK_WAIT_WARNING:
+                logger.warning(message)
+            else:
+                logger.debug(message)
+
+
+class SharedJournalLock:
+    """
+    Context manager that takes a shared lock of a `JournalLock`.
+    """
+
+    def __init__(self, lock: JournalLock):
+        """
+        :param lock: The journal lock.
+        """
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire(exclusive=False)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.lock.release(exclusive=False)
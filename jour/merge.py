@@ -0,0 +1,206 @@
+"""
+Merge
+=====
+
+This module implements the merge of the emergency journal into the journal. Both files
+are streamed and merged by timestamp, so the memory used does not depend on their size.
+The entries are renumbered, and the tag indexes of the emergency journal that collide
+with the ones of the journal get the next free indexes. The journal is then replaced
+atomically, synced to the disk unless the durability mode is `fast` (see the
+`durability` module), and the emergency journal archived. The same merge reconciles the new entries
+of a local replica with a journal file changed by others (see the `replica` module).
+"""
+
+import datetime
+import heapq
+import logging
+import os
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    from .durability import get_durability, replace_file
+    from .tag_index import ENTRY_INDEX_REGEX, TAG_REGEX, TagIndex
+    from .time_index import parse_line_header
+except ImportError:  # pragma: no cover
+    from durability import get_durability, replace_file
+    from tag_index import ENTRY_INDEX_REGEX, TAG_REGEX, TagIndex
+    from time_index import parse_line_header
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+
+def get_tag_remapping(journal_file: Path, emergency_file: Path) -> dict:
+    """
+    Compute the new indexes of the tags of the emergency journal that are also used in the
+    journal, like two `#BUP7`. The tags of the journal keep their indexes, because they
+    could be referenced elsewhere, and the colliding tags of the emergency journal get the
+    next free indexes, keeping their order.
+
+    :param journal_file: The journal file.
+    :param emergency_file: The emergency journal file.
+    :return: The map of `(tag_name, index)` of the emergency journal to their new index.
+    """
+    journal_tags = TagIndex(journal_file).refresh().tags
+    emergency_tags = TagIndex(emergency_file, persistent=False).refresh().tags
+
+    remapping = {}
+    for tag_name, emergency_tag in emergency_tags.items():
+        journal_tag = journal_tags.get(tag_name)
+        if not journal_tag:
+            continue
+        used_indexes = {index for _, _, index in journal_tag["occurrences"]}
+        next_index = max(journal_tag["max_index"], emergency_tag["max_index"])
+        for index in sorted({index for _, _, index in emergency_tag["occurrences"]}):
+            if index in used_indexes:
+                next_index += 1
+                remapping[(tag_name, index)] = next_index
+
+    return remapping
+
+
+def iter_records(journal_file: Path) -> Iterator[tuple]:
+    """
+    Stream the entries of a journal file with their timestamps, to merge them. The lines
+    that are not numbered are kept with the previous entry, and the entries without
+    timestamp get the one of the previous entry, to keep their place.
+
+    :param journal_file: The journal file.
+    :return: An iterator of `(timestamp, lines)` records.
+    """
+    timestamp = ""
+    lines = []
+    with open(journal_file, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                line += b"\n"
+            if ENTRY_INDEX_REGEX.match(line.decode(errors="replace")) and lines:
+                yield timestamp, lines
+                lines = []
+            header = parse_line_header(line)
+            if header and not lines:
+                timestamp = header[0]
+            lines.append(line)
+    if lines:
+        yield timestamp, lines
+
+
+def count_entries(journal_file: Path) -> int:
+    """
+    Count the numbered entries of a journal file, streaming it.
+
+    :param journal_file: The journal file.
+    :return: The number of entries.
+    """
+    n_entries = 0
+    with open(journal_file, "rb") as f:
+        for line in f:
+            if ENTRY_INDEX_REGEX.match(line.decode(errors="replace")):
+                n_entries += 1
+
+    return n_entries
+
+
+def merge_journals(
+    journal_file: Path,
+    other_file: Path,
+    first_index: int = 1,
+    durability: Optional[str] = None,
+) -> int:
+    """
+    Merge the entries of other journal into the journal, by timestamp, renumbering the
+    entries and remapping the colliding tag indexes of the other journal. The merged
+    journal is written to a temporary file that replaces the journal atomically. The
+    caller must hold the lock over the journal file.
+
+    :param journal_file: The journal file.
+    :param other_file: The journal file to merge into it, which is not modified.
+    :param first_index: The number of the first merged entry. It is not `1` when the
+        journal file is the active segment of a segmented journal.
+    :param durability: The commit strategy of the merged journal (see the `durability`
+        module). Only the `fast` one does not sync it to the disk. Default is the one of
+        `get_durability`.
+    :return: The number of merged entries of the other journal.
+    """
+    journal_file, other_file = Path(journal_file), Path(other_file)
+    durability = get_durability(durability)
+
+    n_other_entries = count_entries(other_file)
+    width = len(str(first_index - 1 + count_entries(journal_file) + n_other_entries))
+    remapping = get_tag_remapping(journal_file, other_file)
+
+    def remap_tags(match) -> str:
+        index = remapping.get((match.group(1), int(match.group(2))))
+        return match.group(0) if index is None else f"#{match.group(1)}{index}"
+
+    # Tag the records with their origin, to only remap the tags of the other journal
+    records = heapq.merge(
+        ((timestamp, False, lines) for timestamp, lines in iter_records(journal_file)),
+        ((timestamp, True, lines) for timestamp, lines in iter_records(other_file)),
+        key=lambda record: record[0],
+    )
+
+    def iter_merged_lines() -> Iterator[bytes]:
+        index = first_index - 1
+        for _, from_other, lines in records:
+            for line in lines:
+                line = line.decode(errors="replace")
+                match = ENTRY_INDEX_REGEX.match(line)
+                if match:
+                    index += 1
+                    line = f"{index:0{width}}. {line[match.end():]}"
+                if from_other and remapping and "#" in line:
+                    line = TAG_REGEX.sub(remap_tags, line)
+                yield line.encode()
+
+    replace_file(journal_file, iter_merged_lines(), fsync=durability != "fast")
+
+    return n_other_entries
+
+
+def merge_emergency_journal(
+    journal_file: Path,
+    emergency_file: Path,
+    archive_file: Optional[Path] = None,
+    first_index: int = 1,
+    durability: Optional[str] = None,
+) -> int:
+    """
+    Merge the emergency journal into the journal, by timestamp, renumbering the entries
+    and remapping the colliding tag indexes of the emergency journal. The merged journal
+    is written to a temporary file that replaces the journal atomically, and then the
+    emergency journal is archived. The caller must hold the locks over both files.
+
+    :param journal_file: The journal file.
+    :param emergency_file: The emergency journal file.
+    :param archive_file: Where to archive the emergency journal. Default is next to it,
+        with the merge date and time in its name.
+    :param first_index: The number of the first merged entry. It is not `1` when the
+        journal file is the active segment of a segmented journal.
+    :param durability: The commit strategy of the merged journal (see `merge_journals`).
+    :return: The number of merged entries of the emergency journal.
+    """
+    journal_file, emergency_file = Path(journal_file), Path(emergency_file)
+    if archive_file is None:
+        now = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        archive_file = emergency_file.with_name(
+            f"{emergency_file.stem}.merged-{now}{emergency_file.suffix}"
+        )
+
+    n_emergency_entries = merge_journals(
+        journal_file, emergency_file, first_index=first_index, durability=durability
+    )
+
+    os.replace(emergency_file, archive_file)
+    logger.info(
+        f"Merged {n_emergency_entries} entries of the emergency journal into the "
+        f"journal. Emergency journal archived in `{archive_file}`."
+    )
+
+    return n_emergency_entries
@@ -0,0 +1,110 @@
+"""
+Phases
+======
+
+This module implements the timing of the phases of the Jour operations, to see where the
+time of a slow call goes: waiting for the lock, loading the journal, scanning the tags,
+formatting it (see the `journal_formatter` module), writing it... A phase hook is a
+callable that receives the name of each finished phase and the seconds it took, like
+`PhaseStats`. The phases can be nested, like `format` and `write` inside `flush`, inside
+`exit`.
+
+Without hook, the phases are not timed, and the only cost is checking if there is one.
+"""
+
+import contextlib
+import functools
+import time
+from typing import Callable, Optional
+
+# Phase hook: receives the phase name and the seconds it took
+PhaseHook = Callable[[str, float], None]
+
+# Context manager of the phases not timed, reused for all of them
+NULL_PHASE = contextlib.nullcontext()
+
+
+class Phase:
+    """
+    Context manager that times a phase and reports it to a hook when finished, even if
+    it fails.
+    """
+
+    __slots__ = ("hook", "name", "start")
+
+    def __init__(self, hook: PhaseHook, name: str):
+        """
+        :param hook: The phase hook.
+        :param name: The phase name.
+        """
+        self.hook = hook
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.hook(self.name, time.perf_counter() - self.start)
+
+
+def phase(hook: Optional[PhaseHook], name: str):
+    """
+    Get a context manager that times a phase, if there is a hook.
+
+    :param hook: The phase hook, or `None`.
+    :param name: The phase name.
+    :return: The context manager.
+    """
+    return NULL_PHASE if hook is None else Phase(hook, name)
+
+
+def timed(method):
+    """
+    Decorator that times a method of an object with a `phase_hook` attribute as a phase
+    named after the method.
+
+    :param method: The method.
+    :return: The decorated method.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.phase_hook is None:
+            return method(self, *args, **kwargs)
+        with Phase(self.phase_hook, name):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class PhaseStats:
+    """
+    Phase hook that accumulates the number of times and the seconds of each phase.
+    """
+
+    def __init__(self):
+        self.phases = {}
+
+    def __call__(self, name: str, seconds: float) -> None:
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0}
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def to_dict(self) -> dict:
+        """
+        Get the accumulated statistics, from the slowest phase to the fastest.
+
+        :return: For each phase name, its number of `calls`, and the total `seconds` and
+            `max_seconds` taken.
+        """
+        return dict(
+            sorted(
+                self.phases.items(), key=lambda item: item[1]["seconds"], reverse=True
+            )
+        )
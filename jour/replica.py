@@ -0,0 +1,576 @@
+"""
+Replica
+=======
+
+This module implements the local-first mode, for journals in remote or cloud-synced file
+systems, which can hang or disappear. The journal file is copied to a local replica, where
+the commands read and write, so they never wait for the remote file system, and the
+changes are replayed to the journal file in the background, when it is reachable:
+
+- If the journal file has not been changed by others since the last sync, the modified
+  end of the replica is written over it, like a usual write. An interrupted replay is
+  completed by the next sync.
+- If it has been changed, like by other host, the new entries of the replica are merged
+  into it by date, renumbering them and their colliding tags like the emergency journal
+  merge, and the replica is copied again from the merged journal. Local changes to the
+  entries already synced, like a tag added to them, cannot be replayed then, and are
+  reported.
+
+The changes of the journal file made by others are brought to the replica by the syncs
+too. The sync state (the journal file size at the last sync, its last entry and the first
+byte of the replica modified since then) is kept in a hidden file next to the replica,
+like `.journal.md.sync.json`. The reachability of the journal file is probed in a separate
+thread with a timeout, so a hung mount does not block the caller, and after a failed probe
+the syncs are not tried again for a while. Segmented journals are not supported.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from itertools import chain
+from pathlib import Path
+from typing import Optional
+
+try:
+    from .durability import get_durability, patch_file, read_prefix, replace_file
+    from .locks import JournalLock, LockTimeoutError
+    from .segments import Manifest
+    from .streaming import stream_lines_reversed
+    from .tag_index import ENTRY_INDEX_REGEX
+except ImportError:  # pragma: no cover
+    from durability import get_durability, patch_file, read_prefix, replace_file
+    from locks import JournalLock, LockTimeoutError
+    from segments import Manifest
+    from streaming import stream_lines_reversed
+    from tag_index import ENTRY_INDEX_REGEX
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Default seconds to wait for the journal file system, if not defined in
+# `JOURNAL_PROBE_TIMEOUT`
+PROBE_TIMEOUT = 2
+
+# Seconds without trying to sync after the journal file is found unreachable
+SYNC_RETRY_DELAY = 30
+
+# Seconds between the syncs of `ReplicaSync`
+SYNC_INTERVAL = 5
+
+# Seconds that a command waits for its background sync before exiting
+SYNC_EXIT_TIMEOUT = 3
+
+# Probes in progress, by file, reused by the next probes while they do not finish
+_probes = {}
+_probes_lock = threading.Lock()
+
+
+def get_probe_timeout() -> float:
+    """
+    Recover the probe timeout from the environment variable `JOURNAL_PROBE_TIMEOUT`.
+
+    :return: The seconds to wait for the journal file system, by default `PROBE_TIMEOUT`.
+    """
+    timeout = os.getenv("JOURNAL_PROBE_TIMEOUT")
+    if not timeout:
+        return PROBE_TIMEOUT
+    try:
+        return float(timeout)
+    except ValueError:
+        logger.warning(
+            f"Invalid `JOURNAL_PROBE_TIMEOUT`: `{timeout}`. Using {PROBE_TIMEOUT} seconds."
+        )
+        return PROBE_TIMEOUT
+
+
+def probe_file(file: Path, timeout: Optional[float] = None) -> bool:
+    """
+    Check if a file exists, waiting for its file system up to a timeout. The check runs
+    in a separate thread, which is reused by the next probes of the same file while it
+    does not finish, so a hung mount does not pile up threads.
+
+    :param file: The file.
+    :param timeout: The seconds to wait. Default is the one of `get_probe_timeout`.
+    :return: `True` if the file exists, `False` if not or if the check timed out.
+    """
+    timeout = get_probe_timeout() if timeout is None else timeout
+    key = os.path.abspath(file)
+    with _probes_lock:
+        probe = _probes.get(key)
+        if probe is None:
+            probe = _probes[key] = {"done": threading.Event(), "exists": False}
+            threading.Thread(target=_run_probe, args=(key, probe), daemon=True).start()
+
+    if not probe["done"].wait(timeout):
+        logger.warning(f"The file system of `{file}` did not respond in {timeout} s.")
+        return False
+    return probe["exists"]
+
+
+def _run_probe(key: str, probe: dict) -> None:
+    """
+    Check if a file exists, for `probe_file`.
+
+    :param key: The absolute path of the file.
+    :param probe: The probe, to set its result.
+    """
+    try:
+        probe["exists"] = os.path.isfile(key)
+    finally:
+        with _probes_lock:
+            _probes.pop(key, None)
+        probe["done"].set()
+
+
+def read_last_entry(file: Path, end: Optional[int] = None) -> tuple:
+    """
+    Read the last line of a journal file and the number of its last entry.
+
+    :param file: The journal file.
+    :param end: If provided, read the lines before this byte offset instead of the end of
+        the file. It must be the start of a line.
+    :return: The last line, or `""` if there are no lines, and the last entry number, or
+        `0` if there are no entries.
+    """
+    last_line = ""
+    for line in stream_lines_reversed(file, end=end):
+        last_line = last_line or line
+        match = ENTRY_INDEX_REGEX.match(line)
+        if match:
+            return last_line, int(match.group(1))
+
+    return last_line, 0
+
+
+class Replica:
+    """
+    Local replica of a journal file, with the state of its sync with the journal file.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        journal_file: Path,
+        replica_file: Path,
+        lock_timeout: Optional[float] = None,
+        durability: Optional[str] = None,
+    ):
+        """
+        :param journal_file: The journal file.
+        :param replica_file: The local replica, usually in other file system.
+        :param lock_timeout: The seconds to wait for the locks over the files. Default is
+            the one of `get_lock_timeout`.
+        :param durability: The commit strategy of the replays (see the `durability`
+            module). Default is the one of `get_durability`.
+        """
+        self.journal_file = Path(journal_file)
+        self.replica_file = Path(replica_file)
+        self.state_file = self.replica_file.with_name(
+            f".{self.replica_file.name}.sync.json"
+        )
+        self.lock_timeout = lock_timeout
+        self.durability = get_durability(durability)
+
+    def is_seeded(self) -> bool:
+        """
+        Check if the replica has been copied from the journal file.
+
+        :return: `True` if the replica and its sync state exist.
+        """
+        return self.replica_file.is_file() and self.state_file.is_file()
+
+    def is_pending(self) -> bool:
+        """
+        Check if the replica has changes not replayed to the journal file yet.
+
+        :return: `True` if there are changes to replay.
+        """
+        return self.__load_state()["dirty_from"] is not None
+
+    def seed(self) -> None:
+        """
+        Copy the journal file to the replica, which must be reachable. The replica is
+        replaced, so its changes not replayed yet are lost.
+        """
+        self.replica_file.parent.mkdir(parents=True, exist_ok=True)
+        with (
+            JournalLock(self.journal_file, timeout=self.lock_timeout).shared,
+            JournalLock(self.replica_file, timeout=self.lock_timeout),
+        ):
+            self.__copy_journal()
+        logger.info(f"Journal file copied to the local replica `{self.replica_file}`.")
+
+    def mark_dirty(self, offset: int) -> None:
+        """
+        Register that the replica has been written from a byte offset. The caller must
+        hold the lock over the replica.
+
+        :param offset: The first byte written, which must be the start of a line.
+        """
+        state = self.__load_state()
+        for key in ("dirty_from", "next_dirty_from"):
+            if state[key] is None or offset < state[key]:
+                state[key] = offset
+        state["writes"] += 1
+        self.__save_state(state)
+
+    def sync(self, force: bool = False) -> bool:
+        """
+        Replay the changes of the replica to the journal file, and bring the changes of
+        the journal file made by others to the replica, if the journal file is reachable.
+        Only one sync runs at a time, so this one is skipped if other is running.
+
+        :param force: If `True`, try to sync even if the journal file was found
+            unreachable recently.
+        :return: `True` if the replica and the journal file are in sync.
+        """
+        if not force and time.time() < self.__load_state()["retry_at"]:
+            return False
+
+        if not probe_file(self.journal_file):
+            logger.warning(
+                f"Journal file in `{self.journal_file}` unreachable. The local replica "
+                f"will be synced when possible."
+            )
+            with JournalLock(self.replica_file, timeout=self.lock_timeout):
+                state = self.__load_state()
+                state["retry_at"] = time.time() + SYNC_RETRY_DELAY
+                self.__save_state(state)
+            return False
+
+        if Manifest.get_manifest_file(self.journal_file).exists():
+            logger.error("Segmented journals cannot be synced with a local replica.")
+            return False
+
+        sync_lock = JournalLock(self.state_file, timeout=0)
+        try:
+            sync_lock.acquire()
+        except LockTimeoutError:
+            return False  # Other sync is running
+        try:
+            return self.__sync()
+        finally:
+            sync_lock.release()
+
+    def __sync(self) -> bool:
+        """
+        Sync the replica and the journal file, holding the sync lock.
+
+        :return: `True` if the replica and the journal file are in sync.
+        """
+        replica_lock = JournalLock(self.replica_file, timeout=self.lock_timeout)
+
+        # Take the changes to replay, without blocking the replica writers after it
+        with replica_lock:
+            state = self.__load_state()
+            dirty_from = state["dirty_from"]
+            if dirty_from is not None:
+                with open(self.replica_file, "rb") as f:
+                    f.seek(dirty_from)
+                    data = f.read()
+                anchor = read_last_entry(self.replica_file, end=dirty_from)[0]
+                last_line, last_entry = read_last_entry(self.replica_file)
+                state["next_dirty_from"] = None  # Track the writes from now
+                self.__save_state(state)
+
+        with JournalLock(self.journal_file, timeout=self.lock_timeout):
+            stat = os.stat(self.journal_file)
+            unchanged = (stat.st_size, stat.st_mtime_ns) == (
+                state["journal_size"],
+                state["journal_mtime_ns"],
+            )
+            if dirty_from is None:
+                return unchanged or self.__pull(replica_lock)
+            if not unchanged and not self.__is_replaying(
+                dirty_from, anchor.encode(), data
+            ):
+                return self.__reconcile(replica_lock)
+
+            # Replay the modified end of the replica
+            fsync = self.durability != "fast"
+            if dirty_from == 0 or self.durability == "atomic":
+                prefix = read_prefix(self.journal_file, dirty_from)
+                replace_file(self.journal_file, chain(prefix, [data]), fsync=fsync)
+            else:
+                patch_file(self.journal_file, dirty_from, data, fsync=fsync)
+            stat = os.stat(self.journal_file)
+
+        with replica_lock:
+            writes = state["writes"]
+            state = self.__load_state()
+            # Keep pending the writes made to the replica during the replay
+            state["dirty_from"] = (
+                None if state["writes"] == writes else state["next_dirty_from"]
+            )
+            state.update(
+                journal_size=stat.st_size,
+                journal_mtime_ns=stat.st_mtime_ns,
+                last_line=last_line,
+                last_entry=last_entry,
+                retry_at=0,
+            )
+            self.__save_state(state)
+
+        logger.debug(f"Local replica `{self.replica_file}` replayed.")
+        return state["dirty_from"] is None
+
+    def __is_replaying(self, dirty_from: int, anchor: bytes, data: bytes) -> bool:
+        """
+        Check if the journal file has only been changed by an interrupted replay of the
+        changes of the replica: it keeps the replica lines before them, and after them it
+        has a part of them.
+
+        :param dirty_from: The first byte of the replica changes.
+        :param anchor: The replica line before its changes.
+        :param data: The replica changes.
+        :return: `True` if the journal file has a part of the replica changes.
+        """
+        size = os.path.getsize(self.journal_file)
+        if size < dirty_from or size - dirty_from > len(data):
+            return False
+        with open(self.journal_file, "rb") as f:
+            f.seek(dirty_from - len(anchor))
+            if f.read(len(anchor)) != anchor:
+                return False
+            return data.startswith(f.read())
+
+    def __pull(self, replica_lock: JournalLock) -> bool:
+        """
+        Bring the changes of the journal file made by others to the replica, which has no
+        changes to replay. The caller must hold the lock over the journal file.
+
+        :param replica_lock: The lock over the replica.
+        :return: `True` if the replica was updated.
+        """
+        with replica_lock:
+            state = self.__load_state()
+            if state["dirty_from"] is not None:
+                return False  # Written meanwhile, so this is for the next sync
+
+            # If the journal file has only grown, copy only its new lines
+            size = state["journal_size"]
+            anchor = state["last_line"].encode()
+            with open(self.journal_file, "rb") as f:
+                f.seek(max(size - len(anchor), 0))
+                grown = f.read(len(anchor)) == anchor and f.tell() == size
+                new_data = f.read() if grown else b""
+            if grown and new_data and os.path.getsize(self.replica_file) == size:
+                patch_file(self.replica_file, size, new_data, fsync=False)
+                self.__save_sync_state()
+            else:
+                self.__copy_journal()
+
+        logger.debug(f"Local replica `{self.replica_file}` updated.")
+        return True
+
+    def __reconcile(self, replica_lock: JournalLock) -> bool:
+        """
+        Merge the new entries of the replica into the journal file changed by others,
+        and copy the merged journal file to the replica. The caller must hold the lock
+        over the journal file.
+
+        :param replica_lock: The lock over the replica.
+        :return: `True` if the replica was merged.
+        """
+        try:
+            from .merge import merge_journals
+        except ImportError:  # pragma: no cover
+            from merge import merge_journals
+
+        # The replica writers wait until it is copied again, with the new numbering
+        with replica_lock:
+            state = self.__load_state()
+            with open(self.replica_file, "rb") as f:
+                f.seek(state["dirty_from"])
+                lines = f.read().decode(errors="replace").splitlines(keepends=True)
+
+            # The lines of the entries after the last synced one are new
+            new_lines, lost_lines = [], []
+            is_new = False
+            for line in lines:
+                match = ENTRY_INDEX_REGEX.match(line)
+                if match:
+                    is_new = int(match.group(1)) > state["last_entry"]
+                (new_lines if is_new else lost_lines).append(line)
+            anchor_entry = read_last_entry(self.replica_file, end=state["dirty_from"])[
+                1
+            ]
+            if lost_lines or anchor_entry < state["last_entry"] - len(lost_lines):
+                logger.warning(
+                    "The journal file has been changed by others, so the local changes "
+                    "to its entries synced before could not be replayed:\n"
+                    + "".join(f"  {line}" for line in lost_lines)
+                )
+
+            if new_lines:
+                pending_file = self.replica_file.with_name(
+                    f".{self.replica_file.name}.pending.md"
+                )
+                try:
+                    with open(pending_file, "w") as f:
+                        f.writelines(new_lines)
+                    n_entries = merge_journals(
+                        self.journal_file, pending_file, durability=self.durability
+                    )
+                finally:
+                    pending_file.unlink(missing_ok=True)
+                logger.info(
+                    f"Merged {n_entries} entries of the local replica into the journal "
+                    f"file, changed by others since the last sync."
+                )
+
+            self.__copy_journal()
+
+        return True
+
+    def __copy_journal(self) -> None:
+        """
+        Replace the replica with a copy of the journal file, and reset the sync state. The
+        caller must hold the locks over both files.
+        """
+        size = os.path.getsize(self.journal_file)
+        replace_file(
+            self.replica_file, read_prefix(self.journal_file, size), fsync=False
+        )
+        self.__save_sync_state()
+
+    def __save_sync_state(self) -> None:
+        """
+        Save the sync state of a replica equal to the journal file. The caller must hold
+        the locks over both files.
+        """
+        stat = os.stat(self.journal_file)
+        last_line, last_entry = read_last_entry(self.replica_file)
+        self.__save_state(
+            {
+                "version": self.VERSION,
+                "journal_size": stat.st_size,
+                "journal_mtime_ns": stat.st_mtime_ns,
+                "last_line": last_line,
+                "last_entry": last_entry,
+                "dirty_from": None,
+                "next_dirty_from": None,
+                "writes": 0,
+                "retry_at": 0,
+            }
+        )
+
+    def __load_state(self) -> dict:
+        """
+        Load the sync state.
+
+        :return: The sync state.
+        """
+        with open(self.state_file, "r") as f:
+            state = json.load(f)
+        if state["version"] != self.VERSION:
+            raise ValueError(f"Unknown sync state version in `{self.state_file}`.")
+
+        return state
+
+    def __save_state(self, state: dict) -> None:
+        """
+        Save the sync state, replacing it atomically.
+
+        :param state: The sync state.
+        """
+        temp_file = self.state_file.with_name(f"{self.state_file.name}.tmp")
+        with open(temp_file, "w") as f:
+            json.dump(state, f, indent=2)
+            f.write("\n")
+        os.replace(temp_file, self.state_file)
+
+
+def sync_in_background(replica: Replica, timeout: float = SYNC_EXIT_TIMEOUT) -> bool:
+    """
+    Sync a replica in a separate thread, waiting for it up to a timeout. If the sync does
+    not finish in time, it is left running, and the next sync completes it.
+
+    :param replica: The replica.
+    :param timeout: The seconds to wait.
+    :return: `True` if the replica was synced in time.
+    """
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(replica.sync()), name="jour-sync", daemon=True
+    )
+    thread.start()
+    thread.join(timeout)
+
+    return bool(result and result[0])
+
+
+class ReplicaSync:
+    """
+    Background thread that syncs a replica periodically, for long-running processes like
+    the Jour daemon. It can be used as a context manager.
+    """
+
+    def __init__(self, replica: Replica, interval: float = SYNC_INTERVAL):
+        """
+        :param replica: The replica.
+        :param interval: The seconds between the syncs.
+        """
+        self.replica = replica
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self) -> None:
+        """
+        Start the background thread.
+        """
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self.__run, name="jour-replica-sync", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = SYNC_EXIT_TIMEOUT) -> None:
+        """
+        Stop the background thread after a last sync.
+
+        :param timeout: The seconds to wait for the last sync.
+        """
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def trigger(self) -> None:
+        """
+        Sync now, without waiting for the interval.
+        """
+        self._wake.set()
+
+    def __run(self) -> None:
+        """
+        Background thread: sync the replica after each interval or trigger, until stopped.
+        """
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.replica.sync()
+            except Exception as e:
+                logger.error(f"Error syncing the local replica: {e}")
+            if self._stopping:
+                return
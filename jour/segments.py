@@ -0,0 +1,550 @@
+"""
+Segments
+========
+
+This module implements the segmented layout of the journal. The journal file is the
+active segment, where the new entries are written, and the older entries are moved to
+sealed segments next to it, per year or per number of entries. A small manifest, also
+next to the journal file, tracks the sealed segments with their entry and time ranges
+and their tag maximum indexes, so the operations over the active segment can continue
+the entry and tag numbering without reading the sealed ones.
+
+The sealed segments can be compressed, as archives of independently compressed blocks
+(see `archive`), which are decompressed on the fly by all the reads. The active segment
+is never compressed.
+
+The layout is optional: a journal without manifest is a single file journal.
+"""
+
+import json
+import logging
+import os
+import shutil
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+try:
+    from .archive import COMPRESSIONS, ArchiveTagIndex, BlockIndex, get_compression
+    from .entry_index import EntryIndex
+    from .streaming import stream_lines, stream_lines_reversed
+    from .tag_index import ENTRY_INDEX_REGEX, TagIndex, scan_tags
+    from .time_index import TimeIndex, parse_line_header
+except ImportError:  # pragma: no cover
+    from archive import COMPRESSIONS, ArchiveTagIndex, BlockIndex, get_compression
+    from entry_index import EntryIndex
+    from streaming import stream_lines, stream_lines_reversed
+    from tag_index import ENTRY_INDEX_REGEX, TagIndex, scan_tags
+    from time_index import TimeIndex, parse_line_header
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+
+def parse_rotation(text: str) -> Union[str, int]:
+    """
+    Parse a segment rotation: `year`, to seal the entries of each year, or a number of
+    entries per segment.
+
+    :param text: The rotation.
+    :return: `"year"` or the number of entries per segment.
+    """
+    if text == "year":
+        return text
+    try:
+        entries_per_segment = int(text)
+    except ValueError:
+        raise ValueError(f"Invalid segment rotation: `{text}`")
+    if entries_per_segment < 1:
+        raise ValueError(f"Invalid segment rotation: `{text}`")
+
+    return entries_per_segment
+
+
+class Segment:
+    """
+    Sealed segment of the journal. Its content never changes, so its indexes are built
+    once and kept in their sidecar files. If it is compressed, its reads go through the
+    block index of the archive.
+    """
+
+    def __init__(self, directory: Path, info: dict):
+        """
+        Initialize a sealed segment.
+
+        :param directory: The directory of the journal.
+        :param info: The segment information of the manifest.
+        """
+        self.file = directory / info["file"]
+        self.info = info
+        self.compression = get_compression(self.file)
+
+    @property
+    def first_entry(self) -> int:
+        return self.info["first_entry"]
+
+    @property
+    def last_entry(self) -> int:
+        return self.info["last_entry"]
+
+    def iter_lines(self) -> Iterator[str]:
+        """
+        Stream the lines of the segment.
+
+        :return: An iterator of the lines, with their line breaks.
+        """
+        if self.compression:
+            return self.block_index().iter_lines()
+        return stream_lines(self.file)
+
+    def iter_lines_reversed(self) -> Iterator[str]:
+        """
+        Stream the lines of the segment, from the last one.
+
+        :return: An iterator of the lines, with their line breaks.
+        """
+        if self.compression:
+            return self.block_index().iter_lines_reversed()
+        return stream_lines_reversed(self.file)
+
+    def last_lines(self, n_lines: int) -> list:
+        """
+        Get the last lines of the segment.
+
+        :param n_lines: The number of lines to get.
+        :return: The last lines.
+        """
+        return list(islice(self.iter_lines_reversed(), n_lines))[::-1]
+
+    def read_entries(self, first: int, last: int, persistent: bool = True) -> list:
+        """
+        Get the lines of a range of entries of the segment, seeking straight to them.
+
+        :param first: The number of the first entry.
+        :param last: The number of the last entry, included.
+        :param persistent: If `True`, keep the entry index in its sidecar file.
+        :return: The lines of the entries in the range.
+        """
+        if self.compression:
+            return self.block_index(persistent).read_entries(first, last)
+
+        entry_index = EntryIndex(self.file, persistent=persistent).refresh()
+        lines = entry_index.read_entries(first, last)
+        if lines is None:
+            lines = []
+            for line in self.iter_lines():
+                match = ENTRY_INDEX_REGEX.match(line)
+                if match and first <= int(match.group(1)) <= last:
+                    lines.append(line)
+
+        return lines
+
+    def find(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        signature: Optional[str] = None,
+        persistent: bool = True,
+    ) -> list:
+        """
+        Find the lines of the segment that match a query, like `TimeIndex.find`.
+
+        :param persistent: If `True`, keep the time index in its sidecar file.
+        :return: The matching lines, in chronological order.
+        """
+        if (since and self.info["last_timestamp"] < since) or (
+            until and self.info["first_timestamp"] > until
+        ):
+            return []  # Out of the time range
+        if signature and signature not in self.info.get("signatures", [signature]):
+            return []
+
+        if self.compression:
+            return self.block_index(persistent).find(since, until, signature)
+
+        time_index = TimeIndex(self.file, persistent=persistent).refresh()
+        return time_index.find(since, until, signature)
+
+    def tag_index(self, persistent: bool = True) -> TagIndex:
+        """
+        Get the tag index of the segment.
+
+        :param persistent: If `True`, keep the tag index in its sidecar file.
+        :return: The tag index.
+        """
+        if self.compression:
+            block_index = self.block_index(persistent)
+            return ArchiveTagIndex(self.file, block_index, persistent).refresh()
+        return TagIndex(self.file, persistent=persistent).refresh()
+
+    def block_index(self, persistent: bool = True) -> BlockIndex:
+        """
+        Get the block index of the segment, which must be compressed.
+
+        :param persistent: If `True`, keep the block index in its sidecar file.
+        :return: The block index.
+        """
+        return BlockIndex(self.file, persistent=persistent).refresh()
+
+    def compress(self, compression: str) -> "Segment":
+        """
+        Compress the segment in an archive next to it, like `journal.2024.md.gz`. The
+        segment file and its sidecar files are kept, to be removed by the caller once the
+        manifest points to the archive.
+
+        :param compression: The compression: `gzip` or `lzma`.
+        :return: The compressed segment.
+        """
+        archive_file = self.file.with_name(
+            f"{self.file.name}{COMPRESSIONS[compression]}"
+        )
+        BlockIndex(archive_file).write(stream_lines(self.file))
+
+        return Segment(self.file.parent, dict(self.info, file=archive_file.name))
+
+    def remove(self) -> None:
+        """
+        Remove the segment file and its sidecar files.
+        """
+        for suffix in ("tags.json", "entries.idx", "times.json", "blocks.json"):
+            self.file.with_name(f".{self.file.name}.{suffix}").unlink(missing_ok=True)
+        self.file.unlink(missing_ok=True)
+
+
+class Manifest:
+    """
+    Manifest of a segmented journal. It stores the rotation, the compression and the
+    information of the sealed segments, sorted by their entries, in a JSON file next to
+    the journal file.
+    """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        journal_file: Path,
+        rotation: Union[str, int] = "year",
+        compression: Optional[str] = None,
+    ):
+        """
+        Initialize the manifest of a journal file. Use `load` to read an existing one.
+
+        :param journal_file: The journal file, which is the active segment.
+        :param rotation: When to seal the entries: `"year"` or a number of entries.
+        :param compression: If provided, compress the sealed segments: `gzip` or `lzma`.
+        """
+        if compression is not None and compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: `{compression}`")
+        self.journal_file = Path(journal_file)
+        self.manifest_file = self.get_manifest_file(self.journal_file)
+        self.rotation = rotation
+        self.compression = compression
+        self.segments_info: list = []
+
+    @staticmethod
+    def get_manifest_file(journal_file: Path) -> Path:
+        """
+        Get the manifest location of a journal file.
+
+        :param journal_file: The journal file.
+        :return: The manifest file, like `journal.segments.json` for `journal.md`.
+        """
+        return journal_file.with_name(f"{journal_file.stem}.segments.json")
+
+    @classmethod
+    def load(cls, journal_file: Path) -> Optional["Manifest"]:
+        """
+        Load the manifest of a journal file, if it is segmented.
+
+        :param journal_file: The journal file.
+        :return: The manifest, or `None` if the journal is a single file.
+        """
+        manifest_file = cls.get_manifest_file(Path(journal_file))
+        if not os.path.isfile(manifest_file):
+            return None
+
+        with open(manifest_file, "r") as f:
+            data = json.load(f)
+        if data["version"] != cls.VERSION:
+            raise ValueError(f"Unknown manifest version in `{manifest_file}`.")
+
+        manifest = cls(journal_file, data["rotation"], data.get("compression"))
+        manifest.segments_info = data["segments"]
+        return manifest
+
+    def save(self) -> None:
+        """
+        Save the manifest, replacing it atomically.
+        """
+        data = {
+            "version": self.VERSION,
+            "rotation": self.rotation,
+            "compression": self.compression,
+            "segments": self.segments_info,
+        }
+        temp_file = self.manifest_file.with_name(f"{self.manifest_file.name}.tmp")
+        with open(temp_file, "w") as f:
+            json.dump(data, f, indent=2)
+            f.write("\n")
+        os.replace(temp_file, self.manifest_file)
+
+    @property
+    def segments(self) -> list:
+        """
+        The sealed segments, from the oldest to the newest one.
+        """
+        directory = self.journal_file.parent
+        return [Segment(directory, info) for info in self.segments_info]
+
+    @property
+    def last_entry(self) -> int:
+        """
+        The number of the last sealed entry, or `0` if there are no sealed segments.
+        """
+        return self.segments_info[-1]["last_entry"] if self.segments_info else 0
+
+    def tag_maxima(self) -> dict:
+        """
+        Get the maximum index of each tag used in the sealed segments.
+
+        :return: The map of tag names to their maximum index.
+        """
+        tag_maxima = {}
+        for info in self.segments_info:
+            for tag_name, index in info["tag_maxima"].items():
+                if index > tag_maxima.get(tag_name, 0):
+                    tag_maxima[tag_name] = index
+
+        return tag_maxima
+
+    def segments_for_entries(self, first: int, last: int) -> list:
+        """
+        Get the sealed segments with entries in a range.
+
+        :param first: The number of the first entry.
+        :param last: The number of the last entry, included.
+        :return: The segments.
+        """
+        return [
+            segment
+            for segment in self.segments
+            if segment.first_entry <= last and first <= segment.last_entry
+        ]
+
+    def compress_segments(self) -> int:
+        """
+        Compress the sealed segments that are not compressed yet, with the compression of
+        the manifest. Each archive is written before updating the manifest, and the
+        segment files are removed after. The caller must hold the lock over the journal
+        file.
+
+        :return: The number of compressed segments.
+        """
+        if not self.compression:
+            return 0
+
+        compressed = []
+        for position, segment in enumerate(self.segments):
+            if segment.compression:
+                continue
+            archive = segment.compress(self.compression)
+            self.segments_info[position] = archive.info
+            compressed.append(segment)
+        if compressed:
+            self.save()
+        for segment in compressed:
+            segment.remove()
+            logger.info(f"Compressed `{segment.file.name}`.")
+
+        return len(compressed)
+
+    def rotate(self) -> bool:
+        """
+        Seal the entries of the active segment that belong to a previous year, or to a
+        previous group of entries, moving them to new sealed segments. The last entry
+        always stays in the active segment. The caller must hold the lock over the
+        journal file.
+
+        :return: `True` if some entries were sealed.
+        """
+        head = next(stream_lines(self.journal_file), None)
+        tail = next(stream_lines_reversed(self.journal_file), None)
+        if head is None or tail is None:
+            return False
+
+        # Complete an interrupted rotation: drop the entries already sealed
+        if self.__entry(head) is not None and self.__entry(head) <= self.last_entry:
+            logger.warning("Completing an interrupted rotation of the journal...")
+        elif self.__key(head) is None or self.__key(head) >= (self.__key(tail) or 0):
+            return False
+
+        last_key = self.__key(tail)
+        groups = []  # Sealed groups, as `(key, temp_file, info)`
+        active_lines = []
+        key, entry = None, None
+        f = None
+        try:
+            for line in stream_lines(self.journal_file):
+                entry = self.__entry(line) or entry
+                if entry is not None and entry <= self.last_entry:
+                    continue  # Already sealed
+                line_key = self.__key(line)
+                key = line_key if line_key is not None else key
+                if key is None or last_key is None or key >= last_key or active_lines:
+                    active_lines.append(line)
+                    continue
+                if not groups or groups[-1][0] != key:
+                    if f:
+                        self.__close_synced(f)
+                    temp_file = self.journal_file.with_name(
+                        f".{self.journal_file.name}.segment{len(groups)}.tmp"
+                    )
+                    groups.append((key, temp_file, self.__new_info()))
+                    f = open(temp_file, "w")
+                f.write(line)
+                self.__update_info(groups[-1][2], line, entry)
+            if f:
+                self.__close_synced(f)
+
+            # Move the sealed segments to their place before updating the manifest
+            for key, temp_file, info in groups:
+                segment_file = self.__get_segment_file(key, info)
+                if self.compression:
+                    BlockIndex(segment_file).write(stream_lines(temp_file))
+                else:
+                    os.replace(temp_file, segment_file)
+                info["file"] = segment_file.name
+                self.segments_info.append(info)
+            self.save()
+
+            # Then rewrite the active segment without the sealed entries
+            temp_file = self.journal_file.with_name(f".{self.journal_file.name}.tmp")
+            groups.append((None, temp_file, None))  # To remove it if failed
+            with open(temp_file, "w") as f:
+                f.writelines(active_lines)
+                f.flush()
+                os.fsync(f.fileno())
+            shutil.copymode(self.journal_file, temp_file)
+            os.replace(temp_file, self.journal_file)
+        finally:
+            if f:
+                f.close()
+            for _, temp_file, _ in groups:
+                temp_file.unlink(missing_ok=True)
+
+        for _, _, info in groups[:-1]:
+            logger.info(
+                f"Sealed entries {info['first_entry']} to {info['last_entry']} in "
+                f"`{info['file']}`."
+            )
+
+        return True
+
+    def __key(self, line: str) -> Optional[Union[int, str]]:
+        """
+        Get the rotation key of a journal line: its year, or its group of entries.
+
+        :param line: The journal line.
+        :return: The key, or `None` if the line has not the needed timestamp or index.
+        """
+        if self.rotation == "year":
+            header = parse_line_header(line.encode())
+            return int(header[0][:4]) if header else None
+
+        entry = self.__entry(line)
+        return (entry - 1) // self.rotation if entry is not None else None
+
+    @staticmethod
+    def __entry(line: str) -> Optional[int]:
+        """
+        Get the entry number of a journal line.
+
+        :param line: The journal line.
+        :return: The entry number, or `None` if the line is not numbered.
+        """
+        match = ENTRY_INDEX_REGEX.match(line)
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def __close_synced(f) -> None:
+        """
+        Close a file after writing its content to the disk.
+
+        :param f: The file, opened for writing.
+        """
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+
+    @staticmethod
+    def __new_info() -> dict:
+        """
+        Get the information of a new sealed segment, to fill with its lines.
+
+        :return: The segment information.
+        """
+        return {
+            "file": None,
+            "first_entry": None,
+            "last_entry": None,
+            "first_timestamp": None,
+            "last_timestamp": None,
+            "signatures": [],
+            "tag_maxima": {},
+        }
+
+    @staticmethod
+    def __update_info(info: dict, line: str, entry: Optional[int]) -> None:
+        """
+        Update the information of a sealed segment with one of its lines.
+
+        :param info: The segment information.
+        :param line: The line.
+        :param entry: The entry number of the line.
+        """
+        if info["first_entry"] is None:
+            info["first_entry"] = entry
+        info["last_entry"] = entry
+        header = parse_line_header(line.encode())
+        if header:
+            timestamp, signature = header
+            if info["first_timestamp"] is None or timestamp < info["first_timestamp"]:
+                info["first_timestamp"] = timestamp
+            if info["last_timestamp"] is None or timestamp > info["last_timestamp"]:
+                info["last_timestamp"] = timestamp
+            if signature not in info["signatures"]:
+                info["signatures"].append(signature)
+        scan_tags(line, info["tag_maxima"])
+
+    def __get_segment_file(self, key: Union[int, str], info: dict) -> Path:
+        """
+        Get a free location for a sealed segment, named after its year or entries, with
+        the suffix of its compression, if any.
+
+        :param key: The rotation key of the segment.
+        :param info: The segment information.
+        :return: The segment file.
+        """
+        if self.rotation == "year":
+            name = f"{key}"
+        else:
+            name = f"{info['first_entry']}-{info['last_entry']}"
+
+        journal_file = self.journal_file
+        suffix = journal_file.suffix
+        if self.compression:
+            suffix += COMPRESSIONS[self.compression]
+        segment_file = journal_file.with_name(f"{journal_file.stem}.{name}{suffix}")
+        copy = 1
+        while segment_file.exists():
+            copy += 1
+            segment_file = journal_file.with_name(
+                f"{journal_file.stem}.{name}-{copy}{suffix}"
+            )
+
+        return segment_file
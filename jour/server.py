@@ -0,0 +1,297 @@
+"""
+Server
+======
+
+This module implements the Jour daemon, a long-running process that owns a journal and
+serves the `jour` command line calls through a Unix domain socket, and its client.
+
+The daemon keeps the journal state in memory (its end, the next index and the tag
+table), so each call only appends or patches the end of the journal file. The protocol
+is line based: each request is a JSON object with the operation name and its arguments,
+and each response is a JSON object with the result or the error.
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+from typing import Optional
+
+try:
+    from .durability import get_durability
+    from .jour import Jour
+except ImportError:  # pragma: no cover
+    from durability import get_durability
+
+    from jour import Jour
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Operations of `Jour` that the daemon serves
+OPERATIONS = {
+    "write_line",
+    "write_lines",
+    "append_to_last_line",
+    "tag_last_line",
+    "get_next_tag",
+    "remove_last_line",
+    "last_lines",
+    "get_entries",
+    "find_entries",
+}
+
+# Seconds to wait for the daemon responses
+CLIENT_TIMEOUT = 10
+
+
+class DaemonUnavailableError(ConnectionError):
+    """
+    Error raised by the client when the daemon does not serve its journal.
+    """
+
+
+def get_journal_settings(jour: Optional[Jour] = None) -> dict:
+    """
+    Get the settings that a `Jour` uses, to check that the daemon serves the journal of
+    the clients like they would use it themselves: the real paths of the journal file
+    and of the local replica, if any, and the durability mode.
+
+    :param jour: The `Jour`. If not provided, the settings of a new `Jour`, from the
+        environment variables.
+    :return: The settings, with the keys `journal`, `replica` and `durability`.
+    """
+    if jour is not None:
+        journal_file = jour.journal_file
+        replica_file = jour.replica.replica_file if jour.replica else None
+        durability = jour.durability
+    else:
+        journal_file = os.getenv("JOURNAL") or Path().home() / "journal.md"
+        replica_file = os.getenv("JOURNAL_REPLICA")
+        replica_file = replica_file and Path(replica_file).expanduser()
+        try:
+            durability = get_durability()
+        except ValueError:
+            durability = os.getenv("JOURNAL_DURABILITY")  # Reported by `Jour`
+
+    return {
+        "journal": os.path.realpath(journal_file),
+        "replica": replica_file and os.path.realpath(replica_file),
+        "durability": durability,
+    }
+
+
+def get_socket_path() -> Path:
+    """
+    Get the daemon socket location, from the `JOURNAL_SOCKET` environment variable or,
+    by default, `~/.jour.sock`.
+
+    :return: The socket path.
+    """
+    socket_path = os.getenv("JOURNAL_SOCKET")
+    if socket_path:
+        return Path(socket_path)
+    return Path().home() / ".jour.sock"
+
+
+class JourRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handler of the connections to the daemon. Each connection can send many requests,
+    one per line.
+    """
+
+    def handle(self):
+        for request_line in self.rfile:
+            try:
+                request = json.loads(request_line)
+                response = self.server.jour_server.handle_request(request)
+            except Exception as e:
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class JourUnixServer(socketserver.ThreadingUnixStreamServer):
+    """
+    Unix socket server of the daemon, with a thread per connection.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128  # Allow many clients connecting at once
+
+
+class JourServer:
+    """
+    Jour daemon. It keeps a `Jour` context open over the journal, running the requested
+    operations one at a time and flushing their changes to the journal file before
+    responding. If the journal file is changed by other process, the context is opened
+    again to discard the outdated state.
+    """
+
+    def __init__(self, socket_path: Optional[Path] = None, jour: Optional[Jour] = None):
+        """
+        Initialize the daemon.
+
+        :param socket_path: The socket location. Default is `get_socket_path()`.
+        :param jour: The `Jour` to serve. Default is a new `Jour` over the journal.
+        """
+        self.socket_path = Path(socket_path or get_socket_path())
+        self.jour = jour or Jour()
+        self.journal_settings = get_journal_settings(self.jour)
+
+        self._lock = threading.Lock()
+        self._journal_stat = None
+        self._server: Optional[JourUnixServer] = None
+
+    def serve_forever(self) -> None:
+        """
+        Serve the requests until `shutdown` is called or the process is interrupted.
+        """
+        self.__prepare_socket()
+
+        self._server = JourUnixServer(str(self.socket_path), JourRequestHandler)
+        self._server.jour_server = self
+
+        logger.info(f"Serving the journal in `{self.socket_path}`...")
+        try:
+            with self.jour:
+                self._journal_stat = self.__stat_journal()
+                self._server.serve_forever()
+        except KeyboardInterrupt:  # pragma: no cover
+            pass
+        finally:
+            self._server.server_close()
+            self.socket_path.unlink(missing_ok=True)
+            logger.info("Daemon stopped.")
+
+    def shutdown(self) -> None:
+        """
+        Stop serving requests. It must be called from other thread than `serve_forever`.
+        """
+        if self._server:
+            self._server.shutdown()
+
+    def handle_request(self, request: dict) -> dict:
+        """
+        Run a requested operation over the journal.
+
+        :param request: The request, with the keys `op` (the operation name), `args` (its
+            arguments) and `settings` (the journal settings of the client, see
+            `get_journal_settings`).
+        :return: The response, with the key `ok` and the key `result` or `error`.
+        """
+        if request.get("settings") != self.journal_settings:
+            return {"ok": False, "error": "Journal mismatch.", "mismatch": True}
+
+        operation = request.get("op")
+        if operation not in OPERATIONS:
+            return {"ok": False, "error": f"Unknown operation `{operation}`."}
+
+        with self._lock:
+            # Discard the state if other process changed the journal file
+            if self.__stat_journal() != self._journal_stat:
+                self.jour.__exit__(None, None, None)
+                self.jour.__enter__()
+
+            try:
+                result = getattr(self.jour, operation)(**request.get("args", {}))
+            finally:
+                self.jour.flush()
+                self._journal_stat = self.__stat_journal()
+
+        return {"ok": True, "result": result}
+
+    def __stat_journal(self) -> tuple:
+        """
+        Get the size and modification time of the journal file, to detect changes.
+
+        :return: The size and modification time.
+        """
+        stat = os.stat(self.jour._active_journal_file)
+        return stat.st_size, stat.st_mtime_ns
+
+    def __prepare_socket(self) -> None:
+        """
+        Remove the socket file of a previous daemon, if it is not running anymore.
+        """
+        if not os.path.exists(self.socket_path):
+            return
+
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(str(self.socket_path))
+        except OSError:
+            self.socket_path.unlink()  # Not running
+        else:
+            raise RuntimeError(f"Jour daemon already running in `{self.socket_path}`.")
+
+
+class JourClient:
+    """
+    Client of the Jour daemon. It raises `OSError` if the daemon is not reachable, and
+    `DaemonUnavailableError` if it serves other journal, so the caller can fall back to
+    use `Jour` directly.
+    """
+
+    def __init__(self, socket_path: Optional[Path] = None):
+        """
+        Initialize the client and connect to the daemon.
+
+        :param socket_path: The daemon socket location. Default is `get_socket_path()`.
+        """
+        self.socket_path = Path(socket_path or get_socket_path())
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(str(self.socket_path))
+        except OSError:
+            self._socket.close()
+            raise
+        self._socket.settimeout(CLIENT_TIMEOUT)
+        self._file = self._socket.makefile("rwb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Close the connection to the daemon.
+        """
+        self._file.close()
+        self._socket.close()
+
+    def request(self, operation: str, **args):
+        """
+        Request an operation over the journal to the daemon.
+
+        :param operation: The operation name, a `Jour` method.
+        :param args: The operation arguments.
+        :return: The operation result.
+        """
+        request = {
+            "op": operation,
+            "args": args,
+            "settings": get_journal_settings(),
+        }
+        self._file.write(json.dumps(request).encode() + b"\n")
+        self._file.flush()
+
+        response_line = self._file.readline()
+        if not response_line:
+            raise ConnectionError("Jour daemon closed the connection.")
+        response = json.loads(response_line)
+        if response.get("mismatch"):
+            raise DaemonUnavailableError("Jour daemon serves other journal.")
+        if not response["ok"]:
+            raise RuntimeError(response["error"])
+
+        return response["result"]
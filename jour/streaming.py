@@ -0,0 +1,81 @@
+"""
+Streaming
+=========
+
+This module implements the reading of a journal file in fixed-size chunks, forwards or
+backwards from a byte offset, so the operations that only need some lines, like the last
+ones, do not load the journal file in memory.
+"""
+
+import os
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Size of the chunks read when streaming the journal file
+STREAM_BLOCK_SIZE = 65536
+
+
+def stream_lines(journal_file: Path, end: Optional[int] = None) -> Iterator[str]:
+    """
+    Read the lines of a journal file in chunks, so the memory used does not depend on its
+    size.
+
+    :param journal_file: The journal file.
+    :param end: If provided, stop reading at this byte offset of the journal file. It must
+        be the start of a line.
+    :return: An iterator of the lines, with their line breaks.
+    """
+    with open(journal_file, "rb") as f:
+        remaining = end
+        rest = b""
+        while remaining is None or remaining > 0:
+            block_size = STREAM_BLOCK_SIZE
+            if remaining is not None:
+                block_size = min(block_size, remaining)
+                remaining -= block_size
+            data = f.read(block_size)
+            if not data:
+                break
+            lines = (rest + data).split(b"\n")
+            rest = lines.pop()  # Not ended line, completed by the next chunk
+            for line in lines:
+                yield (line + b"\n").decode(errors="replace")
+        if rest:
+            yield rest.decode(errors="replace")
+
+
+def stream_lines_reversed(
+    journal_file: Path, end: Optional[int] = None
+) -> Iterator[str]:
+    """
+    Read the lines of a journal file in chunks, from its end to its start, so getting the
+    last lines does not read the rest.
+
+    :param journal_file: The journal file.
+    :param end: If provided, read the lines before this byte offset instead of the end of
+        the file. It must be the start of a line.
+    :return: An iterator of the lines, with their line breaks, from the last one.
+    """
+    with open(journal_file, "rb") as f:
+        position = f.seek(0, os.SEEK_END) if end is None else end
+        rest = b""  # End of a line that starts in a previous chunk
+        while position > 0:
+            block_size = min(STREAM_BLOCK_SIZE, position)
+            position -= block_size
+            f.seek(position)
+            data = f.read(block_size) + rest
+            if position > 0:
+                # The first line could be not complete, so keep it for the next chunk
+                cut = data.find(b"\n") + 1
+                if not cut:
+                    rest = data
+                    continue
+                rest, data = data[:cut], data[cut:]
+
+            lines = [line + b"\n" for line in data.split(b"\n")]
+            # Last split part is not ended by a line break
+            lines[-1] = lines[-1][:-1]
+            if not lines[-1]:
+                lines.pop()
+            for line in reversed(lines):
+                yield line.decode(errors="replace")
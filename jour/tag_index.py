@@ -0,0 +1,290 @@
+"""
+Tag index
+=========
+
+This module implements the index of the tags of the journal, kept in a sidecar file next
+to the journal file and updated incrementally, so the next index of a tag is computed
+without scanning all the journal.
+"""
+
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Optional
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Regex to match a journal tag, like `#BUP12`, capturing its name and its index. The name
+# must not start with a digit and the tag must end where the index ends, so `#BUP1` does
+# not match inside `#BUP10` or `#XBUP1`
+TAG_REGEX = re.compile(r"(?<![\w#])#([^\W\d][\w-]*?)(\d+)(?![\w-])")
+
+# Regex to match the index of a journal line: `N. ...`
+ENTRY_INDEX_REGEX = re.compile(r"^(\d+)\. ")
+
+
+def scan_tags(text: str, tag_maxima: Optional[dict] = None) -> dict:
+    """
+    Scan a text in one pass, getting the maximum index of each tag used in it.
+
+    :param text: The text to scan, like some joined journal lines.
+    :param tag_maxima: If provided, update this map of tag names to their maximum
+        index instead of a new one.
+    :return: The map of tag names to their maximum index.
+    """
+    if tag_maxima is None:
+        tag_maxima = {}
+    for tag_name, index in TAG_REGEX.findall(text):
+        index = int(index)
+        if index > tag_maxima.get(tag_name, 0):
+            tag_maxima[tag_name] = index
+
+    return tag_maxima
+
+
+class TagIndex:
+    """
+    Index of the tags of a journal file. For each tag name it stores its maximum index
+    and its occurrences, as `[entry, offset, index]` lists with the entry number (or
+    `None` if the line is not numbered), the byte offset of the line in the journal file
+    and the tag index.
+
+    The index is persisted in a sidecar file next to the journal, and checked against the
+    size and modification time of the journal file when refreshed. If the journal file
+    has changed, only the lines from the last indexed line onwards are scanned again,
+    unless the previous content of the file has changed too, in which case the index is
+    rebuilt.
+    """
+
+    VERSION = 1
+
+    def __init__(self, journal_file: Path, persistent: bool = True):
+        """
+        Initialize the tag index of a journal file. Call `refresh` to load it.
+
+        :param journal_file: The journal file to index.
+        :param persistent: If `True`, load and save the index from its sidecar file. If
+            `False`, build it only in memory.
+        """
+        self.journal_file = Path(journal_file)
+        self.index_file = self.journal_file.with_name(
+            f".{self.journal_file.name}.tags.json"
+        )
+        self.persistent = persistent
+        self._loaded = False
+
+        self.tags: dict = {}
+        self._journal_size = 0
+        self._journal_mtime_ns = 0
+        self._scanned_offset = 0  # Start of the last indexed line, scanned again
+        self._anchor = ""  # Line before `_scanned_offset`, to check it has not changed
+
+    def refresh(self) -> "TagIndex":
+        """
+        Bring the index up to date with the journal file, scanning only its new part when
+        possible, and save it if persistent.
+
+        :return: The index itself.
+        """
+        if self.persistent and not self._loaded:
+            self.__load()
+            self._loaded = True
+
+        stat = os.stat(self.journal_file)
+        if (
+            stat.st_size == self._journal_size
+            and stat.st_mtime_ns == self._journal_mtime_ns
+        ):
+            return self  # Up to date
+
+        with self._open() as f:
+            if not self.__check_anchor(f, stat.st_size):
+                logger.debug(f"Rebuilding tag index of `{self.journal_file}`...")
+                self.tags = {}
+                self._scanned_offset = 0
+                self._anchor = ""
+            self.__drop_occurrences_from(self._scanned_offset)
+            self.__scan(f)
+
+        self._journal_size = stat.st_size
+        self._journal_mtime_ns = stat.st_mtime_ns
+
+        if self.persistent:
+            self.__save()
+
+        return self
+
+    def _open(self):
+        """
+        Open the journal file to scan it.
+
+        :return: The journal file, opened in binary mode.
+        """
+        return open(self.journal_file, "rb")
+
+    def max_index(self, tag_name: str, before_offset: Optional[int] = None) -> int:
+        """
+        Get the maximum index of a tag in the journal.
+
+        :param tag_name: The tag name.
+        :param before_offset: If provided, only consider the occurrences in lines that
+            start before this byte offset of the journal file.
+        :return: The maximum index of the tag, or `0` if never used.
+        """
+        tag = self.tags.get(tag_name)
+        if not tag:
+            return 0
+        if before_offset is None or tag["occurrences"][-1][1] < before_offset:
+            return tag["max_index"]
+        return max(
+            (
+                index
+                for _, offset, index in tag["occurrences"]
+                if offset < before_offset
+            ),
+            default=0,
+        )
+
+    def maxima(self, before_offset: Optional[int] = None) -> dict:
+        """
+        Get the maximum index of each tag in the journal.
+
+        :param before_offset: If provided, only consider the occurrences in lines that
+            start before this byte offset of the journal file.
+        :return: The map of tag names to their maximum index.
+        """
+        tag_maxima = {}
+        for tag_name in self.tags:
+            index = self.max_index(tag_name, before_offset)
+            if index:
+                tag_maxima[tag_name] = index
+
+        return tag_maxima
+
+    def read_line(self, offset: int) -> str:
+        """
+        Read the line of the journal file that starts at a byte offset.
+
+        :param offset: The byte offset of the line.
+        :return: The line, with its line break.
+        """
+        with open(self.journal_file, "rb") as f:
+            f.seek(offset)
+            return f.readline().decode(errors="replace")
+
+    def __check_anchor(self, f, size: int) -> bool:
+        """
+        Check that the journal file has not changed before the last indexed line, so the
+        index can be updated scanning only from that line.
+
+        :param f: The journal file, opened in binary mode.
+        :param size: The current size of the journal file.
+        :return: `True` if the previous content is unchanged.
+        """
+        anchor = self._anchor.encode()
+        if size < self._scanned_offset or self._scanned_offset < len(anchor):
+            return False
+        f.seek(self._scanned_offset - len(anchor))
+        return f.read(len(anchor)) == anchor
+
+    def __drop_occurrences_from(self, offset: int) -> None:
+        """
+        Remove from the index the occurrences in lines starting at or after a byte offset.
+
+        :param offset: The byte offset.
+        """
+        for tag_name in list(self.tags):
+            tag = self.tags[tag_name]
+            occurrences = tag["occurrences"]
+            if occurrences[-1][1] < offset:
+                continue
+            occurrences = [o for o in occurrences if o[1] < offset]
+            if occurrences:
+                tag["occurrences"] = occurrences
+                tag["max_index"] = max(o[2] for o in occurrences)
+            else:
+                del self.tags[tag_name]
+
+    def __scan(self, f) -> None:
+        """
+        Scan the journal file from the last indexed line, adding the found tags.
+
+        :param f: The journal file, opened in binary mode.
+        """
+        f.seek(self._scanned_offset)
+        offset = self._scanned_offset
+        last_line = b""
+        for line in f:
+            if last_line:
+                self._anchor = last_line.decode(errors="replace")
+                self._scanned_offset = offset
+            if b"#" in line:
+                self.__index_line(line.decode(errors="replace"), offset)
+            last_line = line
+            offset += len(line)
+
+    def __index_line(self, line: str, offset: int) -> None:
+        """
+        Add the tags of a journal line to the index.
+
+        :param line: The journal line.
+        :param offset: The byte offset of the line in the journal file.
+        """
+        entry_match = ENTRY_INDEX_REGEX.match(line)
+        entry = int(entry_match.group(1)) if entry_match else None
+        for match in TAG_REGEX.finditer(line):
+            tag_name, index = match.group(1), int(match.group(2))
+            tag = self.tags.setdefault(tag_name, {"max_index": 0, "occurrences": []})
+            tag["max_index"] = max(tag["max_index"], index)
+            tag["occurrences"].append([entry, offset, index])
+
+    def __load(self) -> None:
+        """
+        Load the index from its sidecar file, if it exists and is valid.
+        """
+        try:
+            with open(self.index_file, "r") as f:
+                data = json.load(f)
+            if data["version"] != self.VERSION:
+                return  # Old index, rebuild it
+            tags = dict(data["tags"])
+            journal_size = int(data["journal_size"])
+            journal_mtime_ns = int(data["journal_mtime_ns"])
+            scanned_offset = int(data["scanned_offset"])
+            anchor = str(data["anchor"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return  # Missing or corrupt index, rebuild it
+
+        self.tags = tags
+        self._journal_size = journal_size
+        self._journal_mtime_ns = journal_mtime_ns
+        self._scanned_offset = scanned_offset
+        self._anchor = anchor
+
+    def __save(self) -> None:
+        """
+        Save the index to its sidecar file, replacing it atomically.
+        """
+        data = {
+            "version": self.VERSION,
+            "journal_size": self._journal_size,
+            "journal_mtime_ns": self._journal_mtime_ns,
+            "scanned_offset": self._scanned_offset,
+            "anchor": self._anchor,
+            "tags": self.tags,
+        }
+        temp_file = self.index_file.with_name(f"{self.index_file.name}.tmp")
+        try:
+            with open(temp_file, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(temp_file, self.index_file)
+        except OSError as e:
+            logger.debug(f"Tag index not saved in `{self.index_file}`: {e}")
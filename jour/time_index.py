@@ -0,0 +1,393 @@
+"""
+Time index
+==========
+
+This module implements the time queries of the journal, `--since`, `--until` and
+`--signature`: the parsing of their date bounds, and the index of the chronological runs
+of the journal file that lets them bisect it by date instead of reading all of it.
+"""
+
+import datetime
+import heapq
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Setup logger
+handler = logging.StreamHandler()
+logger = logging.getLogger(__name__)
+logger.setLevel("INFO")
+formatter = logging.Formatter("%(asctime)s - jour - %(levelname)s - %(message)s")
+handler.setFormatter(formatter)
+logger.addHandler(handler)
+
+# Regex to match the start of a journal line, capturing its timestamp and its signature:
+# `N. YYYY-MM-DD HH:MM:SS,mmm - signature - ...`
+LINE_HEADER_REGEX = re.compile(
+    rb"^\d+\. (\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) - (.*?) - "
+)
+
+# Regex to match the time of an ISO date and time, capturing its optional fields:
+# `HH[:MM[:SS[.fff]]]`, with or without the colons
+TIME_FIELDS_REGEX = re.compile(r"\d{2}(?::?(\d{2})(?::?(\d{2})(?:[.,](\d+))?)?)?")
+
+# Format of the journal timestamps. They have a fixed width, so they sort as strings
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+
+
+def parse_time_bound(text: str, upper: bool = False) -> str:
+    """
+    Parse a date or a date and time in ISO format, like `2024-03-05` or `2024-03-05
+    10:30`, as a journal timestamp to compare with the journal lines. The journal
+    timestamps are local times, so the times with a time zone are rejected.
+
+    :param text: The date or date and time.
+    :param upper: If `True`, the bound is the end of the given date, hour, minute,
+        second or fraction of second, to include all of it. If `False`, its start.
+    :return: The journal timestamp.
+    """
+    text = text.strip()
+    moment = datetime.datetime.fromisoformat(text)
+    if moment.tzinfo is not None:
+        raise ValueError(f"Time zones are not supported: `{text}`")
+
+    if upper:
+        moment += get_time_unit(text) - datetime.timedelta(microseconds=1)
+
+    return moment.strftime(TIMESTAMP_FORMAT)[:-3]
+
+
+def get_time_unit(text: str) -> datetime.timedelta:
+    """
+    Get the unit of the least precise field of a date or a date and time in ISO format,
+    like a day for `2024-03-05`, or an hour for `2024-03-05 10`.
+
+    :param text: The date or date and time, without time zone.
+    :return: The unit.
+    """
+    separator = re.search(r"[T ]", text)
+    if not separator:
+        return datetime.timedelta(days=1)
+
+    match = TIME_FIELDS_REGEX.fullmatch(text[separator.end() :])
+    if not match:
+        raise ValueError(f"Invalid time: `{text}`")
+    minutes, seconds, fraction = match.groups()
+    if fraction:
+        return datetime.timedelta(microseconds=10 ** max(6 - len(fraction), 0))
+    if seconds:
+        return datetime.timedelta(seconds=1)
+    if minutes:
+        return datetime.timedelta(minutes=1)
+    return datetime.timedelta(hours=1)
+
+
+def parse_line_header(line: bytes) -> Optional[tuple]:
+    """
+    Parse the timestamp and the signature of a journal line.
+
+    :param line: The journal line, encoded.
+    :return: The timestamp and the signature, or `None` if the line does not have them.
+    """
+    match = LINE_HEADER_REGEX.match(line)
+    if not match:
+        return None
+    return match.group(1).decode(), match.group(2).decode(errors="replace")
+
+
+def match_line(
+    line: bytes,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    signature: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Check if a journal line matches a query.
+
+    :param line: The journal line, encoded.
+    :param since: If provided, the line timestamp must not be before this timestamp.
+    :param until: If provided, the line timestamp must not be after this timestamp.
+    :param signature: If provided, the line signature must be this one.
+    :return: The line timestamp if the line matches, `None` otherwise.
+    """
+    header = parse_line_header(line)
+    if not header:
+        return None
+    timestamp, line_signature = header
+    if (
+        (since and timestamp < since)
+        or (until and timestamp > until)
+        or (signature and line_signature != signature)
+    ):
+        return None
+
+    return timestamp
+
+
+class TimeIndex:
+    """
+    Index of the chronological runs of a journal file, to find the lines of a time range
+    bisecting the file by byte offset, parsing only the lines it touches.
+
+    The lines are appended in chronological order, but an emergency journal merged by hand
+    can add lines out of order. So the index stores the offsets where each run of sorted
+    lines starts, and each run is bisected on its own. Usually, there is only one.
+
+    Like the tag index, it is persisted in a sidecar file next to the journal, checked
+    against the size and modification time of the journal file when refreshed, and only
+    the lines from the last indexed line onwards are scanned again, unless the previous
+    content of the file has changed too, in which case the index is rebuilt.
+    """
+
+    VERSION = 1
+
+    def __init__(self, journal_file: Path, persistent: bool = True):
+        """
+        Initialize the time index of a journal file. Call `refresh` to load it.
+
+        :param journal_file: The journal file to index.
+        :param persistent: If `True`, load and save the index from its sidecar file. If
+            `False`, build it only in memory.
+        """
+        self.journal_file = Path(journal_file)
+        self.index_file = self.journal_file.with_name(
+            f".{self.journal_file.name}.times.json"
+        )
+        self.persistent = persistent
+        self._loaded = False
+
+        self.runs: list = []
+        self._journal_size = 0
+        self._journal_mtime_ns = 0
+        self._scanned_offset = 0  # Start of the last indexed line, scanned again
+        self._anchor = ""  # Line before `_scanned_offset`, to check it has not changed
+        self._previous_timestamp = ""  # Last timestamp before `_scanned_offset`
+
+    def refresh(self) -> "TimeIndex":
+        """
+        Bring the index up to date with the journal file, scanning only its new part when
+        possible, and save it if persistent.
+
+        :return: The index itself.
+        """
+        if self.persistent and not self._loaded:
+            self.__load()
+            self._loaded = True
+
+        stat = os.stat(self.journal_file)
+        if (
+            stat.st_size == self._journal_size
+            and stat.st_mtime_ns == self._journal_mtime_ns
+        ):
+            return self  # Up to date
+
+        with open(self.journal_file, "rb") as f:
+            if not self.__check_anchor(f, stat.st_size):
+                logger.debug(f"Rebuilding time index of `{self.journal_file}`...")
+                self.runs = []
+                self._scanned_offset = 0
+                self._anchor = ""
+                self._previous_timestamp = ""
+            self.runs = [
+                offset for offset in self.runs if offset < self._scanned_offset
+            ]
+            self.__scan(f)
+
+        self._journal_size = stat.st_size
+        self._journal_mtime_ns = stat.st_mtime_ns
+
+        if self.persistent:
+            self.__save()
+
+        return self
+
+    def find(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        signature: Optional[str] = None,
+        end: Optional[int] = None,
+    ) -> list:
+        """
+        Find the journal lines that match a query, in chronological order.
+
+        :param since: If provided, only the lines from this timestamp onwards.
+        :param until: If provided, only the lines until this timestamp, included.
+        :param signature: If provided, only the lines with this signature.
+        :param end: If provided, do not read beyond this byte offset of the journal file.
+        :return: The matching lines, with their line breaks.
+        """
+        size = self._journal_size if end is None else min(end, self._journal_size)
+        bounds = self.runs + [size]
+
+        found_runs = []
+        with open(self.journal_file, "rb") as f:
+            for start, stop in zip(bounds, bounds[1:]):
+                stop = min(stop, size)
+                if start >= stop:
+                    continue
+                if since:
+                    start = self.__bisect(f, start, stop, since)
+                found_runs.append(
+                    list(self.__read_run(f, start, stop, since, until, signature))
+                )
+
+        return [line for _, line in heapq.merge(*found_runs, key=lambda item: item[0])]
+
+    @staticmethod
+    def __bisect(f, start: int, stop: int, since: str) -> int:
+        """
+        Bisect a sorted run of the journal file to find its first line from a timestamp.
+
+        :param f: The journal file, opened in binary mode.
+        :param start: The byte offset of the run start.
+        :param stop: The byte offset of the run end.
+        :param since: The timestamp.
+        :return: The byte offset of the first line of the run from the timestamp, or the
+            run end if there is none.
+        """
+        low, high = start, stop
+        while low < high:
+            middle = (low + high) // 2
+
+            # Go to the first line starting at or after the middle
+            f.seek(middle - 1 if middle > start else start)
+            if middle > start:
+                f.readline()
+
+            # Look for the first line with timestamp
+            timestamp = None
+            line_end = f.tell()
+            while line_end < high and timestamp is None:
+                line = f.readline()
+                line_end += len(line)
+                header = parse_line_header(line)
+                timestamp = header[0] if header else None
+
+            if timestamp is None or timestamp >= since:
+                high = middle
+            else:
+                low = line_end
+
+        return low
+
+    @staticmethod
+    def __read_run(
+        f,
+        start: int,
+        stop: int,
+        since: Optional[str],
+        until: Optional[str],
+        signature: Optional[str],
+    ) -> Iterator[tuple]:
+        """
+        Read the lines of a sorted run of the journal file that match a query, until the
+        end of the run or a line after the time range.
+
+        :param f: The journal file, opened in binary mode.
+        :param start: The byte offset to start reading.
+        :param stop: The byte offset of the run end.
+        :return: The matching lines, with their timestamps, as `(timestamp, line)`.
+        """
+        f.seek(start)
+        offset = start
+        while offset < stop:
+            line = f.readline()
+            if not line:
+                break  # pragma: no cover
+            offset += len(line)
+            header = parse_line_header(line)
+            if not header:
+                continue
+            if until and header[0] > until:
+                break
+            if match_line(line, since, until, signature):
+                yield header[0], line.decode(errors="replace")
+
+    def __check_anchor(self, f, size: int) -> bool:
+        """
+        Check that the journal file has not changed before the last indexed line, so the
+        index can be updated scanning only from that line.
+
+        :param f: The journal file, opened in binary mode.
+        :param size: The current size of the journal file.
+        :return: `True` if the previous content is unchanged.
+        """
+        anchor = self._anchor.encode()
+        if size < self._scanned_offset or self._scanned_offset < len(anchor):
+            return False
+        f.seek(self._scanned_offset - len(anchor))
+        return f.read(len(anchor)) == anchor
+
+    def __scan(self, f) -> None:
+        """
+        Scan the journal file from the last indexed line, adding the starts of the new
+        runs: the lines with an earlier timestamp than the previous line.
+
+        :param f: The journal file, opened in binary mode.
+        """
+        f.seek(self._scanned_offset)
+        offset = self._scanned_offset
+        timestamp = self._previous_timestamp
+        last_line = b""
+        for line in f:
+            if last_line:
+                self._anchor = last_line.decode(errors="replace")
+                self._scanned_offset = offset
+                self._previous_timestamp = timestamp
+            header = parse_line_header(line)
+            if header:
+                if not self.runs or header[0] < timestamp:
+                    self.runs.append(offset)
+                timestamp = header[0]
+            last_line = line
+            offset += len(line)
+
+    def __load(self) -> None:
+        """
+        Load the index from its sidecar file, if it exists and is valid.
+        """
+        try:
+            with open(self.index_file, "r") as f:
+                data = json.load(f)
+            if data["version"] != self.VERSION:
+                return  # Old index, rebuild it
+            runs = [int(offset) for offset in data["runs"]]
+            journal_size = int(data["journal_size"])
+            journal_mtime_ns = int(data["journal_mtime_ns"])
+            scanned_offset = int(data["scanned_offset"])
+            anchor = str(data["anchor"])
+            previous_timestamp = str(data["previous_timestamp"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return  # Missing or corrupt index, rebuild it
+
+        self.runs = runs
+        self._journal_size = journal_size
+        self._journal_mtime_ns = journal_mtime_ns
+        self._scanned_offset = scanned_offset
+        self._anchor = anchor
+        self._previous_timestamp = previous_timestamp
+
+    def __save(self) -> None:
+        """
+        Save the index to its sidecar file, replacing it atomically.
+        """
+        data = {
+            "version": self.VERSION,
+            "journal_size": self._journal_size,
+            "journal_mtime_ns": self._journal_mtime_ns,
+            "scanned_offset": self._scanned_offset,
+            "anchor": self._anchor,
+            "previous_timestamp": self._previous_timestamp,
+            "runs": self.runs,
+        }
+        temp_file = self.index_file.with_name(f"{self.index_file.name}.tmp")
+        try:
+            with open(temp_file, "w") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(temp_file, self.index_file)
+        except OSError as e:
+            logger.debug(f"Time index not saved in `{self.index_file}`: {e}")
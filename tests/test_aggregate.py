@@ -0,0 +1,153 @@
+import contextlib
+import io
+import json
+import resource
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.__main__ import main
+from jour.aggregate import find_journals, iter_aggregated_entries
+from jour.jour import Jour
+
+
+class TestAggregate(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        # A fleet directory with a journal per host, some of them out of order
+        self.fleet_dir = self.temp_dir / "fleet"
+        for host in range(1, 6):
+            journal_file = self.fleet_dir / f"web{host}" / "journal.md"
+            journal_file.parent.mkdir(parents=True)
+            days = [host, host + 10, host + 5, host + 20]
+            journal_file.write_text(
+                "".join(
+                    f"{i}. 2024-03-{day:02} 10:00:00,000 - user{host} - Message {i}. "
+                    f"#BUP{i}.\n"
+                    for i, day in enumerate(days, start=1)
+                )
+            )
+        (self.fleet_dir / "db1.md").write_text(
+            "1. 2024-03-15 10:00:00,000 - root - Database message.\n"
+        )
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.temp_dir / "journal.md"),
+                "JOURNAL_EMERGENCY": str(self.temp_dir / "journal_emergency.md"),
+                "JOURNAL_SOCKET": str(self.temp_dir / "jour.sock"),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_aggregated_entries(self):
+        """
+        Test that the entries of all the journals are merged by timestamp, annotated
+        with their host, whatever the number of worker processes.
+        """
+        hosts = [host for host, _ in find_journals([self.fleet_dir])]
+        self.assertEqual(hosts, ["db1", "web1", "web2", "web3", "web4", "web5"])
+
+        entries = list(iter_aggregated_entries([self.fleet_dir], workers=1))
+        self.assertEqual(len(entries), 21)
+        timestamps = [entry.timestamp for _, entry in entries]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertEqual(entries[0][0], "web1")
+        self.assertEqual(entries[0][1].tags, (("BUP", 1),))
+        self.assertEqual(
+            [
+                host
+                for host, entry in entries
+                if entry.timestamp.startswith("2024-03-15")
+            ],
+            ["db1", "web5"],
+        )
+
+        self.assertEqual(
+            list(iter_aggregated_entries([self.fleet_dir], workers=3)), entries
+        )
+
+    def test_journal_out_of_order(self):
+        """
+        Test that a journal with almost every line out of order, so with a run per
+        entry, is merged in bounded passes, without opening a file per run.
+        """
+        journal_file = self.temp_dir / "reversed.md"
+        journal_file.write_text(
+            "".join(
+                f"{i}. 2024-03-16 {(3000 - i) // 3600:02}:{(3000 - i) // 60 % 60:02}:"
+                f"{(3000 - i) % 60:02},000 - root - Message {i}.\n"
+                for i in range(1, 3001)
+            )
+        )
+
+        soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(soft_limit, 256), hard_limit))
+        try:
+            entries = list(iter_aggregated_entries([journal_file], workers=1))
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft_limit, hard_limit))
+
+        self.assertEqual(
+            [entry.index for _, entry in entries], list(range(3000, 0, -1))
+        )
+
+    def test_segmented_journal(self):
+        """
+        Test that the sealed segments of a segmented journal are aggregated with it, and
+        not as other hosts.
+        """
+        journal_file = self.fleet_dir / "web1" / "journal.md"
+        with patch.dict("os.environ", {"JOURNAL": str(journal_file)}):
+            with Jour() as jour:
+                jour.segment_journal(rotation=2)
+
+        hosts = [host for host, _ in find_journals([self.fleet_dir])]
+        self.assertEqual(hosts, ["db1", "web1", "web2", "web3", "web4", "web5"])
+        entries = list(iter_aggregated_entries([self.fleet_dir / "web1"], workers=1))
+        self.assertEqual(sorted(entry.index for _, entry in entries), [1, 2, 3, 4])
+
+    def test_aggregate_option(self):
+        """
+        Test that the `--aggregate` option prints the merged timeline as a journal or
+        as JSON.
+        """
+        stdout = io.StringIO()
+        paths = [str(self.fleet_dir / "web1"), str(self.fleet_dir / "db1.md")]
+        with patch("sys.argv", ["jour", "--aggregate", *paths]):
+            with contextlib.redirect_stdout(stdout):
+                main()
+        self.assertEqual(
+            stdout.getvalue().splitlines()[:2],
+            [
+                "1. 2024-03-01 10:00:00,000 - user1@web1 - Message 1. #BUP1.",
+                "2. 2024-03-06 10:00:00,000 - user1@web1 - Message 3. #BUP3.",
+            ],
+        )
+
+        stdout = io.StringIO()
+        with patch(
+            "sys.argv", ["jour", "--aggregate", str(self.fleet_dir), "-of", "json"]
+        ):
+            with contextlib.redirect_stdout(stdout):
+                main()
+        records = json.loads(stdout.getvalue())
+        self.assertEqual(len(records), 21)
+        self.assertEqual(records[-1]["host"], "web5")
+        self.assertEqual(records[-1]["tags"], [["BUP", 4]])
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
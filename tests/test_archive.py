@@ -0,0 +1,112 @@
+import datetime
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.archive import ArchiveTagIndex, BlockIndex, open_archive
+from jour.time_index import TimeIndex
+
+
+class TestArchive(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        start = datetime.datetime(2024, 1, 1)
+        self.lines = []
+        for i in range(500):
+            moment = start + datetime.timedelta(hours=i)
+            line = f"{i + 1}. {moment.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]} - "
+            line += f"{'bob' if i % 2 else 'alice'} - Message {i + 1}."
+            if i % 10 == 0:
+                line += f" #BUP{i // 10 + 1}."
+            self.lines.append(line + "\n")
+        self.journal_file = self.temp_dir / "journal.2024.md"
+        self.journal_file.write_text("".join(self.lines))
+
+        # Small blocks, to have many of them
+        self.block_size_patch = patch("jour.archive.ARCHIVE_BLOCK_SIZE", 1024)
+        self.block_size_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def write_archive(self, suffix: str) -> BlockIndex:
+        archive_file = self.temp_dir / f"journal.2024.md{suffix}"
+        return BlockIndex(archive_file).write(self.lines)
+
+    def test_read_archive(self):
+        """
+        Test that the archives are valid gzip and xz files, and that they are read
+        decompressing their blocks on the fly.
+        """
+        for suffix in (".gz", ".xz"):
+            with self.subTest(suffix=suffix):
+                block_index = self.write_archive(suffix)
+                self.assertGreater(len(block_index.blocks), 10)
+                with open_archive(block_index.archive_file) as f:
+                    self.assertEqual(f.read().decode(), "".join(self.lines))
+
+                self.assertEqual(list(block_index.iter_lines()), self.lines)
+                self.assertEqual(
+                    list(block_index.iter_lines_reversed()), self.lines[::-1]
+                )
+                self.assertEqual(
+                    block_index.read_entries(123, 321), self.lines[122:321]
+                )
+                self.assertEqual(block_index.read_entries(500, 600), self.lines[499:])
+
+                # The same lines than the time index of the decompressed journal
+                time_index = TimeIndex(self.journal_file, persistent=False).refresh()
+                query = ("2024-01-05 10:00:00,000", "2024-01-09 23:59:59,999", "bob")
+                self.assertEqual(block_index.find(*query), time_index.find(*query))
+
+    def test_read_entries_with_empty_blocks(self):
+        """
+        Test that the entries are read from the right block when some blocks have no
+        entries, only long lines of the previous entry.
+        """
+        lines = self.lines[:200] + [f"{'x' * 600}\n"] * 3 + self.lines[200:]
+        for suffix in (".gz", ".xz"):
+            with self.subTest(suffix=suffix):
+                archive_file = self.temp_dir / f"journal.2024.md{suffix}"
+                block_index = BlockIndex(archive_file).write(lines)
+                self.assertIn(None, [block[2] for block in block_index.blocks])
+
+                for first, last in ((190, 210), (195, 200), (200, 201), (201, 230)):
+                    self.assertEqual(
+                        block_index.read_entries(first, last),
+                        self.lines[first - 1 : last],
+                    )
+
+    def test_rebuild_block_index(self):
+        """
+        Test that a missing block index is rebuilt finding the blocks in the archive.
+        """
+        for suffix in (".gz", ".xz"):
+            with self.subTest(suffix=suffix):
+                blocks = self.write_archive(suffix).blocks
+                block_index = BlockIndex(self.temp_dir / f"journal.2024.md{suffix}")
+                block_index.index_file.unlink()
+                self.assertEqual(block_index.refresh().blocks, blocks)
+                self.assertTrue(block_index.index_file.is_file())
+
+    def test_archive_tag_index(self):
+        """
+        Test that the tags of an archive are indexed like the ones of a journal file.
+        """
+        block_index = self.write_archive(".gz")
+        tag_index = ArchiveTagIndex(block_index.archive_file, block_index).refresh()
+        self.assertEqual(tag_index.maxima(), {"BUP": 50})
+        _, offset, index = tag_index.tags["BUP"]["occurrences"][-1]
+        self.assertEqual(index, 50)
+        self.assertEqual(tag_index.read_line(offset), self.lines[490])
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
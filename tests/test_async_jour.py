@@ -0,0 +1,93 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.async_jour import AsyncJour
+from jour.locks import JournalLock
+
+
+class TestAsyncJour(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.temp_dir / "journal_emergency.md"),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    async def test_concurrent_writes(self):
+        """
+        Test that many coroutines can write concurrently, getting consecutive indexes and
+        tag indexes.
+        """
+
+        async def log_line(jour, i):
+            await jour.write_lines(
+                [{"message": f"Message {i}", "tag": "BUP"}], printing=False
+            )
+
+        async with AsyncJour(create_journal=True) as jour:
+            await asyncio.gather(*(log_line(jour, i) for i in range(20)))
+            self.assertEqual(await jour.get_next_tag("BUP", printing=False), "#BUP21")
+            new_line = await jour.tag_last_line("OS", printing=False)
+            self.assertTrue(new_line.endswith("#OS1.\n"))
+            self.assertEqual(len(await jour.last_lines(5)), 5)
+
+        with open(self.journal_file, "r") as f:
+            dumped_lines = f.readlines()
+        self.assertEqual(len(dumped_lines), 21)
+        for i, line in enumerate(dumped_lines):
+            self.assertTrue(line.startswith(f"{i+1:02}. "))
+
+    async def test_lock_wait_does_not_block_event_loop(self):
+        """
+        Test that waiting for the lock over the journal file does not block the event loop.
+        """
+        # Hold the journal lock from other thread for a while
+        lock_taken = threading.Event()
+
+        def hold_lock():
+            with JournalLock(self.journal_file):
+                lock_taken.set()
+                time.sleep(0.5)
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        lock_taken.wait()
+
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.05)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        async with AsyncJour(create_journal=True) as jour:
+            await jour.write_line("Test message", printing=False)
+        ticker.cancel()
+        thread.join()
+
+        self.assertGreaterEqual(ticks, 5)
+        with open(self.journal_file, "r") as f:
+            self.assertIn("Test message", f.readlines()[-1])
@@ -0,0 +1,73 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.jour import Jour
+
+BENCHMARKS_DIR = Path(__file__).parent.parent / "benchmarks"
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def run_benchmark(self, script: str, *args: str) -> str:
+        env = dict(os.environ, PYTHONPATH=str(BENCHMARKS_DIR.parent))
+        result = subprocess.run(
+            [sys.executable, str(BENCHMARKS_DIR / script), *args],
+            capture_output=True,
+            text=True,
+            env=env,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout
+
+    def test_synthetic_journal(self):
+        """
+        Test that the synthetic journals are well formatted journals, with consecutive
+        indexes and tag indexes.
+        """
+        journal_file = self.temp_dir / "journal.md"
+        self.run_benchmark("generate.py", str(journal_file), "--entries", "2000")
+
+        with patch("os.environ", {"JOURNAL": str(journal_file), "USER": "test_user"}):
+            with Jour() as jour:
+                entries = list(jour.iter_entries())
+                tag_maxima = jour.tag_index()
+        self.assertEqual([e.index for e in entries], list(range(1, 2001)))
+        self.assertGreater(len(tag_maxima), 10)
+        for tag_name, max_index in tag_maxima.items():
+            indexes = [i for e in entries for name, i in e.tags if name == tag_name]
+            self.assertEqual(indexes, list(range(1, max_index + 1)))
+
+    def test_suite_report(self):
+        """
+        Test that the suite writes a report with the times of each operation, which can
+        be compared with other report.
+        """
+        report_file = self.temp_dir / "report.json"
+        args = ("--sizes", "100,300", "--runs", "2", "--output", str(report_file))
+        self.run_benchmark("suite.py", *args)
+
+        with open(report_file) as f:
+            report = json.load(f)
+        self.assertEqual(len(report["results"]), 2 * 2 * 6)
+        self.assertTrue(all(r["median_s"] > 0 for r in report["results"]))
+
+        output = self.run_benchmark(
+            "suite.py", *args[:4], "--compare", str(report_file), "--threshold", "1000"
+        )
+        self.assertIn("Comparison with", output)
@@ -0,0 +1,80 @@
+import sys
+import unittest
+
+from jour.columnar import ColumnarJournal, ms_to_timestamp, timestamp_to_ms
+from jour.entry import Entry
+
+
+class TestColumnarJournal(unittest.TestCase):
+    def setUp(self):
+        self.lines = []
+        for i in range(1, 3001):
+            day = 1 + (i - 1) // 100
+            signature = "alice" if i % 3 else "bob"
+            tags = f". #BUP{i // 2}. #OS{i}" if i % 2 == 0 else ""
+            self.lines.append(
+                f"{i}. 2024-03-{day:02} 10:{i % 60:02}:00,{i % 1000:03} - {signature} - "
+                f"Message {i} ñ{tags}.\n"
+            )
+        self.lines.append("3001. Line without timestamp.\n")
+        self.entries = [Entry.from_line(line) for line in self.lines]
+        self.columnar = ColumnarJournal.from_entries(self.entries)
+
+    def test_timestamp_conversion(self):
+        """
+        Test that the journal timestamps are converted to milliseconds and back.
+        """
+        self.assertEqual(timestamp_to_ms("1970-01-02 00:00:01,002"), 86_401_002)
+        timestamp = "2024-02-29 23:59:59,999"
+        self.assertEqual(ms_to_timestamp(timestamp_to_ms(timestamp)), timestamp)
+
+    def test_entries(self):
+        """
+        Test that the entries are kept in the columns without losses.
+        """
+        self.assertEqual(len(self.columnar), 3001)
+        for position in (0, 1, 1499, 2999, 3000):
+            self.assertEqual(self.columnar.entry(position), self.entries[position])
+        self.assertEqual(self.columnar.message(0), "Message 1 ñ")
+        self.assertEqual(self.columnar.signatures, ["alice", "bob"])
+        self.assertEqual(self.columnar.tag_names, ["BUP", "OS"])
+
+    def test_memory_size(self):
+        """
+        Test that the columns use a fraction of the memory of the lines.
+        """
+        lines_size = sys.getsizeof(self.lines) + sum(map(sys.getsizeof, self.lines))
+        self.assertLess(self.columnar.memory_size(), lines_size / 2)
+
+    def test_entries_per_day(self):
+        """
+        Test that the entries are counted per day and signature.
+        """
+        entries_per_day = self.columnar.entries_per_day()
+        self.assertEqual(entries_per_day[("2024-03-01", "alice")], 67)
+        self.assertEqual(entries_per_day[("2024-03-01", "bob")], 33)
+        self.assertEqual(entries_per_day[(None, None)], 1)
+        self.assertEqual(sum(entries_per_day.values()), 3001)
+        self.assertEqual(
+            list(entries_per_day)[:2], [(None, None), ("2024-03-01", "alice")]
+        )
+
+        entries_per_day = self.columnar.entries_per_day(signature="bob")
+        self.assertEqual(len(entries_per_day), 30)
+        self.assertEqual(sum(entries_per_day.values()), 1000)
+
+    def test_tag_frequency(self):
+        """
+        Test that the tag uses are counted over time.
+        """
+        tag_frequency = self.columnar.tag_frequency(period="day")
+        self.assertEqual(tag_frequency[("2024-03-01", "BUP")], 50)
+        self.assertEqual(tag_frequency[("2024-03-30", "OS")], 50)
+        self.assertEqual(
+            self.columnar.tag_frequency(),
+            {("2024-03", "BUP"): 1500, ("2024-03", "OS"): 1500},
+        )
+        self.assertEqual(
+            self.columnar.tag_frequency(period="year"),
+            {("2024", "BUP"): 1500, ("2024", "OS"): 1500},
+        )
@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.durability import DURABILITY_MODES, get_durability
+from jour.jour import Jour
+
+
+class TestDurability(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        self.journal_emergency_file = self.temp_dir / "journal_emergency.md"
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.journal_emergency_file),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def write_entries(self, n_entries: int, durability: str) -> None:
+        for i in range(n_entries):
+            with Jour(durability=durability) as jour:
+                jour.write_line(f"Message {i}", printing=False)
+                if i % 3 == 0:
+                    jour.tag_last_line("BUP", printing=False)
+
+    def test_get_durability(self):
+        """
+        Test that the durability mode is taken from the argument, the environment
+        variable or the default, and that unknown modes are rejected.
+        """
+        self.assertEqual(get_durability(), "append")
+        with patch.dict("os.environ", {"JOURNAL_DURABILITY": "Fast"}):
+            self.assertEqual(get_durability(), "fast")
+            self.assertEqual(get_durability("atomic"), "atomic")
+            self.assertEqual(Jour().durability, "fast")
+        with self.assertRaises(ValueError):
+            get_durability("eventual")
+
+    def test_same_journal_in_all_modes(self):
+        """
+        Test that all the durability modes write the same journal, including the full
+        rewrite when the index padding changes, without leaving temporary files and
+        keeping the permissions of the journal file.
+        """
+        journals = []
+        for durability in DURABILITY_MODES:
+            with self.subTest(durability=durability):
+                self.journal_file.touch()
+                os.chmod(self.journal_file, 0o640)
+                self.write_entries(12, durability)
+
+                journal = self.journal_file.read_text()
+                self.assertTrue(journal.startswith("01. "))
+                self.assertIn("12. ", journal)
+                self.assertEqual(os.stat(self.journal_file).st_mode & 0o777, 0o640)
+                self.assertFalse(list(self.temp_dir.glob("*.tmp")))
+                # Compare the messages and tags, because the dates differ
+                journals.append(
+                    [line.split(" - ", 2)[-1] for line in journal.splitlines()]
+                )
+                self.journal_file.unlink()
+
+        self.assertEqual(journals[0], journals[1])
+        self.assertEqual(journals[0], journals[2])
+
+    def test_atomic_replaces_journal_file(self):
+        """
+        Test that the `atomic` mode replaces the journal file in each commit, and that
+        the `append` mode writes it in place.
+        """
+        self.journal_file.touch()
+        self.write_entries(1, "append")
+
+        inode = os.stat(self.journal_file).st_ino
+        self.write_entries(1, "append")
+        self.assertEqual(os.stat(self.journal_file).st_ino, inode)
+
+        self.write_entries(1, "atomic")
+        self.assertNotEqual(os.stat(self.journal_file).st_ino, inode)
+        self.assertEqual(len(self.journal_file.read_text().splitlines()), 3)
+
+    def test_failed_commit_keeps_journal(self):
+        """
+        Test that a commit that fails before replacing the journal file leaves the
+        previous journal intact, also in a full rewrite.
+        """
+        self.journal_file.touch()
+        self.write_entries(9, "append")
+        journal = self.journal_file.read_text()
+
+        for durability in ("atomic", "append"):
+            with self.subTest(durability=durability):
+                # The tenth entry changes the index padding, so the journal is rewritten
+                with patch(
+                    "jour.durability.shutil.copymode", side_effect=OSError("Disk full")
+                ):
+                    with self.assertRaises(OSError):
+                        self.write_entries(1, durability)
+                self.assertEqual(self.journal_file.read_text(), journal)
+                self.assertFalse(list(self.temp_dir.glob("*.tmp")))
+
+    def test_replace_journal_link_target(self):
+        """
+        Test that the atomic commits replace the target of a linked journal file, so the
+        link is kept.
+        """
+        target_file = self.temp_dir / "target.md"
+        target_file.touch()
+        self.journal_file.symlink_to(target_file)
+
+        self.write_entries(2, "atomic")
+        self.assertTrue(self.journal_file.is_symlink())
+        self.assertEqual(len(target_file.read_text().splitlines()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,110 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from jour.entry_index import EntryIndex
+
+
+class TestEntryIndex(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        with open(self.journal_file, "w") as f:
+            for i in range(1, 101):
+                f.write(f"{i:03}. Line {i}.\n")
+
+        # Byte offsets of the lines, to check the index
+        with open(self.journal_file, "rb") as f:
+            self.offsets = [0]
+            for line in f:
+                self.offsets.append(self.offsets[-1] + len(line))
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_index_entries(self):
+        """
+        Test that the entries are indexed by their numbers and read seeking to them.
+        """
+        entry_index = EntryIndex(self.journal_file).refresh()
+
+        self.assertEqual(entry_index.first_entry, 1)
+        self.assertEqual(entry_index.last_entry, 100)
+        self.assertEqual(entry_index.offset(1), 0)
+        self.assertEqual(entry_index.offset(2), 13)
+        self.assertIsNone(entry_index.offset(101))
+        self.assertEqual(entry_index.read_entries(42, 42), ["042. Line 42.\n"])
+        self.assertEqual(
+            entry_index.read_entries(99, 120), ["099. Line 99.\n", "100. Line 100.\n"]
+        )
+        self.assertEqual(entry_index.read_entries(101, 120), [])
+        self.assertEqual(entry_index.read_entries(1, 100, end=13), ["001. Line 1.\n"])
+
+    def test_index_persistence_and_incremental_update(self):
+        """
+        Test that the index is saved in its sidecar file, and updated when the journal
+        grows or its last line changes.
+        """
+        EntryIndex(self.journal_file).refresh()
+        self.assertTrue((self.temp_dir / ".journal.md.entries.idx").is_file())
+
+        # Change the last line and add new ones
+        with open(self.journal_file, "r+") as f:
+            f.seek(self.offsets[99])
+            f.write("100. Line 100 changed.\n101. Line 101.\n102. Line 102.\n")
+            f.truncate()
+
+        entry_index = EntryIndex(self.journal_file).refresh()
+        self.assertEqual(entry_index.last_entry, 102)
+        self.assertEqual(
+            entry_index.read_entries(100, 101),
+            ["100. Line 100 changed.\n", "101. Line 101.\n"],
+        )
+
+        # Lines out of sequence are not indexed
+        with open(self.journal_file, "a") as f:
+            f.write("7. Merged line.\n103. Line 103.\n")
+        entry_index = EntryIndex(self.journal_file).refresh()
+        self.assertEqual(entry_index.last_entry, 103)
+        self.assertEqual(entry_index.read_entries(103, 103), ["103. Line 103.\n"])
+        self.assertEqual(entry_index.read_entries(7, 7), ["007. Line 7.\n"])
+
+    def test_index_rebuild_if_journal_changed(self):
+        """
+        Test that the index is rebuilt if the journal changes before the last indexed line.
+        """
+        EntryIndex(self.journal_file).refresh()
+
+        with open(self.journal_file, "w") as f:
+            f.write("5. Line 5.\n6. Line 6.\n")
+
+        entry_index = EntryIndex(self.journal_file).refresh()
+        self.assertEqual(entry_index.first_entry, 5)
+        self.assertEqual(entry_index.last_entry, 6)
+        self.assertEqual(entry_index.read_entries(1, 5), ["5. Line 5.\n"])
+
+    def test_corrupt_sidecar_file(self):
+        """
+        Test that a corrupt sidecar file is ignored and the index rebuilt.
+        """
+        with open(self.temp_dir / ".journal.md.entries.idx", "wb") as f:
+            f.write(b"JOURIDX")
+
+        entry_index = EntryIndex(self.journal_file).refresh()
+        self.assertEqual(entry_index.last_entry, 100)
+        self.assertEqual(
+            EntryIndex(self.journal_file).refresh().offset(100), self.offsets[99]
+        )
+
+    def test_not_persistent_index(self):
+        """
+        Test that a not persistent index does not write its sidecar file.
+        """
+        entry_index = EntryIndex(self.journal_file, persistent=False).refresh()
+        self.assertEqual(entry_index.offset(50), self.offsets[49])
+        self.assertFalse((self.temp_dir / ".journal.md.entries.idx").exists())
@@ -0,0 +1,160 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.__main__ import main
+from jour.export import export_journal_files, split_journal_file
+from jour.jour import Jour
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        self.journal_file.write_text(
+            "".join(
+                f"{i:03}. 2024-03-{i % 28 + 1:02} 10:00:00,000 - test_user - Message "
+                f"{i} & co, with comma. #BUP{i}.\n"
+                for i in range(1, 301)
+            )
+        )
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.temp_dir / "journal_emergency.md"),
+                "JOURNAL_SOCKET": str(self.temp_dir / "jour.sock"),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_export_formats(self):
+        """
+        Test that the entries are exported with their fields in each format.
+        """
+        with Jour() as jour:
+            jour.write_line("New message", printing=False)
+            outputs = {}
+            for export_format in ("jsonl", "csv", "html"):
+                outputs[export_format] = io.StringIO()
+                n_entries = jour.export_journal(outputs[export_format], export_format)
+                self.assertEqual(n_entries, 301)
+
+        records = [
+            json.loads(line) for line in outputs["jsonl"].getvalue().splitlines()
+        ]
+        self.assertEqual(len(records), 301)
+        self.assertEqual(records[0]["message"], "Message 1 & co, with comma. #BUP1")
+        self.assertEqual(records[0]["tags"], [["BUP", 1]])
+        self.assertEqual(records[-1]["message"], "New message")
+
+        rows = list(csv.reader(io.StringIO(outputs["csv"].getvalue())))
+        self.assertEqual(
+            rows[0], ["index", "timestamp", "signature", "message", "tags"]
+        )
+        self.assertEqual(
+            rows[1],
+            [
+                "1",
+                "2024-03-02 10:00:00,000",
+                "test_user",
+                records[0]["message"],
+                "#BUP1",
+            ],
+        )
+
+        document = outputs["html"].getvalue()
+        self.assertTrue(document.startswith("<!DOCTYPE html>"))
+        self.assertEqual(document.count("<tr><td>"), 301)
+        self.assertIn("<td>Message 1 &amp; co, with comma. #BUP1</td>", document)
+
+    def test_parallel_export(self):
+        """
+        Test that exporting a segmented journal in parallel chunks, split on line
+        boundaries, gives the same output than exporting it in a single process.
+        """
+        with Jour() as jour:
+            jour.segment_journal(rotation=100, compression="gzip")
+        journal_files = [
+            (self.temp_dir / "journal.1-100.md.gz", None),
+            (self.temp_dir / "journal.101-200.md.gz", None),
+            (self.journal_file, None),
+        ]
+
+        chunks = split_journal_file(self.journal_file, chunk_size=1000)
+        self.assertGreater(len(chunks), 5)
+        with open(self.journal_file, "rb") as f:
+            data = f.read()
+        self.assertEqual(b"".join(data[start:end] for start, end in chunks), data)
+        self.assertTrue(all(data[end - 1 : end] == b"\n" for _, end in chunks))
+
+        for export_format in ("jsonl", "csv", "html"):
+            outputs = []
+            for workers in (1, 3):
+                output = io.StringIO()
+                n_entries = export_journal_files(
+                    journal_files, output, export_format, workers, chunk_size=1000
+                )
+                self.assertEqual(n_entries, 300)
+                outputs.append(output.getvalue())
+            self.assertEqual(outputs[0], outputs[1], export_format)
+
+    def test_export_option(self):
+        """
+        Test that the `--export` option writes the entries to the standard output.
+        """
+        stdout = io.StringIO()
+        with patch("sys.argv", ["jour", "--export", "jsonl", "--workers", "2"]):
+            with contextlib.redirect_stdout(stdout):
+                main()
+
+        indexes = [json.loads(line)["index"] for line in stdout.getvalue().splitlines()]
+        self.assertEqual(indexes, list(range(1, 301)))
+
+    def test_export_to_closed_pipe(self):
+        """
+        Test that the `--export` option stops quietly when the reader of the output
+        closes it, like `jour --export csv | head -2`.
+        """
+        with open(self.journal_file, "a") as f:
+            for i in range(301, 5001):
+                f.write(f"{i}. 2024-03-28 10:00:00,000 - test_user - Message {i}.\n")
+
+        process = subprocess.Popen(
+            [sys.executable, "-m", "jour", "--export", "csv"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env={**os.environ, "PYTHONPATH": str(Path(__file__).parent.parent)},
+        )
+        self.assertEqual(
+            process.stdout.readline(), b"index,timestamp,signature,message,tags\r\n"
+        )
+        process.stdout.close()  # Like `head`
+        stderr = process.stderr.read()
+        process.stderr.close()
+
+        self.assertEqual(process.wait(), 0)
+        self.assertNotIn(b"Traceback", stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
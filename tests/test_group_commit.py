@@ -0,0 +1,179 @@
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.group_commit import GroupCommitJour
+from jour.jour import Jour
+
+
+def write_with_group_commit(n_lines: int) -> None:
+    """
+    Write lines with tags through a `GroupCommitJour`, from other process.
+
+    :param n_lines: The number of lines to write.
+    """
+    with GroupCommitJour(group_size=2, group_delay=0.001, lock_timeout=60) as jour:
+        for i in range(n_lines // 2):
+            futures = [jour.write_line(f"Message {i}", tag="BUP") for _ in range(2)]
+            for future in futures:
+                future.result()  # Many small groups
+
+
+class TestGroupCommit(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        self.journal_file.touch()
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.temp_dir / "journal_emergency.md"),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_concurrent_writes(self):
+        """
+        Test that many threads can write concurrently, getting consecutive indexes and
+        tag indexes, and that their lines are written in groups.
+        """
+        n_threads, n_lines = 8, 50
+        futures = []
+
+        def write(thread_index: int):
+            for i in range(n_lines):
+                futures.append(
+                    jour.write_line(f"Message {thread_index}-{i}", tag="BUP")
+                )
+
+        with GroupCommitJour(group_size=64, group_delay=1) as jour:
+            threads = [
+                threading.Thread(target=write, args=(i,)) for i in range(n_threads)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            jour.flush()
+            self.assertEqual(jour.pending, 0)
+
+        n_total = n_threads * n_lines
+        lines = self.journal_file.read_text().splitlines()
+        self.assertEqual(len(lines), n_total)
+        self.assertEqual(
+            [int(line.split(".")[0]) for line in lines], list(range(1, n_total + 1))
+        )
+        self.assertEqual(
+            sorted(int(line.split("#BUP")[1].rstrip(".")) for line in lines),
+            list(range(1, n_total + 1)),
+        )
+        # The futures get the lines as written, before padding the indexes
+        self.assertEqual(
+            sorted(f.result().split(". ", 1)[1] for f in futures),
+            sorted(line.split(". ", 1)[1] + "\n" for line in lines),
+        )
+        self.assertLess(jour.stats["commits"], n_total // 10)
+        self.assertEqual(jour.stats["lines"], n_total)
+
+    def test_concurrent_processes(self):
+        """
+        Test that the groups committed by many processes at the same time get consecutive
+        indexes and tag indexes.
+        """
+        n_processes, n_lines = 4, 100
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=write_with_group_commit, args=(n_lines,))
+            for _ in range(n_processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        n_total = n_processes * n_lines
+        lines = self.journal_file.read_text().splitlines()
+        self.assertEqual(
+            [int(line.split(".")[0]) for line in lines], list(range(1, n_total + 1))
+        )
+        self.assertEqual(
+            sorted(int(line.split("#BUP")[1].rstrip(".")) for line in lines),
+            list(range(1, n_total + 1)),
+        )
+
+    def test_group_triggers(self):
+        """
+        Test that a group is written when its first line has waited the delay, and that
+        flushing writes it without waiting.
+        """
+        with GroupCommitJour(group_size=1000, group_delay=0.1) as jour:
+            future = jour.write_line("Delayed message")
+            self.assertFalse(future.done())
+            self.assertIn("1. ", future.result(timeout=5))
+            self.assertEqual(jour.stats["commits"], 1)
+
+            jour.group_delay = 60
+            start = time.monotonic()
+            future = jour.write_line("Flushed message")
+            jour.flush(timeout=5)
+            self.assertTrue(future.done())
+            self.assertLess(time.monotonic() - start, 5)
+
+        lines = self.journal_file.read_text().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].endswith("Flushed message."))
+
+    def test_close_writes_queued_lines(self):
+        """
+        Test that closing the handle writes the queued lines and rejects new ones.
+        """
+        jour = GroupCommitJour(group_size=1000, group_delay=60)
+        jour.open()
+        futures = [jour.write_line(f"Message {i}") for i in range(10)]
+        jour.close()
+
+        self.assertTrue(all(f.done() for f in futures))
+        self.assertEqual(len(self.journal_file.read_text().splitlines()), 10)
+        with self.assertRaises(RuntimeError):
+            jour.write_line("Late message")
+
+        # Other contexts see the lines, and the handle can be opened again
+        with Jour() as other_jour:
+            other_jour.write_line("Other message", printing=False)
+        with jour:
+            future = jour.write_line("Reopened message")
+            jour.flush()
+            self.assertIn("12. ", future.result())
+
+    def test_failed_commit(self):
+        """
+        Test that the futures of a group that cannot be written get the error, and that
+        the next groups are written.
+        """
+        with GroupCommitJour(group_delay=0.01) as jour:
+            with patch.object(Jour, "write_lines", side_effect=OSError("Disk full")):
+                future = jour.write_line("Lost message")
+                with self.assertRaises(OSError):
+                    future.result(timeout=5)
+            self.assertIn("1. ", jour.write_line("Next message").result(timeout=5))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -1,4 +1,6 @@
+import contextlib
 import datetime
+import io
 import os
 import shutil
 import tempfile
@@ -6,6 +8,9 @@ import unittest
 from pathlib import Path
 from unittest.mock import patch
 
+import mdformat
+
+from jour.__main__ import main
 from jour.jour import Jour
 
 
@@ -260,6 +265,426 @@ class TestJour(unittest.TestCase):
             with Jour(create_journal=False) as jour:
                 jour.write_line("Test message")
                 self.assertEqual(
-                    f"Using emergency journal file in `{self.journal_emergency_file}`. Manually merge this journal with the default journal file when possible.",
+                    f"Using emergency journal file in `{self.journal_emergency_file}`. Merge it into the default journal file with `jour --merge-emergency` when it is reachable again.",
+                    mock_logger.call_args[0][0],
+                )
+
+    def test_write_line_appends_without_loading_journal(self):
+        """
+        Test that writing lines does not load the journal, and the lines appended to the
+        journal file are the same than formatting all the journal with Mdformat.
+        """
+        with Jour(create_journal=True):
+            pass
+
+        # Cross the 9 to 10 index boundary, where the index padding changes
+        for i in range(1, 15):
+            with Jour() as jour:
+                jour.write_line(f"Message {i}", signature="test_user")
+                self.assertIsNone(jour._journal_lines)
+
+        with open(self.journal_file, "r") as f:
+            dumped_journal = f.read()
+        self.assertEqual(
+            dumped_journal,
+            mdformat.text(dumped_journal, options={"number": True, "wrap": "keep"}),
+        )
+        dumped_lines = dumped_journal.splitlines()
+        self.assertEqual(len(dumped_lines), 15)
+        for i, line in enumerate(dumped_lines):
+            self.assertTrue(line.startswith(f"{i+1:02}. "))
+
+    def test_write_line_after_loading_journal(self):
+        """
+        Test that lines written after loading the journal are also dumped to the file.
+        """
+        with Jour(create_journal=True) as jour:
+            jour.print_journal()
+            jour.write_line("Test message")
+            jour.write_line("Other message")
+
+        with open(self.journal_file, "r") as f:
+            dumped_lines = f.readlines()
+        self.assertEqual(len(dumped_lines), 3)
+        self.assertIn("Other message", dumped_lines[-1])
+
+    def test_last_line_changes_patch_journal_tail(self):
+        """
+        Test that appending to, tagging and removing the last line only patch the end of the
+        journal file, with the same result than formatting all the journal with Mdformat.
+        """
+        with Jour(create_journal=True) as jour:
+            for i in range(1, 12):
+                jour.write_line(f"Message {i}")
+
+        with patch.object(Jour, "_Jour__dump_journal") as mock_dump:
+            with Jour() as jour:
+                jour.append_to_last_line("Additional message")
+            with Jour() as jour:
+                jour.tag_last_line("Tag")
+            with Jour() as jour:
+                jour.remove_last_line()
+            with Jour() as jour:
+                jour.tag_last_line("Tag")
+            mock_dump.assert_not_called()
+
+        with open(self.journal_file, "r") as f:
+            dumped_journal = f.read()
+        self.assertEqual(
+            dumped_journal,
+            mdformat.text(dumped_journal, options={"number": True, "wrap": "keep"}),
+        )
+        dumped_lines = dumped_journal.splitlines()
+        self.assertEqual(len(dumped_lines), 11)
+        self.assertTrue(dumped_lines[-1].startswith("11. "))
+        self.assertTrue(dumped_lines[-1].endswith("Message 10. #Tag1."))
+
+    def test_read_only_operations_do_not_write(self):
+        """
+        Test that printing the journal and getting the next tag do not write the journal file.
+        """
+        # Not formatted journal, that would be changed if dumped
+        with open(self.journal_file, "w") as f:
+            f.write("1. First line.\n3. Second line. #Tag1.\n")
+
+        with Jour() as jour:
+            jour.print_journal()
+            self.assertEqual(jour.get_next_tag("Tag"), "#Tag2")
+
+        with open(self.journal_file, "r") as f:
+            self.assertEqual(f.read(), "1. First line.\n3. Second line. #Tag1.\n")
+
+    def test_tag_index_after_removing_tagged_line(self):
+        """
+        Test that the next tag index is computed correctly after the persisted tag index is
+        outdated by removing a tagged line.
+        """
+        with Jour(create_journal=True) as jour:
+            jour.tag_last_line("Tag")
+            jour.write_line("Test message")
+        with Jour() as jour:
+            jour.tag_last_line("Tag")
+            self.assertIn("#Tag2", jour._journal[-1])
+        with Jour() as jour:
+            jour.remove_last_line()
+        with Jour() as jour:
+            self.assertEqual(jour.get_next_tag("Tag"), "#Tag2")
+
+    def test_print_tags_and_tag_history(self):
+        """
+        Test that the tags of the journal and the history of a tag are printed.
+        """
+        with Jour(create_journal=True) as jour:
+            for i in range(1, 4):
+                jour.write_line(f"Message {i}")
+                jour.tag_last_line("BUP")
+            jour.tag_last_line("OS")
+
+        with Jour() as jour:
+            with patch("jour.jour.logger.info") as mock_logger:
+                jour.print_tags()
+                self.assertIn(
+                    "  #BUP: 3 uses, last #BUP3 in entry 4 (",
+                    mock_logger.call_args[0][0],
+                )
+                self.assertIn(
+                    "  #OS: 1 use, last #OS1 in entry 4 (", mock_logger.call_args[0][0]
+                )
+
+                jour.print_tag_history("BUP")
+                history = mock_logger.call_args[0][0].splitlines()
+                self.assertEqual(history[0], "Tag `#BUP` history:")
+                self.assertEqual(len(history), 4)
+                self.assertTrue(history[-1].endswith("Message 3. #BUP3. #OS1."))
+
+            with patch("jour.jour.logger.warning") as mock_logger:
+                jour.print_tag_history("Other")
+                self.assertEqual(
                     mock_logger.call_args[0][0],
+                    "Tag `#Other` not found in the journal.",
                 )
+
+    def test_tag_index(self):
+        """
+        Test that the tag index maps each tag to its maximum index, without prefix
+        collisions, and that it is kept updated in the context.
+        """
+        with open(self.journal_file, "w") as f:
+            f.write("1. First line. #BUP1. #XBUP7.\n")
+            f.write("2. Second line. #BUP10. #OS1.\n")
+
+        for persist_tag_index in (True, False):
+            with Jour(persist_tag_index=persist_tag_index) as jour:
+                jour.print_journal()  # Load the journal
+                self.assertEqual(jour.tag_index(), {"BUP": 10, "XBUP": 7, "OS": 1})
+                self.assertEqual(jour.get_next_tag("BUP"), "#BUP11")
+                self.assertEqual(jour.get_next_tag("UP"), "#UP1")
+
+                jour.write_line("Third line")
+                jour.tag_last_line("OS")
+                self.assertEqual(jour.tag_index()["OS"], 2)
+
+                jour.remove_last_line()
+                self.assertEqual(jour.tag_index()["OS"], 1)
+
+    def test_print_journal_reads_only_its_end(self):
+        """
+        Test that printing some last lines of the journal does not load all the journal.
+        """
+        with Jour(create_journal=True) as jour:
+            for i in range(1, 300):
+                jour.write_line(f"Message {i+1}")
+
+        with Jour() as jour:
+            with patch("jour.jour.logger.info") as mock_logger:
+                jour.print_journal(n_lines=3)
+                self.assertIsNone(jour._journal_lines)
+
+                printed_lines = mock_logger.call_args[0][0].splitlines()
+                self.assertEqual(printed_lines[0], "Journal last 3 lines:")
+                self.assertTrue(printed_lines[1].startswith("  298. "))
+                self.assertTrue(printed_lines[-1].endswith("Message 300."))
+
+                # More lines than the journal has
+                jour.print_journal(n_lines=500)
+                printed_lines = mock_logger.call_args[0][0].splitlines()
+                self.assertEqual(printed_lines[0], "Journal last 300 lines:")
+
+    def test_lines_option_must_be_positive(self):
+        """
+        Test that the `--lines` option rejects the numbers of lines below 1.
+        """
+        Jour(create_journal=True)  # Create the journal
+
+        for lines in ("0", "-3", "many"):
+            with patch("sys.argv", ["jour", "--lines", lines]):
+                with contextlib.redirect_stderr(io.StringIO()) as stderr:
+                    with self.assertRaises(SystemExit):
+                        main()
+            self.assertIn("argument --lines/-n", stderr.getvalue())
+
+    def test_write_lines(self):
+        """
+        Test that many lines are written at once, with consecutive indexes and tag indexes,
+        appending them to the journal file without loading it.
+        """
+        with Jour(create_journal=True) as jour:
+            jour.tag_last_line("BUP")
+
+        with Jour() as jour:
+            jour.write_lines(
+                [
+                    "First message",
+                    {"message": "Second message", "signature": "Other", "tag": "BUP"},
+                    {"message": "ls -l", "as_command": True, "tag": "BUP"},
+                ]
+            )
+            self.assertIsNone(jour._journal_lines)
+
+        with open(self.journal_file, "r") as f:
+            dumped_lines = f.readlines()
+        self.assertEqual(len(dumped_lines), 4)
+        self.assertTrue(dumped_lines[1].startswith("2. "))
+        self.assertTrue(dumped_lines[1].endswith(" - test_user - First message.\n"))
+        self.assertTrue(dumped_lines[2].endswith(" - Other - Second message. #BUP2.\n"))
+        self.assertTrue(dumped_lines[3].startswith("4. "))
+        self.assertTrue(dumped_lines[3].endswith(" - `ls -l`. #BUP3.\n"))
+
+    def test_journal_changed_while_loading(self):
+        """
+        Test that the tail window is not joined to other lines if the journal file grows
+        after the tail is read, discarding the changes instead of losing the new lines.
+        """
+        with Jour(create_journal=True) as jour:
+            jour.write_line("First message", printing=False)
+
+        other_line = "3. 2024-03-16 17:04:50,123 - other - Other message.\n"
+        with self.assertRaises(RuntimeError):
+            with Jour() as jour:
+                jour.append_to_last_line("Appended", printing=False)
+                with open(self.journal_file, "a") as f:
+                    f.write(other_line)  # Other process, without the lock
+                jour._journal
+
+        with open(self.journal_file, "r") as f:
+            dumped_lines = f.readlines()
+        self.assertEqual(len(dumped_lines), 3)
+        self.assertTrue(dumped_lines[1].endswith(" - First message.\n"))
+        self.assertEqual(dumped_lines[2], other_line)
+
+    def test_last_line_changes_without_loading_journal(self):
+        """
+        Test that the last lines of the journal file are changed without loading it.
+        """
+        with Jour(create_journal=True) as jour:
+            for i in range(1, 5):
+                jour.write_line(f"Message {i}")
+
+        with Jour() as jour:
+            jour.remove_last_line()
+            jour.remove_last_line()
+            jour.tag_last_line("Tag")
+            jour.append_to_last_line("Additional message")
+            self.assertTrue(
+                jour._journal[-1].endswith("Message 2. #Tag1. Additional message.\n")
+            )
+
+        with Jour() as jour:
+            jour.tag_last_line("Tag")
+            self.assertIsNone(jour._journal_lines)
+
+        with open(self.journal_file, "r") as f:
+            dumped_lines = f.readlines()
+        self.assertEqual(len(dumped_lines), 3)
+        self.assertTrue(
+            dumped_lines[-1].endswith("Message 2. #Tag1. Additional message. #Tag2.\n")
+        )
+
+    def test_flush(self):
+        """
+        Test that the changes are written to the journal file when flushing, without exiting
+        the context.
+        """
+        with Jour(create_journal=True) as jour:
+            jour.write_line("Test message")
+            jour.flush()
+            with open(self.journal_file, "r") as f:
+                self.assertEqual(len(f.readlines()), 2)
+
+            jour.tag_last_line("Tag")
+            jour.write_line("Other message")
+            jour.flush()
+            with open(self.journal_file, "r") as f:
+                dumped_lines = f.readlines()
+            self.assertEqual(len(dumped_lines), 3)
+            self.assertIn("Test message. #Tag1.", dumped_lines[1])
+            self.assertEqual(jour.get_next_tag("Tag"), "#Tag2")
+
+    def test_get_entries(self):
+        """
+        Test that the entries are got by their numbers seeking straight to them, including
+        the changes made in the context, and that the entry index is kept in sync when
+        writing.
+        """
+        with Jour(create_journal=True) as jour:
+            jour.write_lines([f"Message {i}" for i in range(2, 12)], printing=False)
+
+        entry_index_file = self.temp_dir / ".journal.md.entries.idx"
+        with Jour() as jour:
+            self.assertEqual(len(jour.get_entries(3, 5)), 3)
+            self.assertTrue(jour.get_entries(11)[0].endswith("Message 11.\n"))
+            self.assertEqual(jour.get_entries(12), [])
+            self.assertTrue(entry_index_file.is_file())
+            self.assertIsNone(jour._journal_lines)
+
+            jour.tag_last_line("Tag", printing=False)
+            jour.write_line("Message 12", printing=False)
+            entries = jour.get_entries(10, 20)
+            self.assertEqual(len(entries), 3)
+            self.assertTrue(entries[1].endswith("Message 11. #Tag1.\n"))
+            self.assertIsNone(jour._journal_lines)
+
+        # The entry index is updated with the written entries
+        index_size = entry_index_file.stat().st_size
+        with Jour() as jour:
+            jour.write_line("Message 13", printing=False)
+        self.assertEqual(entry_index_file.stat().st_size, index_size + 8)
+
+        with Jour() as jour:
+            self.assertTrue(jour.get_entries(13)[0].endswith("Message 13.\n"))
+
+            # If the index does not match the journal, the journal is read
+            with open(self.journal_file, "a") as f:
+                f.write("14. Unindexed message.\n")
+            jour._entry_index.count += 1
+            self.assertEqual(jour.get_entries(14), ["14. Unindexed message.\n"])
+
+    def test_find_entries(self):
+        """
+        Test that the lines of a time range and with a signature are found bisecting the
+        journal file, including the changes made in the context.
+        """
+        with open(self.journal_file, "w") as f:
+            f.write("1. 2024-03-01 10:00:00,000 - alice - Message 1.\n")
+            f.write("2. 2024-03-03 10:00:00,000 - bob - Message 2.\n")
+            f.write("3. 2024-03-05 10:00:00,000 - alice - Message 3.\n")
+            f.write("4. 2024-03-02 10:00:00,000 - alice - Merged message.\n")
+
+        with Jour() as jour:
+            found_lines = jour.find_entries(
+                since="2024-03-02 00:00:00,000", until="2024-03-04 00:00:00,000"
+            )
+            self.assertEqual(len(found_lines), 2)
+            self.assertIn("Merged message.", found_lines[0])
+            self.assertIn("Message 2.", found_lines[1])
+
+            self.assertEqual(len(jour.find_entries(signature="alice")), 3)
+
+            jour.write_line("Message 5", signature="alice", printing=False)
+            found_lines = jour.find_entries(
+                since="2024-03-05 00:00:00,000", signature="alice"
+            )
+            self.assertEqual(len(found_lines), 2)
+            self.assertTrue(found_lines[-1].endswith("Message 5.\n"))
+            self.assertIsNone(jour._journal_lines)
+
+            # Loaded journal
+            journal = jour._journal
+            self.assertEqual(
+                jour.find_entries(signature="alice"),
+                [journal[0], journal[3], journal[2], journal[4]],
+            )
+
+    def test_iter_entries(self):
+        """
+        Test that the entries are streamed in chunks as parsed records, in both orders,
+        including the changes made in the context.
+        """
+        with Jour(create_journal=True) as jour:
+            jour.write_lines(
+                [{"message": f"Message {i}", "tag": "Tag"} for i in range(2, 51)],
+                printing=False,
+            )
+
+        with patch("jour.streaming.STREAM_BLOCK_SIZE", 7), Jour() as jour:
+            entries = list(jour.iter_entries())
+            self.assertEqual([entry.index for entry in entries], list(range(1, 51)))
+            self.assertEqual(entries[0].signature, "jour")
+            self.assertEqual(entries[0].message, "Create this journal")
+            self.assertEqual(entries[1].signature, "test_user")
+            self.assertEqual(entries[1].message, "Message 2. #Tag1")
+            self.assertEqual(entries[1].tags, (("Tag", 1),))
+            self.assertEqual(len(entries[1].timestamp), 23)
+            self.assertEqual(list(jour.iter_entries_reversed()), entries[::-1])
+            self.assertFalse(hasattr(entries[0], "__dict__"))
+
+            jour.append_to_last_line("Appended")
+            jour.write_line("Message 51", printing=False)
+            self.assertEqual(
+                [entry.message for entry in jour.iter_entries()][-2:],
+                ["Message 50. #Tag49. Appended", "Message 51"],
+            )
+            self.assertEqual(next(jour.iter_entries_reversed()).index, 51)
+            self.assertIsNone(jour._journal_lines)
+
+            # Loaded journal
+            jour._journal
+            self.assertEqual(len(list(jour.iter_entries_reversed())), 51)
+            self.assertEqual(next(jour.iter_entries()).index, 1)
+
+    def test_to_columnar(self):
+        """
+        Test that the columnar representation of the journal includes all its entries,
+        without loading the journal.
+        """
+        with Jour(create_journal=True) as jour:
+            jour.write_lines(
+                [{"message": "Message", "tag": "Tag"} for _ in range(9)], printing=False
+            )
+
+        with Jour() as jour:
+            columnar = jour.to_columnar()
+            self.assertEqual(len(columnar), 10)
+            self.assertEqual(columnar.entry(9), next(jour.iter_entries_reversed()))
+            self.assertEqual(sum(columnar.tag_frequency().values()), 9)
+            self.assertIsNone(jour._journal_lines)
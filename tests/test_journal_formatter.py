@@ -0,0 +1,162 @@
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import mdformat
+
+from jour.jour import Jour
+from jour.journal_formatter import (
+    MDFORMAT_OPTIONS,
+    format_journal,
+    format_journal_lines,
+)
+
+# Pieces of the random journal texts, like the ones of the messages written by Jour
+PLAIN_PIECES = list("aZ09 .,:;-+=/'\"()?%@$^~{}|#!>") + [
+    "é",
+    "日",
+    "ß",
+    "½",
+    "✅",
+    "test_user",
+    "`ls -la`",
+    "#BUP1",
+    "& co",
+    "www.example.com",
+]
+
+# Pieces with Markdown markup, entities, whitespace and characters that Mdformat escapes
+# or rewrites
+MARKUP_PIECES = list("&`<*_[]\\\t") + [
+    "ﬁ",
+    "\u00a0",
+    "\u200b",
+    "\u0301",
+    "  ",
+    "1. ",
+    "2) ",
+    "- ",
+    "&amp;",
+    "&x",
+    "``",
+    "x__y",
+    "http://example.com/a_b",
+]
+
+
+def random_journal(rng: random.Random, plain: bool) -> str:
+    """
+    Generate a random journal, with lines like the ones written by Jour and lines with
+    arbitrary Markdown.
+
+    :param rng: The random generator.
+    :param plain: If `True`, use only the pieces without Markdown markup, in lines
+        with timestamp and signature.
+    :return: The journal text.
+    """
+    pieces = PLAIN_PIECES if plain else PLAIN_PIECES + MARKUP_PIECES
+    first = rng.choice([0, 1, 8, 9, 99, 998, 123456789])
+    lines = []
+    for i in range(rng.randint(1, 12)):
+        index = first + i if rng.random() < 0.9 else rng.randint(0, 2000)
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 10)))
+        if plain or rng.random() < 0.5:
+            text = f"2024-03-16 17:04:50,123 - test_user - {text}."
+        if rng.random() < 0.02:
+            lines.append(text)  # Continuation line
+        else:
+            lines.append(f"{rng.choice(['', '0', '00'])}{index}. {text}")
+
+    return "\n".join(lines) + ("\n" if rng.random() < 0.95 else "")
+
+
+class TestJournalFormatter(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.temp_dir / "journal_emergency.md"),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_same_output_than_mdformat(self):
+        """
+        Property-based test: for random journals, the formatter output is the same than
+        the Mdformat one, byte by byte, whether it formats them itself or falls back to
+        Mdformat.
+        """
+        rng = random.Random(20240316)
+        n_native = 0
+        for case in range(600):
+            journal = random_journal(rng, plain=case % 2 == 0)
+            expected = mdformat.text(journal, options=MDFORMAT_OPTIONS)
+            self.assertEqual(format_journal(journal), expected, repr(journal))
+            n_native += format_journal_lines(journal) is not None
+
+        # Most of the journals without markup are formatted without Mdformat
+        self.assertGreater(n_native, 150)
+
+    def test_unrecognized_lines(self):
+        """
+        Test that the lines that Mdformat would change are not formatted natively.
+        """
+        for line in (
+            "1. Message with *emphasis*.",
+            "1. Message with a [link](https://example.com).",
+            "1. Message with an &amp; entity.",
+            "1. Message with  two spaces.",
+            "1. Message with a trailing space. ",
+            "1. 2024. Message like a nested list.",
+            "1. # Message like a heading.",
+            "1. ``Message with a double backtick code span``.",
+            "1234567890. Message with a too long index.",
+            "Continuation line.",
+        ):
+            self.assertIsNone(
+                format_journal_lines(f"1. First message.\n{line}\n"), line
+            )
+
+    def test_jour_without_mdformat(self):
+        """
+        Test that Jour writes the journal lines, even as commands and renumbering all the
+        journal, without Mdformat.
+        """
+        self.journal_file.write_text(
+            "".join(
+                f"{i}. 2024-03-03 10:00:00,000 - test_user - Message {i}. #BUP{i}.\n"
+                for i in range(1, 10)
+            )
+        )
+        with patch("mdformat.text", side_effect=AssertionError("Mdformat used")):
+            with Jour() as jour:
+                jour.write_line("ls -la", as_command=True, printing=False)
+                jour.tag_last_line("BUP", printing=False)
+            with Jour() as jour:
+                jour.write_line("Other message", printing=False)
+
+        lines = self.journal_file.read_text().splitlines()
+        self.assertEqual(
+            lines[0], "01. 2024-03-03 10:00:00,000 - test_user - Message 1. #BUP1."
+        )
+        self.assertTrue(lines[9].endswith(" - test_user - `ls -la`. #BUP10."))
+        self.assertEqual(len(lines), 11)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.jour import Jour
+from jour.locks import JournalLock, LockTimeoutError, get_lock_file
+
+
+def write_batches(n_batches: int) -> None:
+    """
+    Write batches of journal lines with tags, from other process.
+
+    :param n_batches: The number of batches to write.
+    """
+    for i in range(n_batches):
+        with Jour(lock_timeout=60) as jour:
+            jour.write_lines(
+                [{"message": f"Message {os.getpid()}-{i}", "tag": "BUP"}, "Message"],
+                printing=False,
+            )
+
+
+class TestLocks(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        self.journal_emergency_file = self.temp_dir / "journal_emergency.md"
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.journal_emergency_file),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_lock_file_by_real_path(self):
+        """
+        Test that the journals with the same name in different directories have different
+        locks, and that the paths to the same journal share it.
+        """
+        other_dir = self.temp_dir / "other"
+        other_dir.mkdir()
+        os.symlink(self.temp_dir, self.temp_dir / "link")
+
+        self.assertNotEqual(
+            get_lock_file(self.journal_file), get_lock_file(other_dir / "journal.md")
+        )
+        self.assertEqual(
+            get_lock_file(self.journal_file),
+            get_lock_file(self.temp_dir / "link" / "journal.md"),
+        )
+
+    def test_shared_and_exclusive_locks(self):
+        """
+        Test that the shared locks do not wait for each other, and that the exclusive
+        locks wait for any other lock, until the timeout.
+        """
+        reader = JournalLock(self.journal_file, timeout=0.1)
+        other_reader = JournalLock(self.journal_file, timeout=0.1)
+        writer = JournalLock(self.journal_file, timeout=0.1)
+
+        with reader.shared, other_reader.shared:
+            with self.assertRaises(LockTimeoutError):
+                writer.acquire()
+        self.assertEqual(writer.stats["exclusive"]["acquisitions"], 0)
+
+        with writer:
+            with self.assertRaises(LockTimeoutError):
+                reader.acquire(exclusive=False)
+        with reader.shared:
+            pass  # Released
+
+    def test_reentrant_lock(self):
+        """
+        Test that an exclusive lock can be taken inside a shared one, going back to shared
+        when released.
+        """
+        lock = JournalLock(self.journal_file, timeout=0.1)
+        other_lock = JournalLock(self.journal_file, timeout=0.1)
+
+        with lock.shared:
+            with lock:
+                with lock.shared:
+                    with self.assertRaises(LockTimeoutError):
+                        other_lock.acquire(exclusive=False)
+            with other_lock.shared:
+                pass  # Shared again
+        with other_lock:
+            pass  # Released
+
+    def test_lock_wait_stats(self):
+        """
+        Test that the time waited for the lock over the journal is recorded.
+        """
+        lock_taken = threading.Event()
+
+        def hold_lock():
+            with JournalLock(self.journal_file):
+                lock_taken.set()
+                time.sleep(0.2)
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        lock_taken.wait()
+
+        jour = Jour(create_journal=True)
+        with jour:
+            jour.write_line("Test message", printing=False)
+        thread.join()
+
+        stats = jour.lock_stats
+        self.assertGreaterEqual(stats["shared"]["waits"], 1)
+        self.assertGreaterEqual(stats["shared"]["max_wait_time"], 0.1)
+        self.assertGreaterEqual(stats["exclusive"]["acquisitions"], 1)
+        self.assertEqual(stats["exclusive"]["waits"], 0)
+
+    def test_lock_timeout(self):
+        """
+        Test that the lock timeout is configurable by argument or environment variable.
+        """
+        Jour(create_journal=True)  # Create the journal
+
+        with JournalLock(self.journal_file):
+            jour = Jour(lock_timeout=0.1)
+            with self.assertRaises(LockTimeoutError):
+                with jour:
+                    pass
+
+            os.environ["JOURNAL_LOCK_TIMEOUT"] = "0.1"
+            start = time.monotonic()
+            with self.assertRaises(LockTimeoutError):
+                with Jour() as jour:
+                    jour.print_journal()
+            self.assertLess(time.monotonic() - start, 5)
+
+    def test_concurrent_batches(self):
+        """
+        Test that the batches written by many processes at the same time get consecutive
+        indexes and tag indexes, because each one is read and written under the same
+        exclusive lock.
+        """
+        Jour(create_journal=True)  # Create the journal
+
+        n_processes, n_batches = 4, 25
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=write_batches, args=(n_batches,))
+            for _ in range(n_processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            self.assertEqual(process.exitcode, 0)
+
+        n_total = 1 + 2 * n_processes * n_batches
+        lines = self.journal_file.read_text().splitlines()
+        self.assertEqual(len(lines), n_total)
+        self.assertEqual(
+            [int(line.split(".")[0]) for line in lines], list(range(1, n_total + 1))
+        )
+        self.assertEqual(
+            sorted(int(line.split("#BUP")[1].rstrip(".")) for line in lines[1::2]),
+            list(range(1, n_processes * n_batches + 1)),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,164 @@
+import datetime
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import mdformat
+
+from jour.jour import Jour
+from jour.journal_formatter import MDFORMAT_OPTIONS
+from jour.merge import merge_emergency_journal
+from jour.tag_index import TAG_REGEX
+
+
+def write_journal(journal_file, moments, signature, tag_every=10) -> None:
+    """
+    Write a journal file with an entry per moment, tagging some of them.
+    """
+    tag_index = 0
+    with open(journal_file, "w") as f:
+        for i, moment in enumerate(moments):
+            line = f"{i + 1}. {moment.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]} - "
+            line += f"{signature} - Message {i + 1}."
+            if i % tag_every == 0:
+                tag_index += 1
+                line += f" #BUP{tag_index}."
+            f.write(line + "\n")
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        self.journal_emergency_file = self.temp_dir / "journal_emergency.md"
+        self.archive_file = self.temp_dir / "archive.md"
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.journal_emergency_file),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_merge_large_journals(self):
+        """
+        Test that large journals are merged by timestamp in bounded memory, renumbering
+        the entries and remapping the colliding tags of the emergency journal.
+        """
+        start = datetime.datetime(2024, 1, 1)
+        journal_moments = [start + datetime.timedelta(minutes=i) for i in range(20000)]
+        emergency_moments = [
+            start + datetime.timedelta(minutes=5 * i, seconds=30) for i in range(4000)
+        ]
+        write_journal(self.journal_file, journal_moments, "main")
+        write_journal(self.journal_emergency_file, emergency_moments, "emergency")
+        journal_size = os.path.getsize(self.journal_file)
+
+        tracemalloc.start()
+        n_entries = merge_emergency_journal(
+            self.journal_file, self.journal_emergency_file, self.archive_file
+        )
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(n_entries, 4000)
+        self.assertFalse(self.journal_emergency_file.exists())
+        self.assertTrue(self.archive_file.is_file())
+        self.assertFalse((self.temp_dir / ".journal.md.merge.tmp").exists())
+        self.assertLess(peak, journal_size)
+
+        with open(self.journal_file, "r") as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 24000)
+
+        # Renumbered and sorted by timestamp
+        self.assertTrue(lines[0].startswith("00001. "))
+        self.assertTrue(lines[-1].startswith("24000. "))
+        self.assertEqual(
+            [int(line.split(".")[0]) for line in lines], list(range(1, 24001))
+        )
+        timestamps = [line.split(" - ")[0].partition(". ")[2] for line in lines]
+        self.assertEqual(timestamps, sorted(timestamps))
+        self.assertIn("- emergency - Message 1. #BUP2001.", lines[1])
+
+        # Tags of the journal kept, and not colliding tags
+        tags = [tag for line in lines for tag in TAG_REGEX.findall(line)]
+        self.assertEqual(len(tags), 2400)
+        self.assertEqual(len(set(tags)), 2400)
+        self.assertIn("- main - Message 11. #BUP2.", "".join(lines))
+
+    def test_merge_is_formatted(self):
+        """
+        Test that the merged journal is already formatted with Mdformat, and that `Jour`
+        continues it.
+        """
+        start = datetime.datetime(2024, 1, 1)
+        write_journal(
+            self.journal_file,
+            [start + datetime.timedelta(hours=i) for i in range(8)],
+            "main",
+            tag_every=3,
+        )
+        write_journal(
+            self.journal_emergency_file,
+            [start + datetime.timedelta(hours=i, minutes=30) for i in range(4)],
+            "emergency",
+            tag_every=2,
+        )
+
+        with Jour() as jour:
+            self.assertEqual(jour.get_next_tag("BUP", printing=False), "#BUP4")
+            self.assertEqual(jour.merge_emergency_journal(), 4)
+            new_line = jour.tag_last_line("BUP", printing=False)
+            self.assertTrue(new_line.endswith("Message 8. #BUP6.\n"))
+
+        with open(self.journal_file, "r") as f:
+            journal = f.read()
+        self.assertEqual(journal, mdformat.text(journal, options=MDFORMAT_OPTIONS))
+        self.assertEqual(journal.count("\n"), 12)
+        self.assertIn(
+            "02. 2024-01-01 00:30:00,000 - emergency - Message 1. #BUP4.", journal
+        )
+        self.assertIn(
+            "06. 2024-01-01 02:30:00,000 - emergency - Message 3. #BUP5.", journal
+        )
+        self.assertEqual(
+            len(list(self.temp_dir.glob("journal_emergency.merged-*.md"))), 1
+        )
+
+        # Nothing to merge
+        with Jour() as jour:
+            self.assertEqual(jour.merge_emergency_journal(), 0)
+
+    def test_merge_durability(self):
+        """
+        Test that the merged journal is synced to the disk unless the durability mode of
+        the journal is `fast`.
+        """
+        start = datetime.datetime(2024, 1, 1)
+        for durability, synced in (("fast", False), ("append", True), ("atomic", True)):
+            write_journal(self.journal_file, [start], "main")
+            write_journal(self.journal_emergency_file, [start], "emergency")
+
+            with Jour(durability=durability) as jour:
+                with patch("os.fsync", wraps=os.fsync) as fsync:
+                    self.assertEqual(jour.merge_emergency_journal(), 1)
+                self.assertEqual(fsync.called, synced)
+
+            with open(self.journal_file, "r") as f:
+                self.assertEqual(f.read().count("\n"), 2)
@@ -0,0 +1,97 @@
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.__main__ import main
+from jour.jour import Jour
+from jour.phases import PhaseStats
+
+
+class TestPhases(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        self.journal_file.write_text(
+            "".join(
+                f"{i:02}. 2024-03-03 10:00:00,000 - test_user - Message {i}. #BUP{i}.\n"
+                for i in range(1, 20)
+            )
+        )
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.temp_dir / "journal_emergency.md"),
+                "JOURNAL_SOCKET": str(self.temp_dir / "jour.sock"),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_phase_hook(self):
+        """
+        Test that the phase hook receives the phases of the context and of the
+        operations, accumulated by `PhaseStats`.
+        """
+        phase_stats = PhaseStats()
+        jour = Jour(phase_hook=phase_stats)
+        with jour:
+            jour.write_line("New message", printing=False)
+            jour.tag_last_line("BUP", printing=False)
+        with jour:
+            jour.write_line("Other message", printing=False)
+
+        phases = phase_stats.to_dict()
+        for name in ("enter", "exit", "flush", "format", "write", "lock_exclusive"):
+            self.assertEqual(phases[name]["calls"], 2, name)
+        self.assertEqual(phases["write_line"]["calls"], 2)
+        self.assertEqual(phases["tag_last_line"]["calls"], 1)
+        self.assertIn("tag_index", phases)
+        self.assertGreaterEqual(phases["exit"]["seconds"], phases["flush"]["seconds"])
+        self.assertEqual(
+            list(phases), sorted(phases, key=lambda n: -phases[n]["seconds"])
+        )
+
+    def test_no_phase_hook(self):
+        """
+        Test that the phases are not timed without phase hook.
+        """
+        with patch("jour.phases.Phase", side_effect=AssertionError("Timed")):
+            with Jour() as jour:
+                jour.write_line("New message", printing=False)
+                jour.tag_last_line("BUP", printing=False)
+        self.assertIn("#BUP20", self.journal_file.read_text())
+
+    def test_stats_option(self):
+        """
+        Test that the `--stats` option prints the timing report as JSON to the standard
+        error.
+        """
+        stderr = io.StringIO()
+        with patch("sys.argv", ["jour", "--tag", "BUP", "--stats"]):
+            with contextlib.redirect_stderr(stderr):
+                main()
+
+        report = json.loads(stderr.getvalue())
+        self.assertEqual(report["command"], ["--tag", "BUP", "--stats"])
+        self.assertIn("tag_last_line", report["phases"])
+        self.assertEqual(report["locks"]["exclusive"]["waits"], 0)
+        self.assertGreaterEqual(report["seconds"], report["phases"]["exit"]["seconds"])
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,170 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.jour import Jour
+from jour.replica import Replica, probe_file
+
+
+class TestReplica(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        # The remote file system is a directory that can be moved away
+        self.remote_dir = self.temp_dir / "remote"
+        self.remote_dir.mkdir()
+        self.journal_file = self.remote_dir / "journal.md"
+        self.journal_file.write_text(
+            "".join(
+                f"{i}. 2024-03-0{i} 10:00:00,000 - test_user - Message {i}. #BUP{i}.\n"
+                for i in range(1, 4)
+            )
+        )
+        self.replica_file = self.temp_dir / "local" / "journal.md"
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.temp_dir / "journal_emergency.md"),
+                "JOURNAL_REPLICA": str(self.replica_file),
+                "JOURNAL_PROBE_TIMEOUT": "0.2",
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def write_entries(self, *messages: str, tag: str = None) -> None:
+        with Jour() as jour:
+            for message in messages:
+                jour.write_line(message, printing=False)
+                if tag:
+                    jour.tag_last_line(tag, printing=False)
+
+    def test_write_behind(self):
+        """
+        Test that the writes go to the replica while the journal file is unreachable, and
+        that they are replayed to it by the next sync when it is reachable again.
+        """
+        self.write_entries("Local message 4")
+        self.assertTrue(Replica(self.journal_file, self.replica_file).sync())
+        self.assertEqual(self.journal_file.read_text(), self.replica_file.read_text())
+
+        hidden_dir = self.temp_dir / "remote.hidden"
+        self.remote_dir.rename(hidden_dir)
+        self.write_entries("Local message 5", "Local message 6", tag="BUP")
+        replica = Replica(self.journal_file, self.replica_file)
+        self.assertFalse(replica.sync())
+        self.assertTrue(replica.is_pending())
+
+        # The syncs are not tried again for a while, unless forced
+        hidden_dir.rename(self.remote_dir)
+        self.assertFalse(replica.sync())
+        self.assertTrue(replica.sync(force=True))
+        self.assertFalse(replica.is_pending())
+        self.assertEqual(self.journal_file.read_text(), self.replica_file.read_text())
+        self.assertIn("6. ", self.journal_file.read_text().splitlines()[-1])
+        self.assertIn("#BUP5", self.journal_file.read_text())
+
+    def test_reconcile(self):
+        """
+        Test that the new entries of the replica are merged into a journal file written
+        by others since the last sync, with consecutive indexes and tag indexes.
+        """
+        self.write_entries("Local message 4", tag="BUP")
+
+        # Other host writes to the journal file
+        with open(self.journal_file, "a") as f:
+            f.write(
+                "4. 2024-03-04 10:00:00,000 - other_user - Remote message. #BUP4.\n"
+            )
+
+        with self.assertLogs("jour.replica", level="INFO"):
+            self.assertTrue(Replica(self.journal_file, self.replica_file).sync())
+
+        lines = self.journal_file.read_text().splitlines()
+        self.assertEqual(self.journal_file.read_text(), self.replica_file.read_text())
+        self.assertEqual(
+            [line.split(".")[0] for line in lines], ["1", "2", "3", "4", "5"]
+        )
+        self.assertIn("Remote message. #BUP4", lines[3])
+        self.assertIn("Local message 4. #BUP5", lines[-1])
+
+        # Next writes follow the merged numbering
+        self.write_entries("Local message 6")
+        self.assertTrue(Replica(self.journal_file, self.replica_file).sync())
+        self.assertIn("6. ", self.journal_file.read_text().splitlines()[-1])
+
+    def test_pull(self):
+        """
+        Test that the entries written to the journal file by others are brought to the
+        replica when it has no changes to replay.
+        """
+        self.write_entries()  # Copy the journal file to the replica
+        with open(self.journal_file, "a") as f:
+            f.write("4. 2024-03-04 10:00:00,000 - other_user - Remote message.\n")
+
+        self.assertTrue(Replica(self.journal_file, self.replica_file).sync())
+        self.assertEqual(self.journal_file.read_text(), self.replica_file.read_text())
+        with Jour() as jour:
+            self.assertIn("Remote message", jour.last_lines(1)[0])
+
+    def test_interrupted_replay(self):
+        """
+        Test that a replay interrupted after writing a part of the changes is completed
+        by the next sync, instead of seen as a change of others.
+        """
+        self.write_entries("Local message 4", "Local message 5")
+        replica_text = self.replica_file.read_text()
+        with open(self.journal_file, "a") as f:
+            f.write(replica_text[len(self.journal_file.read_text()) :][:30])
+
+        self.assertTrue(Replica(self.journal_file, self.replica_file).sync())
+        self.assertEqual(self.journal_file.read_text(), replica_text)
+
+    def test_hung_file_system(self):
+        """
+        Test that a hung journal file system does not block Jour, falling back to the
+        emergency journal, and that the probes of the same file reuse one thread.
+        """
+        os.environ.pop("JOURNAL_REPLICA")
+        release = threading.Event()
+        isfile = os.path.isfile
+
+        def hung_isfile(path):
+            if Path(path) == self.journal_file:
+                release.wait(10)
+            return isfile(path)
+
+        with patch("os.path.isfile", hung_isfile):
+            threads = threading.active_count()
+            start = time.monotonic()
+            self.assertFalse(probe_file(self.journal_file))
+            self.assertFalse(probe_file(self.journal_file))
+            self.assertEqual(threading.active_count(), threads + 1)
+
+            with Jour() as jour:
+                jour.write_line("Emergency message", printing=False)
+            self.assertLess(time.monotonic() - start, 2)
+            self.assertEqual(
+                jour._active_journal_file, self.temp_dir / "journal_emergency.md"
+            )
+            release.set()
+
+        self.assertTrue(probe_file(self.journal_file))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,231 @@
+import datetime
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.entry import Entry
+from jour.jour import Jour
+from jour.segments import Manifest, parse_rotation
+
+
+def write_journal(journal_file, moments) -> list:
+    """
+    Write a journal file with an entry per moment, tagging every third one.
+
+    :return: The journal lines.
+    """
+    lines = []
+    for i, moment in enumerate(moments):
+        line = f"{i + 1}. {moment.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]} - "
+        line += f"{'bob' if i % 2 else 'alice'} - Message {i + 1}."
+        if i % 3 == 0:
+            line += f" #BUP{i // 3 + 1}."
+        lines.append(line + "\n")
+    with open(journal_file, "w") as f:
+        f.writelines(lines)
+
+    return lines
+
+
+class TestSegments(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        self.journal_emergency_file = self.temp_dir / "journal_emergency.md"
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.journal_emergency_file),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+        # Entries over three years, the last one of them in the current year
+        this_year = datetime.datetime.now().year
+        self.moments = [
+            datetime.datetime(year, month, 1, 10, 0)
+            for year in (this_year - 2, this_year - 1)
+            for month in (3, 6, 9)
+        ] + [datetime.datetime(this_year, 1, 1, 10, 0)]
+        self.lines = write_journal(self.journal_file, self.moments)
+        self.this_year = this_year
+
+    def tearDown(self):
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_segment_by_year(self):
+        """
+        Test that segmenting the journal by year seals the entries of the previous years
+        and keeps the ones of the current year in the journal file.
+        """
+        with Jour() as jour:
+            jour.segment_journal("year")
+
+        manifest = Manifest.load(self.journal_file)
+        self.assertEqual(manifest.rotation, "year")
+        self.assertEqual(
+            [segment.file.name for segment in manifest.segments],
+            [f"journal.{self.this_year - 2}.md", f"journal.{self.this_year - 1}.md"],
+        )
+        self.assertEqual(
+            [
+                (info["first_entry"], info["last_entry"])
+                for info in manifest.segments_info
+            ],
+            [(1, 3), (4, 6)],
+        )
+        self.assertEqual(manifest.segments[0].file.read_text(), "".join(self.lines[:3]))
+        self.assertEqual(
+            manifest.segments[1].file.read_text(), "".join(self.lines[3:6])
+        )
+        self.assertEqual(self.journal_file.read_text(), self.lines[6])
+
+        # The previous entries and tags are taken into account
+        self.assertEqual(manifest.tag_maxima(), {"BUP": 2})
+        with Jour() as jour:
+            new_line = jour.write_line("New message", printing=False)
+            self.assertTrue(new_line.startswith("8. "))
+            self.assertEqual(jour.get_next_tag("BUP", printing=False), "#BUP4")
+
+    def test_segment_by_entries(self):
+        """
+        Test that segmenting the journal by number of entries seals the full groups, and
+        that the new entries are sealed when their group is full.
+        """
+        with Jour() as jour:
+            jour.segment_journal(3)
+
+        manifest = Manifest.load(self.journal_file)
+        self.assertEqual(
+            [segment.file.name for segment in manifest.segments],
+            ["journal.1-3.md", "journal.4-6.md"],
+        )
+        self.assertEqual(self.journal_file.read_text(), self.lines[6])
+
+        with Jour() as jour:
+            jour.write_lines(["Message 8", "Message 9", "Message 10"], printing=False)
+
+        manifest = Manifest.load(self.journal_file)
+        self.assertEqual(manifest.segments[-1].file.name, "journal.7-9.md")
+        self.assertEqual(manifest.last_entry, 9)
+        active_lines = self.journal_file.read_text().splitlines()
+        self.assertEqual(len(active_lines), 1)
+        self.assertTrue(active_lines[0].startswith("10. "))
+
+    def test_read_across_segments(self):
+        """
+        Test that the reading operations span the sealed segments transparently.
+        """
+        with Jour() as jour:
+            jour.segment_journal(2)
+
+        with Jour() as jour:
+            self.assertEqual(jour.last_lines(5), self.lines[-5:])
+            self.assertEqual(jour.get_entries(2, 6), self.lines[1:6])
+            self.assertEqual(jour.find_entries(signature="alice"), self.lines[0::2])
+            since = self.moments[2].strftime("%Y-%m-%d %H:%M:%S,%f")[:-3]
+            until = self.moments[4].strftime("%Y-%m-%d %H:%M:%S,%f")[:-3]
+            self.assertEqual(jour.find_entries(since, until), self.lines[2:5])
+            self.assertEqual(
+                list(jour.iter_entries()),
+                [Entry.from_line(line) for line in self.lines],
+            )
+            self.assertEqual(
+                list(jour.iter_entries_reversed()),
+                [Entry.from_line(line) for line in reversed(self.lines)],
+            )
+
+            with self.assertLogs("jour.jour", level="INFO") as logs:
+                jour.print_tags()
+            self.assertIn("#BUP: 3 uses, last #BUP3 in entry 7", logs.output[0])
+
+            with self.assertLogs("jour.jour", level="INFO") as logs:
+                jour.print_tag_history("BUP")
+            self.assertEqual(logs.output[0].count("#BUP"), 4)  # Header and 3 uses
+
+    def test_compressed_segments(self):
+        """
+        Test that the sealed segments are compressed, already sealed or new ones, and
+        that the reads decompress them on the fly.
+        """
+        with Jour() as jour:
+            jour.segment_journal(2)
+            jour.segment_journal(2, compression="lzma")
+
+        manifest = Manifest.load(self.journal_file)
+        self.assertEqual(manifest.compression, "lzma")
+        self.assertEqual(
+            sorted(path.name for path in self.temp_dir.glob("journal.*.md*")),
+            ["journal.1-2.md.xz", "journal.3-4.md.xz", "journal.5-6.md.xz"],
+        )
+
+        with Jour() as jour:
+            jour.write_lines(["Message 8", "Message 9"], printing=False)
+            jour.tag_last_line("BUP", printing=False)
+        self.assertTrue((self.temp_dir / "journal.7-8.md.xz").is_file())
+
+        with Jour() as jour:
+            self.assertEqual(jour.get_entries(2, 6), self.lines[1:6])
+            self.assertEqual(jour.find_entries(signature="alice"), self.lines[0::2])
+            self.assertEqual(
+                [entry.index for entry in jour.iter_entries_reversed()],
+                list(range(9, 0, -1)),
+            )
+            self.assertEqual(jour.get_next_tag("BUP", printing=False), "#BUP5")
+            with self.assertLogs("jour.jour", level="INFO") as logs:
+                jour.print_tags()
+            self.assertIn("#BUP: 4 uses, last #BUP4 in entry 9", logs.output[0])
+
+    def test_complete_interrupted_rotation(self):
+        """
+        Test that a rotation interrupted after updating the manifest is completed,
+        dropping the already sealed entries from the journal file.
+        """
+        sealed_file = self.temp_dir / "journal.1-3.md"
+        sealed_file.write_text("".join(self.lines[:3]))
+        manifest = Manifest(self.journal_file, 3)
+        manifest.segments_info = [
+            {
+                "file": sealed_file.name,
+                "first_entry": 1,
+                "last_entry": 3,
+                "first_timestamp": None,
+                "last_timestamp": None,
+                "tag_maxima": {"BUP": 1},
+            }
+        ]
+        manifest.save()
+
+        with self.assertLogs("jour.segments", level="WARNING"):
+            self.assertTrue(Manifest.load(self.journal_file).rotate())
+
+        manifest = Manifest.load(self.journal_file)
+        self.assertEqual(manifest.last_entry, 6)
+        self.assertEqual(self.journal_file.read_text(), self.lines[6])
+        with open(manifest.manifest_file) as f:
+            self.assertEqual(len(json.load(f)["segments"]), 2)
+
+    def test_parse_rotation(self):
+        """
+        Test the parsing of the segment rotations.
+        """
+        self.assertEqual(parse_rotation("year"), "year")
+        self.assertEqual(parse_rotation("1000"), 1000)
+        for text in ("month", "0", "-5"):
+            with self.assertRaises(ValueError):
+                parse_rotation(text)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
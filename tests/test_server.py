@@ -0,0 +1,182 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from jour.__main__ import main
+from jour.jour import Jour
+from jour.server import DaemonUnavailableError, JourClient, JourServer
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        self.socket_path = self.temp_dir / "jour.sock"
+
+        self.os_env_var_patch = patch(
+            "os.environ",
+            {
+                "JOURNAL": str(self.journal_file),
+                "JOURNAL_EMERGENCY": str(self.temp_dir / "journal_emergency.md"),
+                "JOURNAL_SOCKET": str(self.socket_path),
+                "USER": "test_user",
+            },
+        )
+        self.os_env_var_patch.start()
+
+        # Run the daemon in a thread
+        self.server = JourServer(jour=Jour(create_journal=True))
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+        while not self.socket_path.exists() or self.server._server is None:
+            pass
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server_thread.join()
+        patch.stopall()
+        shutil.rmtree(self.temp_dir)
+
+    def test_operations(self):
+        """
+        Test that the daemon runs the requested operations and writes them to the journal.
+        """
+        with JourClient() as client:
+            new_line = client.request(
+                "write_line", message="Test message", printing=False
+            )
+            self.assertTrue(new_line.startswith("2. "))
+            self.assertEqual(
+                client.request("get_next_tag", tag_name="BUP", printing=False), "#BUP1"
+            )
+            new_line = client.request("tag_last_line", tag_name="BUP", printing=False)
+            self.assertTrue(new_line.endswith("Test message. #BUP1.\n"))
+            client.request("write_lines", entries=["Other", "Another"], printing=False)
+            client.request("remove_last_line")
+            last_lines = client.request("last_lines", n_lines=2)
+            self.assertTrue(last_lines[-1].endswith(" - Other.\n"))
+
+            with self.assertRaises(RuntimeError):
+                client.request("print_tags")
+
+        with open(self.journal_file, "r") as f:
+            dumped_lines = f.readlines()
+        self.assertEqual(len(dumped_lines), 3)
+        self.assertEqual(dumped_lines[-2], last_lines[-2])
+
+    def test_parallel_clients(self):
+        """
+        Test that many parallel clients get consecutive indexes and tag indexes.
+        """
+
+        def log_lines():
+            with JourClient() as client:
+                for _ in range(10):
+                    client.request(
+                        "write_lines",
+                        entries=[{"message": "Message", "tag": "BUP"}],
+                        printing=False,
+                    )
+
+        threads = [threading.Thread(target=log_lines) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with open(self.journal_file, "r") as f:
+            dumped_lines = f.readlines()
+        self.assertEqual(len(dumped_lines), 81)
+        for i, line in enumerate(dumped_lines):
+            self.assertTrue(line.startswith(f"{i+1:02}. "))
+        tag_indexes = sorted(
+            int(line.split("#BUP")[1][:-2]) for line in dumped_lines[1:]
+        )
+        self.assertEqual(tag_indexes, list(range(1, 81)))
+
+    def test_journal_changed_by_other_process(self):
+        """
+        Test that the daemon discards its state when the journal is changed directly.
+        """
+        with JourClient() as client:
+            client.request("tag_last_line", tag_name="BUP", printing=False)
+
+            with Jour() as jour:
+                jour.write_line("Direct message", printing=False)
+                jour.tag_last_line("BUP", printing=False)
+
+            self.assertEqual(
+                client.request("get_next_tag", tag_name="BUP", printing=False), "#BUP3"
+            )
+
+    def test_journal_mismatch(self):
+        """
+        Test that the client gets an error if the daemon serves other journal.
+        """
+        with patch.dict(os.environ, {"JOURNAL": str(self.temp_dir / "other.md")}):
+            with JourClient() as client:
+                with self.assertRaises(DaemonUnavailableError):
+                    client.request("last_lines")
+
+    def test_same_journal_settings(self):
+        """
+        Test that the daemon serves the clients that use the same journal through other
+        path, and not the ones that use it with other durability or local replica.
+        """
+        link_file = self.temp_dir / "link.md"
+        link_file.symlink_to(self.journal_file)
+        for journal_file in (link_file, self.temp_dir / "other" / ".." / "journal.md"):
+            with patch.dict(os.environ, {"JOURNAL": str(journal_file)}):
+                with JourClient() as client:
+                    self.assertEqual(len(client.request("last_lines")), 1)
+
+        for env in (
+            {"JOURNAL_DURABILITY": "atomic"},
+            {"JOURNAL_REPLICA": str(self.temp_dir / "replica.md")},
+        ):
+            with patch.dict(os.environ, env):
+                with JourClient() as client:
+                    with self.assertRaises(DaemonUnavailableError):
+                        client.request("last_lines")
+
+    def test_tag_through_daemon(self):
+        """
+        Test that the new tag is printed when the last line is tagged through the daemon,
+        even if the line has other tags with other names after it.
+        """
+        with JourClient() as client:
+            client.request(
+                "write_line", message="Ticket #BUP3 #BUP10 #LOG4", printing=False
+            )
+
+        for expected_tag in ("#BUP11", "#BUP12"):
+            with patch("sys.argv", ["jour", "--tag", "BUP"]):
+                with contextlib.redirect_stdout(io.StringIO()) as stdout:
+                    main()
+            self.assertEqual(stdout.getvalue(), f"{expected_tag}\n")
+
+    def test_serve_invalid_durability(self):
+        """
+        Test that the daemon is not started with an invalid durability mode.
+        """
+        with patch.dict(os.environ, {"JOURNAL_DURABILITY": "never"}):
+            with patch("sys.argv", ["jour", "--serve"]):
+                with self.assertLogs("jour.__main__", level="ERROR"):
+                    main()
+
+    def test_daemon_not_running(self):
+        """
+        Test that the client raises an `OSError` if the daemon is not running.
+        """
+        with self.assertRaises(OSError):
+            JourClient(self.temp_dir / "other.sock")
@@ -0,0 +1,23 @@
+import subprocess
+import sys
+import unittest
+
+
+class TestStartup(unittest.TestCase):
+    def test_heavy_dependencies_are_imported_lazily(self):
+        """
+        Test that importing the command line utility does not import the heavy
+        dependencies, which are only needed by some code paths.
+        """
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, jour.__main__; "
+                "print(sorted({'mdformat', 'markdown_it'}.intersection(sys.modules)))",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "[]")
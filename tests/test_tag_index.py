@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from jour.tag_index import TagIndex
+
+
+class TestTagIndex(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        self.journal_file = self.temp_dir / "journal.md"
+        with open(self.journal_file, "w") as f:
+            f.write("1. First line. #BUP1.\n")
+            f.write("2. Second line. #BUP2. #OS1.\n")
+            f.write("3. Third line. #BUP10 #XBUP11 #12.\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_index_tags(self):
+        """
+        Test that the tags are indexed with their maximum index and occurrences, without
+        prefix collisions.
+        """
+        tag_index = TagIndex(self.journal_file).refresh()
+
+        self.assertEqual(set(tag_index.tags), {"BUP", "OS", "XBUP"})
+        self.assertEqual(tag_index.max_index("BUP"), 10)
+        self.assertEqual(tag_index.max_index("OS"), 1)
+        self.assertEqual(tag_index.max_index("Other"), 0)
+        self.assertEqual(
+            tag_index.tags["BUP"]["occurrences"], [[1, 0, 1], [2, 22, 2], [3, 51, 10]]
+        )
+        self.assertEqual(tag_index.max_index("BUP", before_offset=51), 2)
+        self.assertEqual(tag_index.read_line(22), "2. Second line. #BUP2. #OS1.\n")
+
+    def test_index_persistence_and_incremental_update(self):
+        """
+        Test that the index is saved in its sidecar file, and updated when the journal
+        grows or its last line changes.
+        """
+        TagIndex(self.journal_file).refresh()
+        self.assertTrue((self.temp_dir / ".journal.md.tags.json").is_file())
+
+        # Change the last line and add a new one
+        with open(self.journal_file, "r+") as f:
+            f.seek(51)
+            f.write("3. Third line. #BUP3.\n4. Fourth line. #BUP4. #OS2.\n")
+            f.truncate()
+
+        tag_index = TagIndex(self.journal_file).refresh()
+        self.assertEqual(tag_index.max_index("BUP"), 4)
+        self.assertEqual(tag_index.max_index("OS"), 2)
+        self.assertNotIn("XBUP", tag_index.tags)
+        self.assertEqual(len(tag_index.tags["BUP"]["occurrences"]), 4)
+
+    def test_index_rebuild_if_journal_changed(self):
+        """
+        Test that the index is rebuilt if the journal changes before the last indexed line.
+        """
+        TagIndex(self.journal_file).refresh()
+
+        with open(self.journal_file, "w") as f:
+            f.write("1. First line. #OS5.\n")
+
+        tag_index = TagIndex(self.journal_file).refresh()
+        self.assertEqual(set(tag_index.tags), {"OS"})
+        self.assertEqual(tag_index.max_index("OS"), 5)
+
+    def test_corrupt_sidecar_file(self):
+        """
+        Test that a corrupt sidecar file is ignored and the index rebuilt.
+        """
+        with open(self.temp_dir / ".journal.md.tags.json", "w") as f:
+            f.write("{")
+
+        tag_index = TagIndex(self.journal_file).refresh()
+        self.assertEqual(tag_index.max_index("BUP"), 10)
+
+    def test_not_persistent_index(self):
+        """
+        Test that a not persistent index does not write its sidecar file.
+        """
+        tag_index = TagIndex(self.journal_file, persistent=False).refresh()
+        self.assertEqual(tag_index.max_index("BUP"), 10)
+        self.assertFalse((self.temp_dir / ".journal.md.tags.json").exists())
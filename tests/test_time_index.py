@@ -0,0 +1,185 @@
+import datetime
+import random
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from jour.time_index import TimeIndex, match_line, parse_time_bound
+
+
+class TestTimeIndex(unittest.TestCase):
+    def setUp(self):
+        # Use the name of the repository root as the preffix for the temporary directory
+        self.temp_dir = Path(
+            tempfile.mkdtemp(prefix=Path(__file__).parent.parent.name + "_")
+        )
+
+        # Write a journal of a month, with a line per hour, and then some lines of an
+        # emergency journal merged by hand, out of order
+        self.journal_file = self.temp_dir / "journal.md"
+        start = datetime.datetime(2024, 3, 1)
+        moments = [start + datetime.timedelta(hours=i) for i in range(24 * 30)]
+        moments += [start + datetime.timedelta(days=4, minutes=i) for i in range(5)]
+        self.lines = [
+            f"{i + 1}. {moment.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]} - "
+            f"{random.choice(['alice', 'bob'])} - Message {i + 1}.\n"
+            for i, moment in enumerate(moments)
+        ]
+        with open(self.journal_file, "w") as f:
+            f.writelines(self.lines)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def brute_force_find(self, since=None, until=None, signature=None) -> list:
+        """
+        Find the lines that match a query scanning all the journal.
+        """
+        found = [
+            (match_line(line.encode(), since, until, signature), line)
+            for line in self.lines
+        ]
+        found = [(timestamp, line) for timestamp, line in found if timestamp]
+        return [line for _, line in sorted(found, key=lambda item: item[0])]
+
+    def test_parse_time_bound(self):
+        """
+        Test that the dates are parsed as journal timestamps, including all the given
+        date or time when they are upper bounds.
+        """
+        self.assertEqual(parse_time_bound("2024-03-05"), "2024-03-05 00:00:00,000")
+        self.assertEqual(
+            parse_time_bound("2024-03-05", upper=True), "2024-03-05 23:59:59,999"
+        )
+        self.assertEqual(
+            parse_time_bound("2024-03-05 10:30", upper=True), "2024-03-05 10:30:59,999"
+        )
+        self.assertEqual(
+            parse_time_bound("2024-03-05T10:30:15", upper=True),
+            "2024-03-05 10:30:15,999",
+        )
+        with self.assertRaises(ValueError):
+            parse_time_bound("yesterday")
+
+    def test_parse_time_bound_precisions(self):
+        """
+        Test that the upper bounds are rounded up to the end of their least precise
+        field, whatever it is, and that the time zones are rejected.
+        """
+        for text, start, end in (
+            ("2024-12-31", "2024-12-31 00:00:00,000", "2024-12-31 23:59:59,999"),
+            ("2024-03-16 17", "2024-03-16 17:00:00,000", "2024-03-16 17:59:59,999"),
+            ("2024-03-16T23", "2024-03-16 23:00:00,000", "2024-03-16 23:59:59,999"),
+            ("2024-03-16 17:04", "2024-03-16 17:04:00,000", "2024-03-16 17:04:59,999"),
+            ("20240316T1704", "2024-03-16 17:04:00,000", "2024-03-16 17:04:59,999"),
+            (
+                "2024-03-16 17:04:50",
+                "2024-03-16 17:04:50,000",
+                "2024-03-16 17:04:50,999",
+            ),
+            (
+                "2024-03-16 17:04:50.1",
+                "2024-03-16 17:04:50,100",
+                "2024-03-16 17:04:50,199",
+            ),
+            (
+                "2024-03-16 17:04:50,12",
+                "2024-03-16 17:04:50,120",
+                "2024-03-16 17:04:50,129",
+            ),
+            (
+                "2024-03-16 17:04:50.123",
+                "2024-03-16 17:04:50,123",
+                "2024-03-16 17:04:50,123",
+            ),
+            (
+                "2024-03-16 17:04:50.123456",
+                "2024-03-16 17:04:50,123",
+                "2024-03-16 17:04:50,123",
+            ),
+        ):
+            with self.subTest(text=text):
+                self.assertEqual(parse_time_bound(text), start)
+                self.assertEqual(parse_time_bound(text, upper=True), end)
+
+        for text in (
+            "2024-03-16 17:04Z",
+            "2024-03-16T17:04:50+01:00",
+            "2024-03-16 17-02",
+        ):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_time_bound(text, upper=True)
+
+    def test_find(self):
+        """
+        Test that the lines of a time range and with a signature are found in
+        chronological order, including the lines out of order.
+        """
+        time_index = TimeIndex(self.journal_file).refresh()
+        self.assertEqual(len(time_index.runs), 2)
+
+        queries = [
+            ("2024-03-03 00:00:00,000", "2024-03-05 23:59:59,999", None),
+            ("2024-03-05 00:00:00,000", "2024-03-05 00:02:00,000", None),
+            ("2024-03-05 00:00:00,000", "2024-03-05 00:02:00,000", "alice"),
+            (None, "2024-03-01 05:00:00,000", None),
+            ("2024-03-30 20:30:00,000", None, None),
+            ("2024-04-01 00:00:00,000", None, None),
+            (None, None, "bob"),
+        ]
+        for since, until, signature in queries:
+            with self.subTest(since=since, until=until, signature=signature):
+                self.assertEqual(
+                    time_index.find(since, until, signature),
+                    self.brute_force_find(since, until, signature),
+                )
+
+        # Not beyond an offset
+        self.assertEqual(
+            time_index.find("2024-03-05 00:00:00,000", end=len(self.lines[0])),
+            [],
+        )
+
+    def test_index_persistence_and_incremental_update(self):
+        """
+        Test that the index is saved in its sidecar file, and updated when the journal
+        grows or changes.
+        """
+        TimeIndex(self.journal_file).refresh()
+        self.assertTrue((self.temp_dir / ".journal.md.times.json").is_file())
+
+        # Add a line in order and other out of order
+        new_lines = [
+            "726. 2024-03-05 00:05:00,000 - alice - New message.\n",
+            "727. 2024-03-02 00:00:00,000 - alice - Other new message.\n",
+        ]
+        with open(self.journal_file, "a") as f:
+            f.writelines(new_lines)
+        self.lines += new_lines
+
+        time_index = TimeIndex(self.journal_file).refresh()
+        self.assertEqual(len(time_index.runs), 3)
+        since, until = "2024-03-01 23:00:00,000", "2024-03-05 00:05:00,000"
+        self.assertEqual(
+            time_index.find(since, until), self.brute_force_find(since, until)
+        )
+
+        # Sort the journal, so there is only one run
+        self.lines = self.brute_force_find()
+        with open(self.journal_file, "w") as f:
+            f.writelines(self.lines)
+        time_index = TimeIndex(self.journal_file).refresh()
+        self.assertEqual(time_index.runs, [0])
+        self.assertEqual(
+            time_index.find(since, until), self.brute_force_find(since, until)
+        )
+
+    def test_not_persistent_index(self):
+        """
+        Test that a not persistent index does not write its sidecar file.
+        """
+        time_index = TimeIndex(self.journal_file, persistent=False).refresh()
+        self.assertEqual(len(time_index.runs), 2)
+        self.assertFalse((self.temp_dir / ".journal.md.times.json").exists())